@@ -3,85 +3,86 @@ import sys
 import time
 import threading
 import subprocess
-import requests
 import webbrowser
-import socket
-import json
+import codecs
 from pathlib import Path
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
-from datetime import datetime
-
-try:
-    from bs4 import BeautifulSoup
-except Exception:
-    BeautifulSoup = None
-
-try:
-    import pyperclip
-except Exception:
-    pyperclip = None
-
-try:
-    import miniupnpc
-except Exception:
-    miniupnpc = None
-
-try:
-    from PIL import Image, ImageTk
-    PIL_AVAILABLE = True
-except Exception:
-    PIL_AVAILABLE = False
-
-__version__ = "2.0.0"
+from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
+
+from mc_core import (
+    __version__,
+    PROPERTY_DEFINITIONS,
+    CONSOLE_TICK_MS,
+    CONSOLE_MAX_LINES_PER_TICK,
+    CONSOLE_SCROLLBACK_LINES,
+    CONSOLE_OVERFLOW_LOG,
+    CONSOLE_ENCODING,
+    ConsoleBuffer,
+    ConsoleScrollback,
+    ChunkedLineReader,
+    ensure_dir,
+    get_local_ip,
+    get_global_ip,
+    timestamp,
+    launch_server,
+    write_console_command,
+    read_server_port,
+    read_properties,
+    write_properties,
+    download_plugin_from_spigot_page,
+    load_config,
+    save_config,
+    config_path,
+)
+from mc_providers import (
+    fetch_server_versions,
+    VersionPrefetcher,
+    catalog_versions,
+    setup_server,
+    providers,
+    get_provider,
+)
+from mc_telemetry import LagTelemetry, TelemetryPoller, telemetry_from_config, telemetry_poll_interval
+from mc_java import discover_java, pick_java, effective_java_path, check_java_compat, describe_java, describe_java_requirement
+from mc_metrics import METRICS_INTERVAL, METRICS_HISTORY, ProcessSampler, MetricsServer
+from mc_launch import prepare_launch, manifest_command, manifest_env
+from mc_rcon import RconClient, rcon_batch_sender, rcon_for_server
+from mc_diag import LagDiagnostics, diagnostics_from_config
+from mc_instances import InstanceRegistry
+from mc_hibernate import Hibernator, hibernate_minutes
+from mc_status import StatusPoller, describe_status, status_address, status_poll_interval
+from mc_gc import GcAnalyzer, GcLogTailer, analyze_gc_logs, describe_gc_report, gc_log_files, start_gc_monitor
+from mc_jvm import JVM_PROFILES, DEFAULT_JVM_PROFILE, build_jvm_profile, describe_jvm_profile, java_major_version, jvm_args_for, with_appcds, StartupRecorder
+
 ROOT_GEOMETRY = "700x360"
 DEFAULT_ICON_NAME = "icon.ico"
 DISCORD_ICON_NAME = "Discord.png"
+SPLASH_IMAGE_NAME = "back.png"
 DISCORD_URL = "https://disboard.org/ja/server/1383423417348395078"
+IMAGE_CACHE_DIR = "cache/img"
+STARTUP_PROBE_ENV = "MCSOFT_STARTUP_PROBE"
+
 
-PAPER_API_ROOT = "https://api.papermc.io/v2"
-MOJANG_MANIFEST = "https://launchermeta.mojang.com/mc/game/version_manifest.json"
-PURPUR_API_ROOT = "https://api.purpurmc.org/v2"
-FABRIC_API_ROOT = "https://meta.fabricmc.net/v2/versions/server"
-FORGE_INDEX_URL = "https://files.minecraftforge.net/net/minecraftforge/forge/"
-
-CONFIG_FILENAME = "mc_server_config.json"
-
-PROPERTY_DEFINITIONS = [
-    ("motd", "サーバー名 (MOTD)", "A Minecraft Server", False),
-    ("server-port", "サーバーポート", "25565", False),
-    ("server-ip", "サーバーIP（空欄で自動）", "", False),
-    ("max-players", "最大プレイヤー数", "20", False),
-    ("online-mode", "オンラインモード（true=認証あり）", "true", True),
-    ("level-name", "ワールド名", "world", False),
-    ("level-seed", "ワールドシード", "", False),
-    ("gamemode", "ゲームモード", "survival", False),
-    ("difficulty", "難易度 (0=peaceful,1=easy,2=normal,3=hard)", "1", False),
-    ("pvp", "PvP を有効にする", "true", True),
-    ("view-distance", "ビュー距離 (チャンク)", "10", False),
-    ("spawn-monsters", "モンスター生成", "true", True),
-    ("spawn-npcs", "NPC 生成", "true", True),
-    ("spawn-animals", "動物生成", "true", True),
-    ("spawn-protection", "スポーン保護範囲", "16", False),
-    ("enforce-whitelist", "ホワイトリストを強制", "false", True),
-    ("enable-command-block", "コマンドブロックを許可", "false", True),
-    ("allow-flight", "飛行を許可", "false", True),
-    ("generate-structures", "構造物を生成", "true", True),
-    ("level-type", "ワールドタイプ", "default", False),
-    ("snooper-enabled", "Snooper 送信を有効", "true", True),
-    ("resource-pack", "リソースパック URL", "", False),
-    ("enable-rcon", "RCON を有効にする", "false", True),
-    ("rcon.password", "RCON パスワード", "", False),
-    ("rcon.port", "RCON ポート", "25575", False),
-    ("max-tick-time", "最大ティック時間 (ms)", "60000", False),
-    ("function-permission-level", "関数の権限レベル", "2", False),
-    ("op-permission-level", "OP 権限レベル", "4", False),
-    ("query.enabled", "Query を有効にする", "false", True),
-    ("query.port", "Query ポート", "25565", False),
-    ("debug", "デバッグモード", "false", True),
-    ("allow-nether", "ネザーを許可", "true", True),
-    ("announce-player-achievements", "実績通知 (古い)", "true", True),
-]
+def _load_pyperclip():
+    try:
+        import pyperclip
+    except Exception:
+        return None
+    return pyperclip
+
+def _load_miniupnpc():
+    try:
+        import miniupnpc
+    except Exception:
+        return None
+    return miniupnpc
+
+def _load_pil():
+    try:
+        from PIL import Image
+    except Exception:
+        return None
+    return Image
 
 
 def resource_path(relative_path: str) -> str:
@@ -91,44 +92,33 @@ def resource_path(relative_path: str) -> str:
         base = Path(__file__).resolve().parent
     return str((base / relative_path).resolve())
 
-def ensure_dir(p: Path) -> None:
-    p.mkdir(parents=True, exist_ok=True)
-
-def download_file_stream(url: str, dest_path: Path, callback=None) -> None:
-    with requests.get(url, stream=True, timeout=30) as r:
-        r.raise_for_status()
-        total = int(r.headers.get("content-length", 0) or 0)
-        downloaded = 0
-        with open(dest_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if callback:
-                        callback(downloaded, total)
-
-def get_local_ip() -> str:
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except Exception:
-        try:
-            return socket.gethostbyname(socket.gethostname())
-        except Exception:
-            return "127.0.0.1"
-
-def get_global_ip() -> str | None:
-    try:
-        r = requests.get("https://api.ipify.org", timeout=5)
-        r.raise_for_status()
-        return r.text.strip()
-    except Exception:
+def cached_image_path(relative_path: str, size: tuple[int, int]) -> Path | None:
+    src = Path(resource_path(relative_path))
+    if not src.exists():
+        return None
+    st = src.stat()
+    w, h = size
+    cached = config_path().parent / IMAGE_CACHE_DIR / f"{src.stem}-{w}x{h}-{st.st_mtime_ns:x}-{st.st_size:x}.png"
+    if cached.exists():
+        return cached
+    Image = _load_pil()
+    if Image is None:
         return None
+    ensure_dir(cached.parent)
+    tmp = cached.with_suffix(".tmp")
+    with Image.open(src) as img:
+        img.resize((w, h), Image.LANCZOS).save(tmp, format="PNG")
+    os.replace(tmp, cached)
+    return cached
+
+def load_cached_photo(master, relative_path: str, size: tuple[int, int]) -> tk.PhotoImage | None:
+    path = cached_image_path(relative_path, size)
+    if path is None:
+        return None
+    return tk.PhotoImage(master=master, file=str(path))
 
 def copy_to_clipboard(text: str) -> tuple[bool, str | None]:
+    pyperclip = _load_pyperclip()
     if pyperclip:
         try:
             pyperclip.copy(text)
@@ -147,175 +137,6 @@ def copy_to_clipboard(text: str) -> tuple[bool, str | None]:
         except Exception as e:
             return False, str(e)
 
-def timestamp() -> str:
-    return datetime.now().strftime("[%Y-%m-%d %H:%M:%S] ")
-
-
-def fetch_paper_versions():
-    r = requests.get(PAPER_API_ROOT + "/projects/paper", timeout=10)
-    r.raise_for_status()
-    versions = r.json().get("versions", [])
-    versions = sorted(versions, reverse=True)
-    return versions
-
-def fetch_purpur_versions():
-
-    r = requests.get(PURPUR_API_ROOT + "/purpur", timeout=10)
-    r.raise_for_status()
-
-    j = r.json()
-    if isinstance(j, dict) and "versions" in j:
-        versions = sorted(j.get("versions", []), reverse=True)
-    elif isinstance(j, list):
-        versions = sorted(j, reverse=True)
-    else:
-        versions = []
-    return versions
-
-def fetch_fabric_versions():
-    r = requests.get(FABRIC_API_ROOT, timeout=10)
-    r.raise_for_status()
-
-    j = r.json()
-    if isinstance(j, list):
-        vals = []
-        for e in j:
-            if isinstance(e, dict) and "version" in e:
-                vals.append(e["version"])
-            elif isinstance(e, str):
-                vals.append(e)
-        return sorted(vals, reverse=True)
-    return []
-
-def fetch_forge_versions():
-
-
-    if BeautifulSoup is None:
-        raise RuntimeError("BeautifulSoup が必要です。`pip install beautifulsoup4` を実行してください。")
-    r = requests.get(FORGE_INDEX_URL, timeout=10)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
-
-    versions = set()
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        parts = href.split("/net/minecraftforge/forge/")
-        if len(parts) > 1:
-            tail = parts[1]
-            ver = tail.split("/")[0]
-            if ver:
-                versions.add(ver)
-    versions = sorted(versions, reverse=True)
-    return versions
-
-
-def download_plugin_from_spigot_page(url: str, plugins_dir: Path, status_callback=None) -> Path:
-    if status_callback:
-        status_callback("プラグインページ解析中...")
-    headers = {"User-Agent": "Mozilla/5.0"}
-
-    if url.lower().endswith(".jar"):
-        dest_name = Path(url.split("?")[0]).name
-        dest = plugins_dir / dest_name
-        download_file_stream(url, dest)
-        return dest
-
-    if BeautifulSoup is None:
-        raise RuntimeError("BeautifulSoup (bs4) が必要です。pip install beautifulsoup4 を実行してください。")
-
-    resp = requests.get(url, headers=headers, timeout=20)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    a = soup.find("a", class_="downloadButton")
-    if not a:
-        a = soup.find("a", href=lambda href: href and "download" in href.lower())
-    if not a or not a.get("href"):
-        raise RuntimeError("ダウンロードリンクをページ内から検出できませんでした。")
-
-    dl_url = a.get("href")
-    if dl_url.startswith("/"):
-        dl_url = "https://www.spigotmc.org" + dl_url
-
-    if status_callback:
-        status_callback("中間ページ取得中...")
-    inter_resp = requests.get(dl_url, headers=headers, timeout=20, allow_redirects=True)
-    inter_resp.raise_for_status()
-
-    if inter_resp.url.lower().endswith(".jar"):
-        final_url = inter_resp.url
-    else:
-        soup2 = BeautifulSoup(inter_resp.text, "html.parser")
-        jar_a = soup2.find("a", href=lambda href: href and href.lower().endswith(".jar"))
-        if not jar_a:
-            raise RuntimeError("最終的な.jarリンクを検出できませんでした。")
-        final_url = jar_a.get("href")
-        if final_url.startswith("/"):
-            final_url = "https://www.spigotmc.org" + final_url
-
-    if status_callback:
-        status_callback("ダウンロード中...")
-    r2 = requests.get(final_url, headers=headers, allow_redirects=True, stream=True, timeout=30)
-    r2.raise_for_status()
-
-    filename = None
-    cd = r2.headers.get("Content-Disposition")
-    if cd and "filename=" in cd:
-        try:
-            filename = cd.split("filename=")[1].strip().strip('"').split(";")[0]
-        except Exception:
-            pass
-    if not filename:
-        filename = Path(final_url.split("?")[0]).name
-    if not filename.lower().endswith(".jar"):
-        filename = f"plugin_{int(time.time())}.jar"
-
-    ensure_dir(plugins_dir)
-    dest = plugins_dir / filename
-    with open(dest, "wb") as fw:
-        for chunk in r2.iter_content(chunk_size=8192):
-            if chunk:
-                fw.write(chunk)
-
-    return dest
-
-
-def config_path() -> Path:
-    base = Path(__file__).resolve().parent
-    return base / CONFIG_FILENAME
-
-DEFAULT_CONFIG = {
-    "java_path": "",
-    "args": "",
-    "install_dir": str(Path.cwd()),
-    "ram": "2048",
-    "server_type": "paper",
-    "version": "",
-}
-
-def load_config() -> dict:
-    p = config_path()
-    if p.exists():
-        try:
-            with open(p, "r", encoding="utf-8") as f:
-                j = json.load(f)
-            
-            for k, v in DEFAULT_CONFIG.items():
-                if k not in j:
-                    j[k] = v
-            return j
-        except Exception:
-            return DEFAULT_CONFIG.copy()
-    else:
-        return DEFAULT_CONFIG.copy()
-
-def save_config(cfg: dict):
-    try:
-        with open(config_path(), "w", encoding="utf-8") as f:
-            json.dump(cfg, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
-
 
 class MCServerGUI:
     def __init__(self, root: tk.Tk):
@@ -343,6 +164,27 @@ class MCServerGUI:
         self.java_path_var = tk.StringVar(value=self.config.get("java_path", ""))
         self.args_var = tk.StringVar(value=self.config.get("args", ""))
         self.reset_args_var = tk.BooleanVar(value=False)
+        self.jvm_profile_var = tk.StringVar(value=self.config.get("jvm_profile", DEFAULT_JVM_PROFILE))
+        self.appcds_var = tk.BooleanVar(value=bool(self.config.get("appcds", False)))
+        self.gc_log_var = tk.BooleanVar(value=bool(self.config.get("gc_log", False)))
+        self.diagnostics_var = tk.BooleanVar(value=bool(self.config.get("diagnostics", False)))
+        self.hibernate_var = tk.BooleanVar(value=bool(self.config.get("hibernate", False)))
+        self.startup_recorder: StartupRecorder | None = None
+        self.sampler: ProcessSampler | None = None
+        self.metrics_server: MetricsServer | None = None
+        self.metrics_text = tk.StringVar(value="")
+        self._metrics_tick_id: str | None = None
+        self._metrics_collector = None
+        self.telemetry: LagTelemetry | None = None
+        self.telemetry_poller: TelemetryPoller | None = None
+        self.gc_analyzer: GcAnalyzer | None = None
+        self.gc_tailer: GcLogTailer | None = None
+        self.diagnostics: LagDiagnostics | None = None
+        self.rcon: RconClient | None = None
+        self.players_text = tk.StringVar(value="")
+        self.status_poller: StatusPoller | None = None
+        self._status_target: str | None = None
+        self.hibernator: Hibernator | None = None
 
         self.server_proc: subprocess.Popen | None = None
         self.read_thread: threading.Thread | None = None
@@ -350,11 +192,30 @@ class MCServerGUI:
         self.console_window: tk.Toplevel | None = None
         self.console_text: scrolledtext.ScrolledText | None = None
         self.console_input: ttk.Entry | None = None
-
+        self.console_buffer = ConsoleBuffer()
+        try:
+            scrollback_lines = int(self.config.get("console_scrollback_lines", CONSOLE_SCROLLBACK_LINES))
+        except (TypeError, ValueError):
+            scrollback_lines = CONSOLE_SCROLLBACK_LINES
+        self.console_scrollback = ConsoleScrollback(scrollback_lines)
+        self._console_tick_id: str | None = None
+        self.output_reader: ChunkedLineReader | None = None
+        self.instances: InstanceRegistry | None = None
+        self.server_dir_running: Path | None = None
+        self.instances_window: tk.Toplevel | None = None
+        self.instances_tree: ttk.Treeview | None = None
+        self._instance_consoles: dict[str, tuple[ConsoleBuffer, scrolledtext.ScrolledText]] = {}
+
+        splash = self.show_splash()
         self.build_ui()
-        self.show_splash_then_main()
+        self.close_splash(splash)
 
-    def show_splash_then_main(self):
+        self.prefetcher = VersionPrefetcher()
+        self.server_type.trace_add("write", lambda *_: self._show_prefetched_versions())
+        self._show_prefetched_versions()
+        self.prefetcher.start(on_result=self._on_prefetch_result)
+
+    def show_splash(self) -> tk.Toplevel:
         splash = tk.Toplevel(self.root)
         splash.overrideredirect(True)
         w = 520; h = 220
@@ -364,11 +225,8 @@ class MCServerGUI:
         frm = ttk.Frame(splash, padding=12)
         frm.pack(fill="both", expand=True)
         try:
-            img_path = resource_path("back.png")
-            if Path(img_path).exists() and PIL_AVAILABLE:
-                img = Image.open(img_path)
-                img = img.resize((w, h), Image.LANCZOS)
-                self.splash_img = ImageTk.PhotoImage(img)
+            self.splash_img = load_cached_photo(splash, SPLASH_IMAGE_NAME, (w, h))
+            if self.splash_img:
                 lbl = tk.Label(frm, image=self.splash_img)
                 lbl.pack(fill="both", expand=True)
             else:
@@ -379,17 +237,30 @@ class MCServerGUI:
             ttk.Label(frm, text=f"バージョン {__version__}").pack()
 
         self.root.withdraw()
-        def close_splash():
-            time.sleep(1.0)
-            try:
-                splash.destroy()
-            except Exception:
-                pass
-            try:
-                self.root.deiconify()
-            except Exception:
-                pass
-        threading.Thread(target=close_splash, daemon=True).start()
+        try:
+            splash.update()
+        except Exception:
+            pass
+        return splash
+
+    def close_splash(self, splash: tk.Toplevel):
+        try:
+            splash.destroy()
+        except Exception:
+            pass
+        try:
+            self.root.deiconify()
+        except Exception:
+            pass
+        probe = os.environ.get(STARTUP_PROBE_ENV)
+        if probe:
+            def report():
+                try:
+                    elapsed_ms = (time.time() - float(probe)) * 1000
+                    print(f"STARTUP_READY {elapsed_ms:.1f}", flush=True)
+                finally:
+                    self.root.destroy()
+            self.root.after_idle(lambda: self.root.after(0, report))
 
     def build_ui(self):
         frm = ttk.Frame(self.root, padding=8)
@@ -397,7 +268,7 @@ class MCServerGUI:
 
        
         ttk.Label(frm, text="サーバータイプ").grid(row=0, column=0, sticky="w", padx=4, pady=2)
-        types = [("PaperMC", "paper"), ("Purpur", "purpur"), ("Vanilla", "vanilla"), ("Forge", "forge"), ("Fabric", "fabric")]
+        types = [(p.label, p.name) for p in providers()]
         col = 1
         for txt, val in types:
             ttk.Radiobutton(frm, text=txt, variable=self.server_type, value=val).grid(row=0, column=col, sticky="w")
@@ -417,11 +288,15 @@ class MCServerGUI:
         
         ttk.Label(frm, text="割当メモリ (MB)").grid(row=3, column=0, sticky="w", padx=4, pady=2)
         ttk.Entry(frm, textvariable=self.ram, width=12).grid(row=3, column=1, sticky="w")
+        ttk.Checkbutton(frm, text="AppCDS 高速起動（初回は学習起動）", variable=self.appcds_var).grid(row=3, column=2, columnspan=2, sticky="w", padx=4)
+        ttk.Checkbutton(frm, text="GC ログ記録", variable=self.gc_log_var).grid(row=3, column=4, sticky="w", padx=4)
+        ttk.Checkbutton(frm, text="ラグ診断", variable=self.diagnostics_var).grid(row=3, column=5, sticky="w")
 
         
         ttk.Label(frm, text="Java パス").grid(row=4, column=0, sticky="w", padx=4, pady=2)
         ttk.Entry(frm, textvariable=self.java_path_var, width=46).grid(row=4, column=1, columnspan=3, sticky="w")
         ttk.Button(frm, text="参照", width=8, command=self.browse_java).grid(row=4, column=4, sticky="w", padx=4)
+        ttk.Button(frm, text="検出", width=8, command=self.detect_java).grid(row=4, column=5, sticky="w")
 
 
         self.use_gui_mode = tk.BooleanVar(value=False)
@@ -430,10 +305,20 @@ class MCServerGUI:
         ttk.Label(frm, text="引数").grid(row=5, column=0, sticky="w", padx=4, pady=2)
         ttk.Entry(frm, textvariable=self.args_var, width=46).grid(row=5, column=1, columnspan=3, sticky="w")
         ttk.Checkbutton(frm, text="リセット（デフォルト引数に戻す）", variable=self.reset_args_var, command=self.on_reset_args).grid(row=5, column=4, sticky="w", padx=4)
+        ttk.Checkbutton(frm, text="不在時に自動休止", variable=self.hibernate_var).grid(row=5, column=5, sticky="w")
 
         self.use_gui_mode = tk.BooleanVar(value=False)
         ttk.Checkbutton(frm, text="GUIあり起動（noguiを外す）", variable=self.use_gui_mode).grid(row=6, column=0, columnspan=2, sticky="w", padx=6, pady=2)
 
+        profile_frame = ttk.Frame(frm)
+        profile_frame.grid(row=6, column=2, columnspan=3, sticky="w")
+        ttk.Label(profile_frame, text="JVMプロファイル").pack(side="left", padx=(0, 4))
+        profile_cb = ttk.Combobox(profile_frame, textvariable=self.jvm_profile_var, values=list(JVM_PROFILES), width=12, state="readonly")
+        profile_cb.pack(side="left")
+        profile_cb.bind("<<ComboboxSelected>>", self.on_jvm_profile_selected)
+        ttk.Button(profile_frame, text="プレビュー", width=10, command=self.preview_jvm_profile).pack(side="left", padx=4)
+        ttk.Button(profile_frame, text="GC 分析", width=10, command=self.show_gc_report).pack(side="left")
+
         btn_frame = ttk.Frame(frm)
         btn_frame.grid(row=7, column=0, columnspan=5, pady=8)
         ttk.Button(btn_frame, text="ダウンロード＆セットアップ", width=20, command=self.start_setup).grid(row=0, column=0, padx=4)
@@ -441,8 +326,10 @@ class MCServerGUI:
         ttk.Button(btn_frame, text="サーバー停止", width=12, command=self.stop_server).grid(row=0, column=2, padx=4)
         ttk.Button(btn_frame, text="強制終了", width=12, command=self.force_kill_server).grid(row=0, column=3, padx=4)
         ttk.Button(btn_frame, text="サーバー設定", width=12, command=self.open_settings_window).grid(row=0, column=4, padx=4)
+        ttk.Button(btn_frame, text="インスタンス", width=10, command=self.open_instances_window).grid(row=0, column=5, padx=4)
 
         ttk.Label(frm, textvariable=self.status_text, foreground="blue").grid(row=8, column=0, columnspan=5, sticky="w", pady=(4,2))
+        ttk.Label(frm, textvariable=self.players_text).grid(row=9, column=0, columnspan=5, sticky="w")
 
 
         bottom = ttk.Frame(self.root, padding=6)
@@ -458,10 +345,8 @@ class MCServerGUI:
         ttk.Button(bottom, text="プラグインDL", command=self.on_plugin_download).pack(side="left", padx=6)
 
         try:
-            dpath = resource_path(DISCORD_ICON_NAME)
-            if Path(dpath).exists() and PIL_AVAILABLE:
-                img = Image.open(dpath).resize((20,20), Image.LANCZOS)
-                self.discord_photo = ImageTk.PhotoImage(img)
+            self.discord_photo = load_cached_photo(self.root, DISCORD_ICON_NAME, (20, 20))
+            if self.discord_photo:
                 tk.Button(bottom, image=self.discord_photo, command=lambda: webbrowser.open(DISCORD_URL), borderwidth=0).pack(side="right", padx=8)
             else:
                 ttk.Button(bottom, text="Discord", command=lambda: webbrowser.open(DISCORD_URL)).pack(side="right", padx=8)
@@ -486,52 +371,105 @@ class MCServerGUI:
             save_config(self.config)
 
     def browse_java(self):
-        p = filedialog.askopenfilename(title="java.exe を選択", filetypes=[("Java Executable", "java.exe")], initialdir="C:\\Program Files\\Java")
+        if os.name == "nt":
+            filetypes = [("Java Executable", "java.exe")]
+            initialdir = os.environ.get("JAVA_HOME") or os.path.join(os.environ.get("ProgramFiles", "C:\\Program Files"), "Java")
+        else:
+            filetypes = [("Java Executable", "java"), ("All Files", "*")]
+            initialdir = os.environ.get("JAVA_HOME") or ("/usr/lib/jvm" if os.path.isdir("/usr/lib/jvm") else str(Path.home()))
+        p = filedialog.askopenfilename(title="Java 実行ファイルを選択", filetypes=filetypes, initialdir=initialdir)
         if p:
             self.java_path_var.set(p)
             self.config["java_path"] = p
             save_config(self.config)
 
+    def detect_java(self):
+        self.set_status("Java を検出中...")
+        def job():
+            try:
+                runtimes = discover_java(rescan=True)
+            except Exception:
+                runtimes = []
+            self.root.after(0, lambda: self._show_java_choices(runtimes))
+        threading.Thread(target=job, daemon=True).start()
+
+    def _show_java_choices(self, runtimes):
+        if not runtimes:
+            self.set_status("Java が見つかりませんでした")
+            messagebox.showwarning("Java 検出", "インストール済みの Java が見つかりませんでした。")
+            return
+        self.set_status(f"Java を {len(runtimes)} 件検出しました")
+        recommended = pick_java(self.version.get(), runtimes)
+        win = tk.Toplevel(self.root)
+        win.title("Java の選択")
+        win.transient(self.root)
+        ttk.Label(win, text=f"Minecraft {self.version.get() or '(未選択)'} の推奨: " + (f"Java {recommended.major}" if recommended else f"互換性のある Java がありません（{describe_java_requirement(self.version.get())}）")).pack(anchor="w", padx=8, pady=(8, 4))
+        lb = tk.Listbox(win, width=90, height=min(10, len(runtimes)))
+        for i, rt in enumerate(runtimes):
+            lb.insert("end", ("★ " if rt == recommended else "   ") + describe_java(rt))
+            if rt == recommended:
+                lb.selection_set(i)
+        lb.pack(fill="both", expand=True, padx=8)
+
+        def apply(path: str):
+            self.java_path_var.set(path)
+            self.config["java_path"] = path
+            save_config(self.config)
+            win.destroy()
+
+        btns = ttk.Frame(win)
+        btns.pack(pady=8)
+        ttk.Button(btns, text="選択", command=lambda: lb.curselection() and apply(runtimes[lb.curselection()[0]].path)).pack(side="left", padx=4)
+        ttk.Button(btns, text="自動（バージョンに合わせる）", command=lambda: apply("")).pack(side="left", padx=4)
+        ttk.Button(btns, text="閉じる", command=win.destroy).pack(side="left", padx=4)
+
+    def _launch_settings(self) -> dict:
+        return dict(self.config,
+                    java_path=self.java_path_var.get().strip(),
+                    args=self.args_var.get().strip(),
+                    ram=self.ram.get(),
+                    jvm_profile=self.jvm_profile_var.get(),
+                    gc_log=self.gc_log_var.get(),
+                    server_type=self.server_type.get(),
+                    version=self.version.get().strip())
+
+    def _launch_java(self) -> str:
+        return effective_java_path(self.java_path_var.get().strip(), self.version.get().strip())
+
     def on_reset_args(self):
         if self.reset_args_var.get():
 
-            ram_mb = self.ram.get() if self.ram.get().isdigit() else "2048"
-            default = f"-Xmx{ram_mb}M -Xms{ram_mb}M nogui"
+            default = self._profile_args()
             self.args_var.set(default)
             self.config["args"] = default
             save_config(self.config)
 
+    def _profile_args(self) -> str:
+        self.config["jvm_profile"] = self.jvm_profile_var.get()
+        return jvm_args_for(self.config, self.ram.get(), self._launch_java())
+
+    def on_jvm_profile_selected(self, event=None):
+        self.config["jvm_profile"] = self.jvm_profile_var.get()
+        save_config(self.config)
+
+    def preview_jvm_profile(self):
+        profile = self.jvm_profile_var.get()
+        major = java_major_version(self._launch_java()) if profile in ("zgc", "shenandoah") else None
+        result = build_jvm_profile(profile, self.ram.get(), major)
+        if messagebox.askyesno("JVM 引数プレビュー", describe_jvm_profile(result) + "\n\nこの引数を適用しますか？"):
+            self.args_var.set(result.args)
+            self.config["args"] = result.args
+            self.config["jvm_profile"] = profile
+            save_config(self.config)
+
 
     def fetch_versions(self):
         self.set_status("バージョン一覧取得中...")
         def job():
             try:
                 stype = self.server_type.get()
-                versions = []
-                if stype == "paper":
-                    versions = fetch_paper_versions()
-                elif stype == "purpur":
-                    try:
-                        versions = fetch_purpur_versions()
-                    except Exception as e:
-                        raise RuntimeError(f"Purpur バージョン取得に失敗しました: {e}")
-                elif stype == "fabric":
-                    try:
-                        versions = fetch_fabric_versions()
-                    except Exception as e:
-                        raise RuntimeError(f"Fabric バージョン取得に失敗しました: {e}")
-                elif stype == "forge":
-                    try:
-                        versions = fetch_forge_versions()
-                    except Exception as e:
-                        raise RuntimeError(f"Forge バージョン取得に失敗しました: {e}")
-                else:
-
-                    r = requests.get(MOJANG_MANIFEST, timeout=10)
-                    r.raise_for_status()
-                    versions = [v["id"] for v in r.json().get("versions", [])]
-                if not versions:
-                    raise RuntimeError("バージョン一覧が空です。")
+                versions = fetch_server_versions(stype)
+                self.prefetcher.put(stype, versions)
 
                 self.version_cb["values"] = versions
                 if versions:
@@ -546,6 +484,24 @@ class MCServerGUI:
                 messagebox.showerror("エラー", f"バージョンの取得に失敗しました:\n{e}")
         threading.Thread(target=job, daemon=True).start()
 
+    def _on_prefetch_result(self, stype: str, versions, error):
+        if versions and stype == self.server_type.get():
+            try:
+                self.root.after(0, self._show_prefetched_versions)
+            except Exception:
+                pass
+
+    def _show_prefetched_versions(self):
+        stype = self.server_type.get()
+        versions = self.prefetcher.get(stype) or catalog_versions(stype)
+        if not versions:
+            self.version_cb["values"] = []
+            return
+        self.version_cb["values"] = versions
+        if self.version.get() not in versions:
+            self.version.set(versions[0])
+        self.set_status(f"{stype} のバージョン一覧を表示しました（{len(versions)} 件）")
+
  
     def start_setup(self):
         version = self.version.get().strip()
@@ -560,159 +516,10 @@ class MCServerGUI:
             server_dir = Path(self.install_dir.get())
             ensure_dir(server_dir)
 
-            stype = self.server_type.get()
-            version = self.version.get().strip()
-            jar_url = None
-            jar_name = None
-
-            if stype == "paper":
-                r = requests.get(f"{PAPER_API_ROOT}/projects/paper/versions/{version}", timeout=10)
-                r.raise_for_status()
-                builds = r.json().get("builds", [])
-                if not builds:
-                    raise Exception("PaperMC のビルドが見つかりません")
-                build = max(builds)
-                jar_url = f"{PAPER_API_ROOT}/projects/paper/versions/{version}/builds/{build}/downloads/paper-{version}-{build}.jar"
-                jar_name = f"paper-{version}-{build}.jar"
-            elif stype == "purpur":
-
-                try:
-                    r = requests.get(f"{PURPUR_API_ROOT}/purpur/versions/{version}", timeout=10)
-                    r.raise_for_status()
-
-                    j = r.json()
-                    if isinstance(j, dict) and "builds" in j and j["builds"]:
-                        build = max(j["builds"])
-                        jar_url = f"{PURPUR_API_ROOT}/purpur/versions/{version}/builds/{build}/downloads/purpur-{version}-{build}.jar"
-                        jar_name = f"purpur-{version}-{build}.jar"
-                    else:
-
-                        jar_url = f"{PURPUR_API_ROOT}/purpur/{version}/latest/download"
-                        jar_name = f"purpur-{version}.jar"
-                except Exception:
-
-                    jar_url = f"{PURPUR_API_ROOT}/purpur/{version}/latest/download"
-                    jar_name = f"purpur-{version}.jar"
-            elif stype == "fabric":
-
-                try:
-                    r = requests.get(FABRIC_API_ROOT, timeout=10)
-                    r.raise_for_status()
-                    candidates = r.json()
-
-                    found = None
-                    for e in candidates:
-                        if (isinstance(e, dict) and e.get("version") == version) or (isinstance(e, str) and e == version):
-                            found = e
-                            break
-
-                    jar_url = None
-                    jar_name = f"fabric-server-{version}.jar"
-
-                except Exception:
-                    jar_url = None
-            elif stype == "forge":
-
-                try:
-                    if BeautifulSoup is None:
-                        raise RuntimeError("Forge の自動取得には BeautifulSoup が必要です。pip install beautifulsoup4 を実行してください。")
-                   
-                    idx = requests.get(FORGE_INDEX_URL, timeout=10)
-                    idx.raise_for_status()
-                    soup = BeautifulSoup(idx.text, "html.parser")
-                 
-                    found_link = None
-                    for a in soup.find_all("a", href=True):
-                        if f"/{version}/" in a["href"]:
-                            found_link = a["href"]
-                            break
-                    if found_link:
-                      
-                        if found_link.startswith("/"):
-                            base = "https://files.minecraftforge.net"
-                            found_link = base + found_link
-                      
-                        pg = requests.get(found_link, timeout=10)
-                        pg.raise_for_status()
-                        soup2 = BeautifulSoup(pg.text, "html.parser")
-                        jar_link = None
-                        for a in soup2.find_all("a", href=True):
-                            href = a["href"]
-                            if href.lower().endswith(".jar") and "server" in href.lower():
-                                jar_link = href
-                                break
-                        if jar_link:
-                            if jar_link.startswith("/"):
-                                jar_link = "https://files.minecraftforge.net" + jar_link
-                            jar_url = jar_link
-                            jar_name = Path(jar_url.split("?")[0]).name
-                        else:
-                            jar_url = None
-                    else:
-                        jar_url = None
-                except Exception:
-                    jar_url = None
-            else:
-             
-                r = requests.get(MOJANG_MANIFEST, timeout=10)
-                r.raise_for_status()
-                manifest = r.json()
-                vinfo = next((v for v in manifest["versions"] if v["id"] == version), None)
-                if not vinfo:
-                    raise Exception("指定バージョンが見つかりません")
-                r2 = requests.get(vinfo["url"], timeout=10)
-                r2.raise_for_status()
-                server_info = r2.json().get("downloads", {}).get("server", {})
-                jar_url = server_info.get("url")
-                jar_name = f"vanilla-{version}.jar"
-
-          
-            if jar_url:
-                jar_path = server_dir / jar_name
-                self.set_status("ダウンロード中...")
-                download_file_stream(jar_url, jar_path)
-            else:
-                jar_path = None
-
-          
-            (server_dir / "eula.txt").write_text("eula=true\n", encoding="utf-8")
-
-     
-            args = self.args_var.get().strip()
-            if not args:
-          
-                ram_mb = self.ram.get() if self.ram.get().isdigit() else "2048"
-                args = f"-Xmx{ram_mb}M -Xms{ram_mb}M nogui"
-            java_exec = self.java_path_var.get().strip() or "java"
-          
-            if java_exec and Path(java_exec).is_dir():
-                guessed = Path(java_exec) / "bin" / "java.exe"
-                if guessed.exists():
-                    java_exec = str(guessed)
-          
-            start_bat = server_dir / "start.bat"
-            if jar_path:
-                jar_name_local = jar_path.name
-                start_bat.write_text(f'@echo off\n"{java_exec}" {args} -jar "{jar_name_local}" nogui\npause\n', encoding="utf-8")
-            else:
-            
-                start_bat.write_text(f'@echo off\nREM サーバーJARが存在するフォルダで、以下のコマンドを実行してください\nREM 例: "{java_exec}" {args} -jar server.jar nogui\npause\n', encoding="utf-8")
-
-            prop_path = server_dir / "server.properties"
-            if not prop_path.exists():
-                default_props = {
-                    "motd": "A Minecraft Server",
-                    "server-port": "25565",
-                    "max-players": "20",
-                    "online-mode": "true",
-                    "level-name": "world",
-                    "gamemode": "survival",
-                    "difficulty": "1",
-                    "pvp": "true",
-                }
-                with open(prop_path, "w", encoding="utf-8") as f:
-                    for k, v in default_props.items():
-                        f.write(f"{k}={v}\n")
+            args = self.args_var.get().strip() or self._profile_args()
+            self.args_var.set(args)
+            setup_server(server_dir, self.server_type.get(), self.version.get().strip(), args,
+                         self._launch_java(), status_callback=self.set_status, settings=self._launch_settings())
 
             
             self.config["install_dir"] = str(server_dir)
@@ -721,6 +528,7 @@ class MCServerGUI:
             self.config["java_path"] = self.java_path_var.get().strip()
             self.config["server_type"] = self.server_type.get()
             self.config["version"] = self.version.get().strip()
+            self.config["jvm_profile"] = self.jvm_profile_var.get()
             save_config(self.config)
 
             self.set_status("セットアップ完了")
@@ -736,42 +544,59 @@ class MCServerGUI:
                 messagebox.showwarning("既に起動中", "サーバーはすでに起動しています。")
                 return
         server_dir = Path(self.install_dir.get())
-        jars = list(server_dir.glob("*.jar"))
-        if not jars:
-            messagebox.showerror("エラー", "サーバーJARが見つかりません。先にセットアップするか、サーバーJARを設置してください。")
+        owner = self.instances.owner_of(server_dir) if self.instances is not None else None
+        if owner:
+            messagebox.showerror("起動エラー", f"{server_dir} はインスタンス「{owner}」で起動中です。")
             return
-        jar = jars[0]
         try:
-            
-            java_exec = self.java_path_var.get().strip() or "java"
-            if java_exec and Path(java_exec).is_dir():
-                guessed = Path(java_exec) / "bin" / "java.exe"
-                if guessed.exists():
-                    java_exec = str(guessed)
-           
-            args_text = self.args_var.get().strip()
-            if not args_text:
-                ram_mb = self.ram.get() if self.ram.get().isdigit() else "2048"
-                args_text = f"-Xmx{ram_mb}M -Xms{ram_mb}M nogui"
-           
-            args_parts = [a for a in args_text.split() if a.lower() != "nogui"]
-            cmd = [java_exec] + args_parts + ["-jar", jar.name, "nogui"]
-
+            manifest, note = prepare_launch(server_dir, self._launch_settings())
         except Exception as e:
             messagebox.showerror("起動エラー", f"コマンド構築に失敗しました:\n{e}")
             return
+        if not manifest:
+            messagebox.showerror("エラー", "サーバーJARが見つかりません。先にセットアップするか、サーバーJARを設置してください。")
+            return
+        if note:
+            self.set_status(note)
+        java_path = manifest["java"]
+        warning = check_java_compat(java_path, self.version.get().strip()) if self.version.get().strip() else None
+        if warning and not messagebox.askyesno("Java バージョン", warning + "\nこのまま起動しますか？"):
+            return
+        cmd = manifest_command(manifest, nogui=not self.use_gui_mode.get())
+        mode = "off"
+        if self.appcds_var.get():
+            try:
+                cmd, mode = with_appcds(cmd, server_dir, server_dir / manifest["target"], java_path)
+            except Exception:
+                mode = "off"
+        self.startup_recorder = StartupRecorder(server_dir, mode)
+        if self.hibernator is not None:
+            self.hibernator.resume()
+        launched_at = time.time()
 
         try:
-            proc = subprocess.Popen(cmd, cwd=str(server_dir),
-                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                    stderr=subprocess.STDOUT, text=True, bufsize=1)
+            proc = launch_server(cmd, server_dir, env=manifest_env(manifest))
         except Exception as e:
             messagebox.showerror("起動エラー", f"プロセスの起動に失敗しました:\n{e}")
             return
 
         with self.proc_lock:
             self.server_proc = proc
-
+            self.server_dir_running = server_dir.resolve()
+        self.config["diagnostics"] = self.diagnostics_var.get()
+        self.diagnostics = diagnostics_from_config(self.config, server_dir, proc.pid, java_path, self._on_diagnostics_captured)
+        if self.diagnostics is not None and not self.diagnostics.available:
+            self.set_status("jcmd が見つからないためラグ診断は無効です（JDK が必要です）")
+        if self.rcon is not None:
+            self.rcon.close()
+        self.rcon = rcon_for_server(server_dir)
+        self._start_telemetry(proc)
+        self._start_gc_monitor(server_dir, manifest, launched_at)
+        self._start_status_poller(server_dir)
+        self._start_hibernator()
+        self._start_sampler(proc, server_dir)
+
+        self.console_scrollback.set_overflow_path(server_dir / CONSOLE_OVERFLOW_LOG)
         self.open_console_window()
         self.read_thread = threading.Thread(target=self._read_server_output_loop, daemon=True)
         self.read_thread.start()
@@ -784,8 +609,209 @@ class MCServerGUI:
         self.config["install_dir"] = self.install_dir.get()
         self.config["server_type"] = self.server_type.get()
         self.config["version"] = self.version.get()
+        self.config["appcds"] = self.appcds_var.get()
+        self.config["gc_log"] = self.gc_log_var.get()
+        self.config["hibernate"] = self.hibernate_var.get()
         save_config(self.config)
 
+    def _start_sampler(self, proc: subprocess.Popen, server_dir: Path) -> None:
+        if self.sampler:
+            self.sampler.stop()
+        try:
+            interval = float(self.config.get("metrics_interval", METRICS_INTERVAL))
+            history = int(self.config.get("metrics_history", METRICS_HISTORY))
+        except (TypeError, ValueError):
+            interval, history = METRICS_INTERVAL, METRICS_HISTORY
+        sampler = ProcessSampler(proc.pid, interval, history).start()
+        self.sampler = sampler
+        try:
+            port = int(self.config.get("metrics_port") or 0)
+        except (TypeError, ValueError):
+            port = 0
+        if port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(port).start()
+            except OSError as e:
+                self.set_status(f"メトリクスサーバーを開始できません (port {port}): {e}")
+        if self.metrics_server is not None:
+            if self._metrics_collector is not None:
+                self.metrics_server.remove_collector(self._metrics_collector)
+            telemetry = self.telemetry
+            gc = self.gc_analyzer
+            status = self.status_poller
+            labels = {"instance": server_dir.resolve().name}
+            self._metrics_collector = lambda: (sampler.collect(labels) + (telemetry.collect(labels) if telemetry else [])
+                                               + (gc.collect(labels) if gc else []) + (status.collect() if status else []))
+            self.metrics_server.add_collector(self._metrics_collector)
+
+    def _start_telemetry(self, proc: subprocess.Popen) -> None:
+        if self.telemetry_poller:
+            self.telemetry_poller.stop()
+        self.telemetry = telemetry_from_config(self.config, self._on_telemetry_alert)
+        try:
+            commands = get_provider(self.server_type.get()).telemetry_commands(self.version.get().strip())
+        except Exception:
+            commands = ()
+        encoding = self._console_encoding()
+        self.telemetry_poller = TelemetryPoller(
+            lambda cmd: write_console_command(proc, cmd, encoding), commands, telemetry_poll_interval(self.config),
+            ready=lambda: self.startup_recorder is not None and self.startup_recorder.done,
+            send_many=rcon_batch_sender(self.rcon, self.telemetry.feed_reply) if self.rcon else None).start()
+
+    def _start_status_poller(self, server_dir: Path) -> None:
+        interval = status_poll_interval(self.config)
+        if interval <= 0:
+            return
+        if self.status_poller is None:
+            self.status_poller = StatusPoller(interval, on_result=self._on_server_status).start()
+        if self._status_target:
+            self.status_poller.remove_target(self._status_target)
+        host, _ = status_address(server_dir)
+        self._status_target = server_dir.resolve().name
+        self.status_poller.add_target(self._status_target, host, self._get_server_port())
+        self.players_text.set("")
+
+    def _stop_status_poller(self) -> None:
+        if self.status_poller and self._status_target:
+            self.status_poller.remove_target(self._status_target)
+        self._status_target = None
+        try:
+            self.players_text.set("")
+        except Exception:
+            pass
+
+    def _on_server_status(self, name: str, status) -> None:
+        if name != self._status_target:
+            return
+        if self.hibernator is not None:
+            self.hibernator.observe_status(status)
+        try:
+            if status.online:
+                self.players_text.set(describe_status(status))
+            elif self.startup_recorder is not None and self.startup_recorder.done:
+                self.players_text.set("プレイヤー情報: 応答なし")
+        except Exception:
+            pass
+
+    def _start_hibernator(self) -> None:
+        self.config["hibernate"] = self.hibernate_var.get()
+        minutes = hibernate_minutes(self.config)
+        if minutes <= 0:
+            if self.hibernator is not None:
+                self.hibernator.stop()
+                self.hibernator = None
+            return
+        if self.hibernator is None:
+            self.hibernator = Hibernator(minutes, self._on_idle_hibernate, lambda: self.root.after(0, self._wake_from_hibernation),
+                                         self.config.get("hibernate_motd", ""),
+                                         ready=lambda: self.startup_recorder is not None and self.startup_recorder.done).start()
+        else:
+            self.hibernator.idle_seconds = minutes * 60
+
+    def _on_idle_hibernate(self) -> None:
+        self.set_status(f"{self.hibernator.idle_seconds / 60:.0f} 分間プレイヤーがいないためサーバーを休止します")
+        self.root.after(0, self.stop_server)
+
+    def _enter_hibernation(self) -> None:
+        hibernator = self.hibernator
+        if hibernator is None:
+            return
+        server_dir = Path(self.install_dir.get())
+
+        def job():
+            try:
+                text = "休止中（接続があると自動で起動します）" if hibernator.server_stopped(server_dir) else None
+            except Exception as e:
+                text = f"休止の待ち受けに失敗しました: {e}"
+            if text:
+                try:
+                    self.root.after(0, lambda: self.players_text.set(text))
+                except Exception:
+                    pass
+        threading.Thread(target=job, name="hibernate-listen", daemon=True).start()
+
+    def _wake_from_hibernation(self) -> None:
+        self.players_text.set("")
+        self.set_status("接続を検知したためサーバーを起動します")
+        self.start_server()
+
+    def _start_gc_monitor(self, server_dir: Path, manifest: dict, launched_at: float) -> None:
+        if self.gc_tailer:
+            self.gc_tailer.stop()
+        on_pause = self.telemetry.gc_pause if self.telemetry else None
+        self.gc_analyzer, self.gc_tailer = start_gc_monitor(server_dir, manifest, launched_at, on_pause)
+
+    def show_gc_report(self):
+        analyzer = self.gc_analyzer if self.server_proc else None
+        server_dir = Path(self.install_dir.get())
+
+        def job():
+            try:
+                if analyzer is not None:
+                    text = describe_gc_report(analyzer.report())
+                elif gc_log_files(server_dir):
+                    text = describe_gc_report(analyze_gc_logs(server_dir).report())
+                else:
+                    text = "GC ログがありません。「GC ログ記録」を有効にしてサーバーを起動してください。"
+            except Exception as e:
+                text = f"GC ログの分析に失敗しました:\n{e}"
+            try:
+                self.root.after(0, lambda: messagebox.showinfo("GC 分析", text))
+            except Exception:
+                pass
+        self.set_status("GC ログを分析中...")
+        threading.Thread(target=job, daemon=True).start()
+
+    def _on_telemetry_alert(self, event) -> None:
+        self.console_buffer.push(timestamp() + "[MCSoft] ⚠ " + event.message)
+        self.set_status("⚠ " + event.message)
+        if self.diagnostics is not None:
+            self.diagnostics.trigger(event)
+
+    def _on_diagnostics_captured(self, path, text: str) -> None:
+        ts = timestamp()
+        if path is None:
+            self.console_buffer.push(ts + "[MCSoft] " + text)
+            return
+        self.console_buffer.push_many([ts + "[MCSoft] " + line for line in text.splitlines() if line]
+                                      + [ts + f"[MCSoft] 診断情報を保存しました: {path}"])
+        self.set_status(f"診断情報を保存しました: {path.name}")
+
+    def _schedule_metrics_tick(self):
+        if self._metrics_tick_id is not None:
+            return
+        interval = self.sampler.interval if self.sampler else METRICS_INTERVAL
+        try:
+            self._metrics_tick_id = self.root.after(int(interval * 1000), self._metrics_tick)
+        except Exception:
+            self._metrics_tick_id = None
+
+    def _metrics_tick(self):
+        self._metrics_tick_id = None
+        if self.console_window is None:
+            return
+        if self.sampler:
+            summary = self.sampler.summary()
+            if summary and (self.telemetry or self.gc_analyzer):
+                extra = (self.telemetry.summary() if self.telemetry else "", self.gc_analyzer.summary() if self.gc_analyzer else "")
+                summary = "  ".join(p for p in (summary, *extra) if p)
+            if summary:
+                self.metrics_text.set(summary if self.sampler.running else summary + "  (停止)")
+        self._schedule_metrics_tick()
+
+    def _observe_lines(self, lines) -> None:
+        if self.telemetry is not None:
+            self.telemetry.feed(lines)
+        if self.hibernator is not None:
+            self.hibernator.feed(lines)
+        recorder = self.startup_recorder
+        if recorder is None or recorder.done:
+            return
+        seconds = recorder.feed(lines)
+        if seconds is not None:
+            label = {"train": "AppCDS 学習中", "use": "AppCDS 使用"}.get(recorder.mode, "AppCDS なし")
+            self.set_status(f"サーバー起動完了 ({seconds:.1f}秒, {label})")
+
     def _read_server_output_loop(self):
         proc = None
         with self.proc_lock:
@@ -794,15 +820,29 @@ class MCServerGUI:
         if not proc:
             return
 
+        encoding = self._console_encoding()
         try:
-            for line in proc.stdout:
-                if line is None:
-                    break
-               
-                self._append_console(timestamp() + line)
+            if self.config.get("reader_mode", "chunked") == "line":
+                for raw in proc.stdout:
+                    line = raw.decode(encoding, errors="replace").rstrip("\r\n")
+                    self._observe_lines((line,))
+                    self._append_console(timestamp() + line)
+            else:
+                reader = ChunkedLineReader(proc.stdout.fileno(), encoding=encoding)
+                self.output_reader = reader
+                push_many = self.console_buffer.push_many
+                while True:
+                    lines = reader.read_batch()
+                    if lines is None:
+                        break
+                    if lines:
+                        self._observe_lines(lines)
+                        ts = timestamp()
+                        push_many([ts + line for line in lines])
         except Exception:
             pass
         finally:
+            stopped = False
             try:
                 with self.proc_lock:
                     if proc is not None and proc.poll() is not None:
@@ -817,7 +857,20 @@ class MCServerGUI:
                         except Exception:
                             pass
                         self.server_proc = None
+                        if self.sampler:
+                            self.sampler.stop()
+                        if self.telemetry_poller:
+                            self.telemetry_poller.stop()
+                        if self.gc_tailer:
+                            self.gc_tailer.stop()
+                        if self.rcon:
+                            self.rcon.close()
+                        self._stop_status_poller()
+                        self.console_scrollback.close()
                         self.set_status("サーバー停止（プロセス終了）")
+                        stopped = True
+                if stopped:
+                    self.root.after(0, self._enter_hibernation)
             except Exception:
                 pass
 
@@ -830,9 +883,7 @@ class MCServerGUI:
 
         try:
             try:
-                if proc.stdin and proc.poll() is None:
-                    proc.stdin.write("stop\n")
-                    proc.stdin.flush()
+                if write_console_command(proc, "stop", self._console_encoding()):
                     self.set_status("停止コマンド送信、終了待ち...")
                 else:
                     self.set_status("停止コマンド送信失敗（stdin closed）")
@@ -856,6 +907,7 @@ class MCServerGUI:
                         if self.server_proc is proc:
                             self.server_proc = None
                     self.set_status("サーバー停止しました")
+                    self.root.after(0, self._enter_hibernation)
                 except subprocess.TimeoutExpired:
                     self.set_status("停止コマンドで終了しませんでした")
                     def ask_kill():
@@ -942,6 +994,14 @@ class MCServerGUI:
 
         self.console_text = scrolledtext.ScrolledText(self.console_window, width=120, height=28, state="disabled")
         self.console_text.pack(padx=6, pady=6, fill="both", expand=True)
+        ttk.Label(self.console_window, textvariable=self.metrics_text, font=("Courier", 9)).pack(fill="x", padx=6)
+        self.console_window.protocol("WM_DELETE_WINDOW", self._on_console_close)
+        history = self.console_scrollback.snapshot()
+        if history:
+            self.console_text.configure(state="normal")
+            self.console_text.insert("end", history)
+            self.console_text.see("end")
+            self.console_text.configure(state="disabled")
         bottom = ttk.Frame(self.console_window)
         bottom.pack(fill="x", padx=6, pady=6)
         self.console_input = ttk.Entry(bottom)
@@ -949,24 +1009,69 @@ class MCServerGUI:
         ttk.Button(bottom, text="送信", width=10, command=self.send_command).pack(side="left")
        
         self.console_input.bind("<Return>", lambda e: self.send_command())
+        self._schedule_console_tick()
+        self._schedule_metrics_tick()
 
-    def _append_console(self, text: str):
-        if not self.console_text:
+    def _on_console_close(self):
+        try:
+            self.console_window.destroy()
+        except Exception:
+            pass
+        self.console_window = None
+        self.console_text = None
+
+    def _schedule_console_tick(self):
+        if self._console_tick_id is not None:
             return
-        def _do():
+        try:
+            interval = int(self.config.get("console_tick_ms", CONSOLE_TICK_MS))
+        except (TypeError, ValueError):
+            interval = CONSOLE_TICK_MS
+        try:
+            self._console_tick_id = self.root.after(max(10, interval), self._console_tick)
+        except Exception:
+            self._console_tick_id = None
+
+    def _console_tick(self):
+        self._console_tick_id = None
+        try:
+            max_lines = int(self.config.get("console_max_lines_per_tick", CONSOLE_MAX_LINES_PER_TICK))
+        except (TypeError, ValueError):
+            max_lines = CONSOLE_MAX_LINES_PER_TICK
+        lines = self.console_buffer.drain(max(1, max_lines))
+        trimmed = self.console_scrollback.extend(lines) if lines else 0
+        if lines and self.console_text:
             try:
                 self.console_text.configure(state="normal")
-                self.console_text.insert("end", text)
-                if not text.endswith("\n"):
-                    self.console_text.insert("end", "\n")
+                self.console_text.insert("end", "".join(lines))
+                if trimmed:
+                    self.console_text.delete("1.0", f"{trimmed + 1}.0")
                 self.console_text.see("end")
                 self.console_text.configure(state="disabled")
+                title = f"サーバーコンソール - 表示 {self.console_buffer.lines_per_sec:.0f} 行/秒"
+                if self.console_buffer.dropped:
+                    title += f" / 破棄 {self.console_buffer.dropped} 行"
+                if self.output_reader:
+                    lps, bps = self.output_reader.throughput()
+                    title += f" / 読込 {lps:.0f} 行/秒 ({bps / 1024:.0f} KiB/秒)"
+                self.console_window.title(title)
             except Exception:
                 pass
+        with self.proc_lock:
+            running = self.server_proc is not None
+        if running or self.console_buffer.pending() or self.console_text:
+            self._schedule_console_tick()
+
+    def _console_encoding(self) -> str:
+        encoding = self.config.get("console_encoding") or CONSOLE_ENCODING
         try:
-            self.console_text.after(0, _do)
-        except Exception:
-            pass
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = CONSOLE_ENCODING
+        return encoding
+
+    def _append_console(self, text: str):
+        self.console_buffer.push(text)
 
     def send_command(self):
         cmd = self.console_input.get().strip()
@@ -974,13 +1079,19 @@ class MCServerGUI:
             return
         with self.proc_lock:
             proc = self.server_proc
-        if not proc or proc.poll() is not None:
+        running = proc is not None and proc.poll() is None
+        if self.rcon is None and not running:
+            self.rcon = rcon_for_server(Path(self.install_dir.get()))
+        if self.rcon is not None and (not running or (self.startup_recorder and self.startup_recorder.done)):
+            self.console_input.delete(0, "end")
+            self._append_console(timestamp() + "> " + cmd)
+            threading.Thread(target=self._send_rcon_command, args=(cmd, proc if running else None), daemon=True).start()
+            return
+        if not running:
             messagebox.showwarning("未起動", "サーバーは起動していません。")
             return
         try:
-            if proc.stdin:
-                proc.stdin.write(cmd + "\n")
-                proc.stdin.flush()
+            if write_console_command(proc, cmd, self._console_encoding()):
                 self.console_input.delete(0, "end")
                 self._append_console(timestamp() + "> " + cmd)
             else:
@@ -989,21 +1100,22 @@ class MCServerGUI:
             messagebox.showerror("送信失敗", f"{e}")
 
     
+    def _send_rcon_command(self, cmd: str, proc: subprocess.Popen | None) -> None:
+        try:
+            reply = self.rcon.command(cmd)
+        except Exception as e:
+            if proc is not None and write_console_command(proc, cmd, self._console_encoding()):
+                return
+            self.console_buffer.push(timestamp() + f"[MCSoft] RCON 送信に失敗しました: {e}")
+            return
+        ts = timestamp()
+        self.console_buffer.push_many([ts + line for line in reply.splitlines()])
+
     def _get_server_port(self) -> int:
-        server_dir = Path(self.install_dir.get())
-        prop_path = server_dir / "server.properties"
-        if prop_path.exists():
-            try:
-                with open(prop_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if "=" in line and line.strip().startswith("server-port"):
-                            return int(line.split("=",1)[1].strip())
-            except Exception:
-                pass
-        return 25565
+        return read_server_port(Path(self.install_dir.get()))
 
     def port_open(self):
-        if miniupnpc is None:
+        if _load_miniupnpc() is None:
             messagebox.showerror("miniupnpc が無い", "ポート開放には miniupnpc が必要です。\n`pip install miniupnpc` を実行してください。")
             return
         port = self._get_server_port()
@@ -1012,7 +1124,7 @@ class MCServerGUI:
     def _port_open_job(self, port: int):
         self.set_status(f"ポート {port} を開放しています...")
         try:
-            u = miniupnpc.UPnP()
+            u = _load_miniupnpc().UPnP()
             u.discoverdelay = 200
             u.discover()
             u.selectigd()
@@ -1025,7 +1137,7 @@ class MCServerGUI:
             self.set_status("ポート開放失敗")
 
     def port_close(self):
-        if miniupnpc is None:
+        if _load_miniupnpc() is None:
             messagebox.showerror("miniupnpc が無い", "ポート閉鎖には miniupnpc が必要です。\n`pip install miniupnpc` を実行してください。")
             return
         port = self._get_server_port()
@@ -1034,7 +1146,7 @@ class MCServerGUI:
     def _port_close_job(self, port: int):
         self.set_status(f"ポート {port} を閉鎖しています...")
         try:
-            u = miniupnpc.UPnP()
+            u = _load_miniupnpc().UPnP()
             u.discoverdelay = 200
             u.discover()
             u.selectigd()
@@ -1095,21 +1207,177 @@ class MCServerGUI:
             self.set_status("ダウンロード失敗")
             messagebox.showerror("ダウンロード失敗", f"プラグインのダウンロードに失敗しました:\n{e}")
 
+    def open_instances_window(self):
+        if self.instances_window and tk.Toplevel.winfo_exists(self.instances_window):
+            self.instances_window.lift()
+            return
+        if self.instances is None:
+            self.instances = InstanceRegistry(self.config, on_output=self._on_instance_output,
+                                              external_owner=self._main_server_owner)
+        win = tk.Toplevel(self.root)
+        win.title("インスタンス一覧")
+        win.geometry("760x360")
+        try:
+            ico = resource_path(DEFAULT_ICON_NAME)
+            if Path(ico).exists():
+                win.iconbitmap(ico)
+        except Exception:
+            pass
+        tree = ttk.Treeview(win, columns=("state", "players", "pid", "dir"), selectmode="extended", height=12)
+        for col, text, width in (("#0", "名前", 120), ("state", "状態", 80), ("players", "プレイヤー", 220),
+                                 ("pid", "PID", 60), ("dir", "フォルダ", 260)):
+            tree.heading(col, text=text)
+            tree.column(col, width=width, anchor="w")
+        tree.pack(fill="both", expand=True, padx=6, pady=6)
+        tree.bind("<Double-1>", lambda e: self._open_instance_console())
+        btns = ttk.Frame(win)
+        btns.pack(fill="x", padx=6, pady=(0, 6))
+        for text, command in (("追加", self._add_instance), ("削除", self._remove_instance),
+                              ("開始", lambda: self._instances_action("start")), ("停止", lambda: self._instances_action("stop")),
+                              ("全て開始", lambda: self._instances_action("start", True)),
+                              ("全て停止", lambda: self._instances_action("stop", True)),
+                              ("コンソール", self._open_instance_console)):
+            ttk.Button(btns, text=text, width=10, command=command).pack(side="left", padx=3)
+        self.instances_window = win
+        self.instances_tree = tree
+        self._refresh_instances()
+
+    def _main_server_owner(self, server_dir: Path) -> str | None:
+        with self.proc_lock:
+            running = self.server_proc is not None
+            running_dir = self.server_dir_running
+        if not running and not (self.hibernator is not None and self.hibernator.sleeping):
+            return None
+        return "メイン画面のサーバー" if running_dir == Path(server_dir).resolve() else None
+
+    def _refresh_instances(self):
+        tree = self.instances_tree
+        if not self.instances_window or not tk.Toplevel.winfo_exists(self.instances_window):
+            self.instances_window = None
+            self.instances_tree = None
+            return
+        rows = self.instances.rows()
+        names = {row["name"] for row in rows}
+        for iid in tree.get_children():
+            if iid not in names:
+                tree.delete(iid)
+        for row in rows:
+            values = (row["label"], row["players"], row["pid"] or "", row["dir"])
+            if tree.exists(row["name"]):
+                tree.item(row["name"], values=values)
+            else:
+                tree.insert("", "end", iid=row["name"], text=row["name"], values=values)
+        self.root.after(1000, self._refresh_instances)
+
+    def _selected_instances(self) -> list[str]:
+        return list(self.instances_tree.selection()) if self.instances_tree else []
+
+    def _add_instance(self):
+        server_dir = Path(self.install_dir.get())
+        name = simpledialog.askstring("インスタンス追加", "インスタンス名（現在の設定で登録します）:",
+                                      initialvalue=server_dir.name, parent=self.instances_window)
+        if not name:
+            return
+        try:
+            self.instances.add(name, str(server_dir), server_type=self.server_type.get(), version=self.version.get().strip(),
+                               ram=self.ram.get(), java_path=self.java_path_var.get().strip(), args=self.args_var.get().strip(),
+                               jvm_profile=self.jvm_profile_var.get(), appcds=self.appcds_var.get(), gc_log=self.gc_log_var.get())
+        except Exception as e:
+            messagebox.showerror("追加エラー", str(e), parent=self.instances_window)
+
+    def _remove_instance(self):
+        names = self._selected_instances()
+        if not names or not messagebox.askyesno("削除", f"{', '.join(names)} を一覧から削除しますか？\n（サーバーフォルダは残ります）",
+                                                parent=self.instances_window):
+            return
+        for name in names:
+            try:
+                self.instances.remove(name)
+            except Exception as e:
+                messagebox.showerror("削除エラー", str(e), parent=self.instances_window)
+
+    def _instances_action(self, action: str, everything: bool = False):
+        names = self.instances.names() if everything else self._selected_instances()
+        if not names:
+            messagebox.showwarning("未選択", "インスタンスを選択してください。", parent=self.instances_window)
+            return
+
+        def job():
+            try:
+                if action == "start":
+                    errors = self.instances.start(names)
+                else:
+                    self.instances.stop(names)
+                    errors = {}
+            except Exception as e:
+                errors = {"": str(e)}
+            if errors:
+                text = "\n".join(f"{n}: {e}" if n else e for n, e in errors.items())
+                self.root.after(0, lambda: messagebox.showerror("インスタンス", text))
+        threading.Thread(target=job, daemon=True).start()
+
+    def _on_instance_output(self, inst, lines):
+        entry = self._instance_consoles.get(inst.name)
+        if entry is not None:
+            entry[0].push_many(lines)
+
+    def _open_instance_console(self):
+        names = self._selected_instances()
+        if not names:
+            return
+        inst = self.instances.get(names[0])
+        win = tk.Toplevel(self.root)
+        win.title(f"コンソール - {inst.name}")
+        win.geometry("760x460")
+        text = scrolledtext.ScrolledText(win, width=120, height=28, state="normal")
+        text.pack(padx=6, pady=6, fill="both", expand=True)
+        text.insert("end", inst.console.snapshot())
+        text.see("end")
+        text.configure(state="disabled")
+        bottom = ttk.Frame(win)
+        bottom.pack(fill="x", padx=6, pady=6)
+        entry = ttk.Entry(bottom)
+        entry.pack(side="left", fill="x", expand=True, padx=(0, 6))
+
+        def send(_=None):
+            cmd = entry.get().strip()
+            if cmd and not inst.send(cmd):
+                messagebox.showwarning("未起動", f"{inst.name} は起動していません。", parent=win)
+            entry.delete(0, "end")
+        ttk.Button(bottom, text="送信", width=10, command=send).pack(side="left")
+        entry.bind("<Return>", send)
+        buffer = ConsoleBuffer()
+        self._instance_consoles[inst.name] = (buffer, text)
+
+        def close():
+            if self._instance_consoles.get(inst.name, (None, None))[1] is text:
+                del self._instance_consoles[inst.name]
+            win.destroy()
+        win.protocol("WM_DELETE_WINDOW", close)
+
+        def tick():
+            if not tk.Toplevel.winfo_exists(win):
+                return
+            lines = buffer.drain(CONSOLE_MAX_LINES_PER_TICK)
+            if lines:
+                text.configure(state="normal")
+                text.insert("end", "".join(lines))
+                excess = int(text.index("end-1c").split(".")[0]) - inst.console.max_lines
+                if excess > 0:
+                    text.delete("1.0", f"{excess + 1}.0")
+                text.see("end")
+                text.configure(state="disabled")
+            win.after(CONSOLE_TICK_MS, tick)
+        tick()
+
     
     def open_settings_window(self):
         server_dir = Path(self.install_dir.get())
         prop_path = server_dir / "server.properties"
-        props = {}
-        if prop_path.exists():
-            try:
-                with open(prop_path, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if not line.strip() or line.strip().startswith("#") or "=" not in line:
-                            continue
-                        k, v = line.strip().split("=", 1)
-                        props[k] = v
-            except Exception:
-                props = {}
+        try:
+            props = read_properties(prop_path)
+        except Exception:
+            props = {}
 
         win = tk.Toplevel(self.root)
         win.title("サーバー設定")
@@ -1160,17 +1428,7 @@ class MCServerGUI:
                         out[key] = var.get()
 
             try:
-                if prop_path.exists():
-                    with open(prop_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            if "=" in line and not line.strip().startswith("#"):
-                                k = line.split("=",1)[0]
-                                if k not in out:
-                                    v = line.split("=",1)[1].rstrip("\n")
-                                    out[k] = v
-                with open(prop_path, "w", encoding="utf-8") as f:
-                    for k, v in out.items():
-                        f.write(f"{k}={v}\n")
+                write_properties(prop_path, out)
                 messagebox.showinfo("保存完了", "server.properties を保存しました。")
                 win.destroy()
             except Exception as e:
@@ -1183,7 +1441,10 @@ class MCServerGUI:
 def main():
     root = tk.Tk()
     app = MCServerGUI(root)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app.prefetcher.cancel()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,1031 @@
+import os
+import sys
+import json
+import time
+import socket
+import secrets
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+
+from mc_core import (
+    __version__,
+    CONSOLE_ENCODING,
+    CONSOLE_MAX_LINES_PER_TICK,
+    CONSOLE_SCROLLBACK_LINES,
+    CONSOLE_TICK_MS,
+    STARTUP_BUDGET_MS,
+    ConsoleBuffer,
+    ConsoleScrollback,
+    ChunkedLineReader,
+    ensure_dir,
+    timestamp,
+    launch_server,
+    write_console_command,
+    close_process_pipes,
+    read_properties,
+    write_properties,
+    load_config,
+    save_config,
+)
+from mc_providers import (
+    fetch_server_versions,
+    catalog_versions,
+    setup_server,
+    provider_names,
+    get_provider,
+)
+from mc_telemetry import LagTelemetry, TelemetryPoller, telemetry_from_config, telemetry_poll_interval
+from mc_java import discover_java, pick_java, effective_java_path, check_java_compat, describe_java, describe_java_requirement
+from mc_metrics import METRICS_INTERVAL, METRICS_HISTORY, ProcessSampler, MetricsServer
+from mc_launch import prepare_launch, manifest_command, manifest_env, load_launch_manifest
+from mc_rcon import RCON_DEFAULT_PORT, RconClient, rcon_batch_sender, rcon_for_server, rcon_settings
+from mc_diag import DIAG_DIR, LagDiagnostics, diagnostics_from_config, list_captures
+from mc_gc import GC_LOG_FILE, GcAnalyzer, analyze_gc_logs, describe_gc_report, gc_log_files, start_gc_monitor
+from mc_instances import INSTANCE_STATES, INSTANCE_STOP_TIMEOUT, InstanceRegistry
+from mc_hibernate import Hibernator, hibernate_minutes
+from mc_status import STATUS_TIMEOUT, StatusPoller, describe_status, parse_address, query_many, status_address, status_poll_interval
+from mc_jvm import (
+    JVM_PROFILES,
+    DEFAULT_JVM_PROFILE,
+    APPCDS_DIR,
+    build_jvm_profile,
+    describe_jvm_profile,
+    java_major_version,
+    jvm_args_for,
+    with_appcds,
+    clear_appcds,
+    StartupRecorder,
+    startup_history,
+    startup_summary,
+)
+
+APP_DIR = Path(__file__).resolve().parent
+CONTROL_FILENAME = ".mcsoft_control.json"
+DAEMON_LOG = "logs/mcsoft-daemon.log"
+STOP_TIMEOUT = 30
+
+
+def _out(text: str) -> None:
+    sys.stdout.write(text + "\n")
+    sys.stdout.flush()
+
+def _err(text: str) -> None:
+    sys.stderr.write(text + "\n")
+    sys.stderr.flush()
+
+def _server_dir(args, cfg: dict) -> Path:
+    return Path(args.dir or cfg.get("install_dir") or Path.cwd()).resolve()
+
+def _control_path(server_dir: Path) -> Path:
+    return server_dir / CONTROL_FILENAME
+
+
+class ControlServer:
+    def __init__(self, server_dir: Path, proc: subprocess.Popen, encoding: str = CONSOLE_ENCODING):
+        self.server_dir = server_dir
+        self.proc = proc
+        self.encoding = encoding
+        self.token = secrets.token_hex(16)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self._closed = False
+        self.sampler: ProcessSampler | None = None
+        self.telemetry: LagTelemetry | None = None
+        self.gc: GcAnalyzer | None = None
+        self.rcon: RconClient | None = None
+        self.status: StatusPoller | None = None
+        self.metrics_port: int | None = None
+
+    def start(self) -> None:
+        info = {"port": self.port, "token": self.token, "pid": os.getpid(), "server_pid": self.proc.pid}
+        path = _control_path(self.server_dir)
+        path.write_text(json.dumps(info), encoding="utf-8")
+        try:
+            os.chmod(path, 0o600)
+        except Exception:
+            pass
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def close(self) -> None:
+        self._closed = True
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+        try:
+            _control_path(self.server_dir).unlink()
+        except Exception:
+            pass
+
+    def _accept_loop(self) -> None:
+        while not self._closed:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        with conn:
+            try:
+                req = json.loads(conn.makefile("r", encoding="utf-8").readline() or "{}")
+                if req.get("token") != self.token:
+                    resp = {"ok": False, "error": "トークンが一致しません"}
+                elif req.get("op") == "command":
+                    resp = self._command(str(req.get("command", "")))
+                elif req.get("op") == "stop":
+                    resp = self._stop(float(req.get("timeout", STOP_TIMEOUT)), bool(req.get("force")))
+                elif req.get("op") == "status":
+                    resp = {"ok": True, "running": self.proc.poll() is None, "server_pid": self.proc.pid,
+                            "metrics": self.sampler.ring.latest() if self.sampler else None,
+                            "summary": self.sampler.summary() if self.sampler else "",
+                            "telemetry": self.telemetry.summary() if self.telemetry else "",
+                            "events": [ev._asdict() for ev in self.telemetry.recent_events(10)] if self.telemetry else [],
+                            "gc": self.gc.summary() if self.gc else "",
+                            "players": self._players(),
+                            "metrics_port": self.metrics_port}
+                else:
+                    resp = {"ok": False, "error": f"不明な操作です: {req.get('op')}"}
+            except Exception as e:
+                resp = {"ok": False, "error": str(e)}
+            try:
+                conn.sendall((json.dumps(resp, ensure_ascii=False) + "\n").encode("utf-8"))
+            except Exception:
+                pass
+
+    def _players(self) -> str:
+        if self.status is None:
+            return ""
+        return describe_status(self.status.latest(self.server_dir.resolve().name))
+
+    def _command(self, cmd: str) -> dict:
+        if self.rcon is not None:
+            try:
+                return {"ok": True, "reply": self.rcon.command(cmd)}
+            except Exception:
+                pass
+        ok = write_console_command(self.proc, cmd, self.encoding)
+        return {"ok": ok} if ok else {"ok": False, "error": "サーバーは起動していません"}
+
+    def _stop(self, wait_timeout: float, force: bool) -> dict:
+        try:
+            write_console_command(self.proc, "stop", self.encoding)
+        except Exception:
+            pass
+        try:
+            self.proc.wait(timeout=wait_timeout)
+        except subprocess.TimeoutExpired:
+            if not force:
+                return {"ok": False, "error": "停止コマンドで終了しませんでした"}
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                return {"ok": False, "error": "強制終了に失敗しました"}
+        return {"ok": True, "returncode": self.proc.returncode}
+
+
+def control_request(server_dir: Path, payload: dict, timeout: float = 10.0) -> dict:
+    path = _control_path(server_dir)
+    if not path.exists():
+        raise RuntimeError(f"起動中のサーバーが見つかりません: {server_dir}")
+    info = json.loads(path.read_text(encoding="utf-8"))
+    payload = dict(payload, token=info.get("token"))
+    with socket.create_connection(("127.0.0.1", int(info["port"])), timeout=timeout) as s:
+        s.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        data = s.makefile("r", encoding="utf-8").readline()
+    if not data:
+        raise RuntimeError("制御ソケットから応答がありません")
+    return json.loads(data)
+
+
+def cmd_versions(args, cfg: dict) -> int:
+    stype = args.type or cfg.get("server_type", "paper")
+    if args.offline:
+        versions = catalog_versions(stype)
+        if not versions:
+            _err("ローカルカタログにバージョンがありません。一度オンラインで取得してください。")
+            return 1
+    else:
+        versions = fetch_server_versions(stype)
+    if args.limit:
+        versions = versions[:args.limit]
+    if args.json:
+        _out(json.dumps(versions))
+    else:
+        for v in versions:
+            _out(v)
+    return 0
+
+def cmd_setup(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    stype = args.type or cfg.get("server_type", "paper")
+    version = (args.version or cfg.get("version", "")).strip()
+    if not version:
+        _err("バージョンを指定してください (--version)。")
+        return 2
+    ram = args.ram or cfg.get("ram", "2048")
+    java_path = args.java if args.java is not None else cfg.get("java_path", "")
+    if args.profile:
+        cfg["jvm_profile"] = args.profile
+    launch_java = effective_java_path(java_path, version)
+    server_args = (args.args if args.args is not None else cfg.get("args", "")).strip() or jvm_args_for(cfg, ram, launch_java)
+
+    _out("セットアップ開始...")
+    settings = dict(cfg, java_path=java_path, args=server_args, ram=ram, server_type=stype, version=version)
+    jar_path = setup_server(server_dir, stype, version, server_args, launch_java, status_callback=_out, settings=settings)
+    _out(f"サーバーJAR: {jar_path}")
+
+    cfg.update({
+        "install_dir": str(server_dir),
+        "ram": ram,
+        "args": server_args,
+        "java_path": java_path,
+        "server_type": stype,
+        "version": version,
+    })
+    save_config(cfg)
+    _out("セットアップ完了")
+    return 0
+
+def cmd_appcds(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    if args.action == "clear":
+        _out(f"{clear_appcds(server_dir)} 個のファイルを削除しました")
+        return 0
+    if args.action in ("on", "off"):
+        cfg["appcds"] = args.action == "on"
+        save_config(cfg)
+        _out("AppCDS: " + ("有効" if cfg["appcds"] else "無効"))
+        return 0
+    archives = sorted((server_dir / APPCDS_DIR).glob("server-*.jsa"))
+    _out("AppCDS: " + ("有効" if cfg.get("appcds") else "無効"))
+    for a in archives:
+        _out(f"アーカイブ: {a} ({a.stat().st_size // (1024 * 1024)} MB)")
+    if not archives:
+        _out("アーカイブ: なし（次回の起動で学習します）")
+    entries = startup_history(server_dir)
+    for mode, (count, avg) in startup_summary(entries).items():
+        _out(f"{mode}\t{count} 回\t平均 {avg:.1f} 秒")
+    for e in entries[-args.limit:] if args.limit else entries:
+        _out(f"{e.get('at')}\t{e.get('appcds')}\t{e.get('seconds')} 秒\t(サーバー報告 {e.get('reported')} 秒)")
+    return 0
+
+def cmd_gc(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    if args.action in ("on", "off"):
+        cfg["gc_log"] = args.action == "on"
+        save_config(cfg)
+        _out("GC ログ: " + ("有効（次回の起動から記録します）" if cfg["gc_log"] else "無効"))
+        return 0
+    files = gc_log_files(server_dir)
+    if not files:
+        _out(f"GC ログがありません: {server_dir / GC_LOG_FILE}")
+        _out("'gc on' で有効化し、サーバーを再起動してください。")
+        return 1
+    report = analyze_gc_logs(server_dir).report()
+    if args.json:
+        _out(json.dumps(report, ensure_ascii=False))
+        return 0
+    _out("GC ログ: " + ", ".join(p.name for p in files))
+    _out(describe_gc_report(report))
+    return 0
+
+def cmd_diag(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    if args.action in ("on", "off"):
+        cfg["diagnostics"] = args.action == "on"
+        save_config(cfg)
+        _out("ラグ診断: " + ("有効（次回の起動から）" if cfg["diagnostics"] else "無効"))
+        return 0
+    if args.action == "capture":
+        if not _control_path(server_dir).exists():
+            _err("サーバーは起動していません。")
+            return 1
+        pid = control_request(server_dir, {"op": "status"}, timeout=5).get("server_pid")
+        manifest = load_launch_manifest(server_dir) or {}
+        diag = LagDiagnostics(server_dir, pid, manifest.get("java") or cfg.get("java_path", ""),
+                              jfr_seconds=args.jfr or 0, histogram=not args.no_histogram)
+        path, text = diag.capture("手動取得")
+        _out(text)
+        _out(f"保存先: {path}")
+        return 0
+    captures = list_captures(server_dir)
+    _out("ラグ診断: " + ("有効" if cfg.get("diagnostics") else "無効"))
+    if not captures:
+        _out(f"診断情報はありません: {server_dir / DIAG_DIR}")
+    for p in captures[-args.limit:] if args.limit else captures:
+        try:
+            head = (p / "summary.txt").read_text(encoding="utf-8").splitlines()[0]
+        except Exception:
+            head = ""
+        _out(f"{p.name}\t{head}")
+    return 0
+
+def cmd_java(args, cfg: dict) -> int:
+    runtimes = discover_java(rescan=args.rescan)
+    version = args.for_version or cfg.get("version", "")
+    if version:
+        rt = pick_java(version, runtimes)
+        _out(f"Minecraft {version}: {describe_java_requirement(version)} -> " + (describe_java(rt) if rt else "互換性のある Java がありません"))
+        if args.use and rt:
+            cfg["java_path"] = rt.path
+            save_config(cfg)
+            _out("設定ファイルに保存しました")
+    if args.json:
+        _out(json.dumps([rt._asdict() for rt in runtimes], ensure_ascii=False))
+    else:
+        for rt in runtimes:
+            _out(describe_java(rt))
+    if not runtimes:
+        _err("Java が見つかりませんでした。")
+        return 1
+    return 0
+
+def cmd_jvm(args, cfg: dict) -> int:
+    if args.list:
+        for name, desc in JVM_PROFILES.items():
+            _out(f"{name}\t{desc}")
+        return 0
+    profile = args.profile or cfg.get("jvm_profile") or DEFAULT_JVM_PROFILE
+    ram = args.ram or cfg.get("ram", "2048")
+    java_path = args.java if args.java is not None else cfg.get("java_path", "")
+    major = java_major_version(effective_java_path(java_path, cfg.get("version", ""))) if profile in ("zgc", "shenandoah") else None
+    result = build_jvm_profile(profile, ram, major)
+    _out(result.args if args.args_only else describe_jvm_profile(result))
+    if args.save:
+        cfg["jvm_profile"] = result.name
+        cfg["args"] = result.args
+        save_config(cfg)
+    return 0
+
+def _detach(argv: list[str], server_dir: Path) -> int:
+    log_path = server_dir / DAEMON_LOG
+    ensure_dir(log_path.parent)
+    cmd = [sys.executable, str(Path(__file__).resolve())] + [a for a in argv if a != "--detach"]
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    with open(log_path, "ab") as log:
+        child = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **kwargs)
+    _out(f"バックグラウンドで起動しました (pid {child.pid}, ログ: {log_path})")
+    return 0
+
+def _pump_output(proc: subprocess.Popen, encoding: str, recorder: StartupRecorder | None = None,
+                 telemetry: LagTelemetry | None = None, hibernator: Hibernator | None = None) -> None:
+    reader = ChunkedLineReader(proc.stdout.fileno(), encoding=encoding)
+    try:
+        while True:
+            lines = reader.read_batch()
+            if lines is None:
+                break
+            if lines:
+                if telemetry is not None:
+                    telemetry.feed(lines)
+                if hibernator is not None:
+                    hibernator.feed(lines)
+                if recorder is not None and not recorder.done and recorder.feed(lines) is not None:
+                    _err(f"{timestamp()}起動完了: {recorder.seconds:.1f} 秒 (AppCDS: {recorder.mode})")
+                ts = timestamp()
+                sys.stdout.write("".join(ts + line + "\n" for line in lines))
+                sys.stdout.flush()
+    except Exception:
+        pass
+
+def _pump_input(proc: subprocess.Popen, encoding: str) -> None:
+    try:
+        for line in sys.stdin:
+            cmd = line.rstrip("\r\n")
+            if cmd and not write_console_command(proc, cmd, encoding):
+                break
+    except Exception:
+        pass
+
+def _control_owner(server_dir: Path) -> str | None:
+    if _control_path(server_dir).exists():
+        try:
+            if control_request(server_dir, {"op": "status"}, timeout=2).get("running"):
+                return "mc_cli start"
+        except Exception:
+            pass
+    return None
+
+def cmd_start(args, cfg: dict, argv: list[str]) -> int:
+    server_dir = _server_dir(args, cfg)
+    if _control_owner(server_dir):
+        _err("サーバーはすでに起動しています。")
+        return 1
+    settings = dict(cfg,
+                    java_path=args.java if args.java is not None else cfg.get("java_path", ""),
+                    args=args.args if args.args is not None else cfg.get("args", ""),
+                    ram=args.ram or cfg.get("ram", "2048"),
+                    jvm_profile=args.profile or cfg.get("jvm_profile"),
+                    gc_log=args.gc_log if args.gc_log is not None else cfg.get("gc_log", False))
+    manifest, note = prepare_launch(server_dir, settings, Path(args.jar) if args.jar else None)
+    if not manifest:
+        _err("サーバーJARが見つかりません。先にセットアップするか、サーバーJARを設置してください。")
+        return 1
+    if args.detach:
+        return _detach(argv, server_dir)
+    if note:
+        _out(note)
+    minutes = args.hibernate if args.hibernate is not None else hibernate_minutes(cfg)
+    if minutes <= 0:
+        return _run_server(args, cfg, server_dir, manifest)
+    wake = threading.Event()
+    hibernator = Hibernator(minutes, None, wake.set, cfg.get("hibernate_motd", "")).start()
+    try:
+        while True:
+            rc = _run_server(args, cfg, server_dir, manifest, hibernator)
+            if not hibernator.server_stopped(server_dir):
+                return rc
+            _out(timestamp() + "休止中（接続があると自動で起動します）")
+            while not wake.wait(0.5):
+                pass
+            wake.clear()
+            hibernator.resume()
+            _out(timestamp() + "接続を検知したためサーバーを起動します")
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        hibernator.stop()
+
+def _run_server(args, cfg: dict, server_dir: Path, manifest: dict, hibernator: Hibernator | None = None) -> int:
+    java_path = manifest["java"]
+    warning = check_java_compat(java_path, cfg.get("version", "")) if cfg.get("version") else None
+    if warning:
+        _err("警告: " + warning)
+    encoding = cfg.get("console_encoding") or CONSOLE_ENCODING
+    cmd = manifest_command(manifest)
+    mode = "off"
+    if args.appcds if args.appcds is not None else cfg.get("appcds", False):
+        cmd, mode = with_appcds(cmd, server_dir, server_dir / manifest["target"], java_path)
+    recorder = StartupRecorder(server_dir, mode)
+    launched_at = time.time()
+    proc = launch_server(cmd, server_dir, env=manifest_env(manifest))
+    control = ControlServer(server_dir, proc, encoding)
+    diag = diagnostics_from_config(cfg, server_dir, proc.pid, java_path,
+                                   lambda path, text: _err(timestamp() + (f"診断情報を保存しました: {path}" if path else text)))
+
+    def on_alert(ev):
+        _err(f"{timestamp()}警告: {ev.message}")
+        if diag is not None:
+            diag.trigger(ev)
+    telemetry = telemetry_from_config(cfg, on_alert)
+    control.telemetry = telemetry
+    gc, gc_tailer = start_gc_monitor(server_dir, manifest, launched_at, telemetry.gc_pause)
+    control.gc = gc
+    try:
+        commands = get_provider(cfg.get("server_type", "paper")).telemetry_commands(cfg.get("version", ""))
+    except Exception:
+        commands = ()
+    rcon = rcon_for_server(server_dir)
+    control.rcon = rcon
+    poller = TelemetryPoller(lambda c: write_console_command(proc, c, encoding), commands,
+                             telemetry_poll_interval(cfg), ready=lambda: recorder.done,
+                             send_many=rcon_batch_sender(rcon, telemetry.feed_reply) if rcon else None).start()
+    status = None
+    if status_poll_interval(cfg) > 0:
+        on_status = (lambda name, st: hibernator.observe_status(st)) if hibernator else None
+        status = StatusPoller(status_poll_interval(cfg), on_result=on_status).add_target(server_dir.resolve().name, *status_address(server_dir)).start()
+    control.status = status
+    sampler = ProcessSampler(proc.pid, cfg.get("metrics_interval", METRICS_INTERVAL),
+                             cfg.get("metrics_history", METRICS_HISTORY)).start()
+    control.sampler = sampler
+    metrics = None
+    port = args.metrics_port if args.metrics_port is not None else int(cfg.get("metrics_port") or 0)
+    if port:
+        try:
+            metrics = MetricsServer(port).start()
+            labels = {"instance": server_dir.resolve().name}
+            metrics.add_collector(lambda: sampler.collect(labels) + telemetry.collect(labels)
+                                  + (gc.collect(labels) if gc else []) + (status.collect() if status else []))
+            control.metrics_port = metrics.port
+            _out(f"メトリクス: http://{metrics.host}:{metrics.port}/metrics")
+        except OSError as e:
+            _err(f"メトリクスサーバーを開始できません (port {port}): {e}")
+    if hibernator is not None:
+        def on_idle():
+            _out(timestamp() + f"{hibernator.idle_seconds / 60:.0f} 分間プレイヤーがいないためサーバーを休止します")
+            control._stop(STOP_TIMEOUT, force=True)
+        hibernator.on_idle = on_idle
+        hibernator.ready = lambda: recorder.done
+    control.start()
+    _out(timestamp() + "起動: " + " ".join(cmd))
+
+    threading.Thread(target=_pump_input, args=(proc, encoding), daemon=True).start()
+    reader = threading.Thread(target=_pump_output, args=(proc, encoding, recorder, telemetry, hibernator), daemon=True)
+    reader.start()
+    try:
+        while proc.poll() is None:
+            try:
+                proc.wait(timeout=0.5)
+            except subprocess.TimeoutExpired:
+                pass
+    except KeyboardInterrupt:
+        _out(timestamp() + "停止コマンド送信、終了待ち...")
+        resp = control._stop(STOP_TIMEOUT, force=True)
+        if not resp.get("ok"):
+            _err(resp.get("error", "停止に失敗しました"))
+    finally:
+        reader.join(timeout=5)
+        sampler.stop()
+        poller.stop()
+        if status is not None:
+            status.stop()
+        if rcon is not None:
+            rcon.close()
+        if gc_tailer is not None:
+            gc_tailer.stop()
+        if metrics is not None:
+            metrics.close()
+        control.close()
+        close_process_pipes(proc)
+    _out(timestamp() + f"サーバー停止（終了コード {proc.returncode}）")
+    return 0 if proc.returncode in (0, None) else proc.returncode
+
+def cmd_status(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    if not _control_path(server_dir).exists():
+        st = query_many({"server": status_address(server_dir)}, STATUS_TIMEOUT)["server"]
+        if args.json:
+            _out(json.dumps({"ok": True, "running": st.online, "players": describe_status(st) if st.online else ""}, ensure_ascii=False))
+        elif st.online:
+            _out("起動中（このツールの管理外）")
+            _out(describe_status(st))
+        else:
+            _out("停止中")
+        return 0 if st.online else 3
+    resp = control_request(server_dir, {"op": "status"}, timeout=5)
+    if args.json:
+        _out(json.dumps(resp, ensure_ascii=False))
+        return 0 if resp.get("running") else 3
+    _out(("起動中" if resp.get("running") else "停止中") + f" (pid {resp.get('server_pid')})")
+    if resp.get("summary"):
+        _out(resp["summary"])
+    if resp.get("telemetry"):
+        _out(resp["telemetry"])
+    if resp.get("players"):
+        _out(resp["players"])
+    if resp.get("gc"):
+        _out(resp["gc"])
+    for ev in resp.get("events") or []:
+        _out(time.strftime("%H:%M:%S", time.localtime(ev["at"])) + " " + ev["message"])
+    if resp.get("metrics_port"):
+        _out(f"メトリクス: http://127.0.0.1:{resp['metrics_port']}/metrics")
+    return 0 if resp.get("running") else 3
+
+def cmd_ping(args, cfg: dict) -> int:
+    if args.targets:
+        targets = {t: parse_address(t) for t in args.targets}
+    else:
+        server_dir = _server_dir(args, cfg)
+        targets = {server_dir.resolve().name: status_address(server_dir)}
+    if args.port:
+        targets = {name: (host, args.port) for name, (host, _) in targets.items()}
+    results = query_many(targets, args.timeout)
+    if args.json:
+        _out(json.dumps({name: st._asdict() for name, st in results.items()}, ensure_ascii=False))
+    else:
+        for name, st in results.items():
+            host, port = targets[name]
+            line = f"{host}:{port}  {describe_status(st)}"
+            if st.online and (st.version or st.motd):
+                line += f"  [{st.version}] {st.motd}".rstrip()
+            _out(line)
+    return 0 if all(st.online for st in results.values()) else 3
+
+def cmd_instances(args, cfg: dict) -> int:
+    registry = InstanceRegistry(cfg, external_owner=_control_owner)
+    if args.action == "add":
+        if len(args.names) != 1:
+            raise RuntimeError("add にはインスタンス名を 1 つ指定してください")
+        registry.add(args.names[0], str(_server_dir(args, cfg).resolve()), server_type=args.type, version=args.version,
+                     ram=args.ram, java_path=args.java, args=args.args, jvm_profile=args.profile)
+        _out(f"登録しました: {args.names[0]}")
+        return 0
+    if args.action == "remove":
+        for name in args.names:
+            registry.remove(name)
+            _out(f"削除しました: {name}")
+        return 0
+    names = args.names or registry.names()
+    for name in names:
+        registry.get(name)
+    if args.action == "list":
+        results = query_many({n: status_address(registry.get(n).server_dir) for n in names}) if names else {}
+        if args.json:
+            _out(json.dumps([dict(registry.get(n).profile, name=n, status=results[n]._asdict()) for n in names], ensure_ascii=False))
+            return 0
+        if not names:
+            _out("インスタンスが登録されていません")
+        for name in names:
+            st = results[name]
+            _out(f"{name:<16} {'起動中' if st.online else '停止中'}  {describe_status(st) if st.online else ''}  {registry.get(name).server_dir}")
+        return 0
+    if not names:
+        _err("インスタンスが登録されていません（instances add NAME --dir ...）")
+        return 1
+    width = max(len(n) for n in names)
+
+    def on_output(inst, lines):
+        sys.stdout.write("".join(f"{inst.name:<{width}} | {line}" for line in lines))
+        sys.stdout.flush()
+    registry.on_output = on_output
+    registry.on_state = lambda inst: _err(f"{timestamp()}{inst.name}: {INSTANCE_STATES.get(inst.state, inst.state)}")
+
+    def pump_input():
+        try:
+            for line in sys.stdin:
+                target, sep, cmd = line.strip().partition(":")
+                if sep and target.strip() in registry.instances:
+                    registry.get(target.strip()).send(cmd.strip())
+                elif line.strip():
+                    for inst in registry.running():
+                        inst.send(line.strip())
+        except Exception:
+            pass
+    threading.Thread(target=pump_input, daemon=True).start()
+    errors = registry.start(names)
+    for name, error in errors.items():
+        _err(f"{name}: {error}")
+    try:
+        while registry.running():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        _out(timestamp() + "全インスタンスを停止しています...")
+        registry.stop(names, args.timeout)
+    finally:
+        registry.close()
+    return 1 if errors else 0
+
+def _direct_rcon(args, server_dir: Path) -> RconClient:
+    host, port, password = rcon_settings(server_dir) or ("127.0.0.1", RCON_DEFAULT_PORT, "")
+    host = getattr(args, "host", None) or host
+    port = getattr(args, "port", None) or port
+    password = getattr(args, "password", None) or password
+    if not password:
+        raise RuntimeError("RCON が設定されていません（server.properties の enable-rcon / rcon.password、または --password）")
+    return RconClient(host, port, password)
+
+def cmd_stop(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    if not _control_path(server_dir).exists() and rcon_settings(server_dir):
+        rcon = _direct_rcon(args, server_dir)
+        reply = rcon.command("stop")
+        rcon.close()
+        _out(reply or "停止コマンドを送信しました（RCON）")
+        return 0
+    resp = control_request(server_dir, {"op": "stop", "timeout": args.timeout, "force": args.force},
+                           timeout=args.timeout + 10)
+    if not resp.get("ok"):
+        _err(resp.get("error", "停止に失敗しました"))
+        return 1
+    _out("サーバー停止しました")
+    return 0
+
+def cmd_send(args, cfg: dict) -> int:
+    server_dir = _server_dir(args, cfg)
+    command = " ".join(args.command)
+    if args.rcon or args.host or args.password or (not _control_path(server_dir).exists() and rcon_settings(server_dir)):
+        rcon = _direct_rcon(args, server_dir)
+        try:
+            reply = rcon.command(command)
+        finally:
+            rcon.close()
+        if reply:
+            _out(reply)
+        return 0
+    resp = control_request(server_dir, {"op": "command", "command": command})
+    if not resp.get("ok"):
+        _err(resp.get("error", "送信に失敗しました"))
+        return 1
+    if resp.get("reply"):
+        _out(resp["reply"])
+    return 0
+
+def cmd_props(args, cfg: dict) -> int:
+    prop_path = _server_dir(args, cfg) / "server.properties"
+    props = read_properties(prop_path)
+    if args.action == "list":
+        for k, v in props.items():
+            _out(f"{k}={v}")
+    elif args.action == "get":
+        for key in args.items:
+            if key not in props:
+                _err(f"未設定: {key}")
+                return 1
+            _out(props[key])
+    else:
+        updates = {}
+        for item in args.items:
+            if "=" not in item:
+                _err(f"KEY=VALUE 形式で指定してください: {item}")
+                return 2
+            k, v = item.split("=", 1)
+            updates[k.strip()] = v
+        write_properties(prop_path, updates)
+        _out(f"server.properties を保存しました ({len(updates)} 件)")
+    return 0
+
+def measure_import_time(module: str) -> tuple[float, list[tuple[int, int, str]]]:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=str(APP_DIR), capture_output=True, text=True, timeout=60)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"import {module} failed")
+    rows = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2].rstrip()
+        rows.append((self_us, cumulative_us, name.strip()))
+        if name.strip() == module and not name.startswith("  "):
+            total_us = cumulative_us
+    return total_us / 1000, rows
+
+def measure_first_window(timeout: float = 60.0) -> float:
+    env = dict(os.environ, MCSOFT_STARTUP_PROBE=repr(time.time()))
+    proc = subprocess.run([sys.executable, str(APP_DIR / "MC_ServerSoft.py")], cwd=str(APP_DIR),
+                          env=env, capture_output=True, text=True, timeout=timeout)
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP_READY "):
+            return float(line.split()[1])
+    err = proc.stderr.strip().splitlines()
+    raise RuntimeError(err[-1] if err else "GUI が起動完了を報告しませんでした")
+
+def cmd_bench_startup(args, cfg: dict) -> int:
+    budget = args.budget_ms or float(cfg.get("startup_budget_ms", STARTUP_BUDGET_MS))
+    over = False
+    for module in ("mc_cli", "MC_ServerSoft"):
+        samples = []
+        rows = []
+        for _ in range(max(1, args.runs)):
+            total, rows = measure_import_time(module)
+            samples.append(total)
+        _out(f"import {module}: 最小 {min(samples):.1f} ms / 平均 {sum(samples) / len(samples):.1f} ms")
+        for self_us, cumulative_us, name in sorted(rows, reverse=True)[:args.top]:
+            _out(f"    self {self_us / 1000:8.1f} ms  cumulative {cumulative_us / 1000:8.1f} ms  {name}")
+    if args.skip_gui:
+        return 0
+    try:
+        samples = [measure_first_window() for _ in range(max(1, args.runs))]
+    except Exception as e:
+        _err(f"GUI 起動時間を計測できませんでした: {e}")
+        return 1
+    best = min(samples)
+    _out(f"最初の操作可能ウィンドウまで: 最小 {best:.1f} ms / 平均 {sum(samples) / len(samples):.1f} ms (予算 {budget:.0f} ms)")
+    if best > budget:
+        over = True
+        _err(f"起動時間が予算を超えています: {best:.1f} ms > {budget:.0f} ms")
+    return 1 if over else 0
+
+def measure_console(mode: str, total: int, tick_ms: int, per_tick: int, scrollback: int, timeout: float) -> tuple[int, float]:
+    import tkinter as tk
+    root = tk.Tk()
+    root.geometry("900x500")
+    text = tk.Text(root, wrap="none", state="disabled")
+    text.pack(fill="both", expand=True)
+    root.update()
+    line = "[12:34:56] [Server thread/INFO]: " + "x" * 80 + "\n"
+    shown = [0]
+
+    def show(chunk: str, count: int, trimmed: int = 0) -> None:
+        text.configure(state="normal")
+        text.insert("end", chunk)
+        if trimmed:
+            text.delete("1.0", f"{trimmed + 1}.0")
+        text.see("end")
+        text.configure(state="disabled")
+        shown[0] += count
+        if shown[0] >= total:
+            root.quit()
+
+    if mode == "per-line":
+        def produce():
+            for _ in range(total):
+                text.after(0, show, line, 1)
+    else:
+        buffer = ConsoleBuffer(max_lines=total)
+        ring = ConsoleScrollback(scrollback)
+
+        def produce():
+            for _ in range(total):
+                buffer.push(line)
+
+        def tick():
+            lines = buffer.drain(per_tick)
+            if lines:
+                show("".join(lines), len(lines), ring.extend(lines))
+            if shown[0] < total:
+                root.after(tick_ms, tick)
+        root.after(tick_ms, tick)
+
+    root.after(int(timeout * 1000), root.quit)
+    started = time.perf_counter()
+    threading.Thread(target=produce, daemon=True).start()
+    root.mainloop()
+    elapsed = time.perf_counter() - started
+    root.destroy()
+    return shown[0], elapsed
+
+def cmd_bench_console(args, cfg: dict) -> int:
+    def num(key, default):
+        try:
+            return int(cfg.get(key, default))
+        except (TypeError, ValueError):
+            return default
+    tick_ms = args.tick_ms or num("console_tick_ms", CONSOLE_TICK_MS)
+    per_tick = args.per_tick or num("console_max_lines_per_tick", CONSOLE_MAX_LINES_PER_TICK)
+    scrollback = num("console_scrollback_lines", CONSOLE_SCROLLBACK_LINES)
+    _out(f"{args.lines} 行 / tick {tick_ms} ms / 1 tick 最大 {per_tick} 行 / スクロールバック {scrollback} 行")
+    for mode in args.mode:
+        try:
+            shown, elapsed = measure_console(mode, args.lines, tick_ms, per_tick, scrollback, args.timeout)
+        except Exception as e:
+            _err(f"コンソールを計測できませんでした（ディスプレイが必要です）: {e}")
+            return 1
+        note = "" if shown >= args.lines else f"  ※ {args.timeout:.0f} 秒で打ち切り"
+        _out(f"{mode:>8}: {shown} 行 / {elapsed:.2f} 秒 = {shown / elapsed:.0f} 行/秒{note}")
+    return 0
+
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="mc_cli", description="Minecraft サーバー管理 (ヘッドレス)")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    sub = parser.add_subparsers(dest="command_name", required=True)
+
+    def add_dir(p):
+        p.add_argument("--dir", help="サーバーフォルダ（省略時は設定ファイルの install_dir）")
+
+    p = sub.add_parser("versions", help="バージョン一覧取得")
+    p.add_argument("--type", choices=provider_names())
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--offline", action="store_true", help="ローカルカタログのみを参照する")
+
+    p = sub.add_parser("setup", help="ダウンロード＆セットアップ")
+    add_dir(p)
+    p.add_argument("--type", choices=provider_names())
+    p.add_argument("--version", dest="version")
+    p.add_argument("--ram")
+    p.add_argument("--java")
+    p.add_argument("--args")
+    p.add_argument("--profile", choices=list(JVM_PROFILES), help="引数未指定時に使う JVM プロファイル")
+
+    p = sub.add_parser("start", help="サーバー開始（フォアグラウンド）")
+    add_dir(p)
+    p.add_argument("--jar")
+    p.add_argument("--ram")
+    p.add_argument("--java")
+    p.add_argument("--args")
+    p.add_argument("--profile", choices=list(JVM_PROFILES), help="引数未指定時に使う JVM プロファイル")
+    p.add_argument("--appcds", action=argparse.BooleanOptionalAction, default=None, help="AppCDS アーカイブで起動を高速化する")
+    p.add_argument("--gc-log", action=argparse.BooleanOptionalAction, default=None, help=f"GC ログを {GC_LOG_FILE} に記録して分析する")
+    p.add_argument("--metrics-port", type=int, help="Prometheus 形式のメトリクスを公開するポート（0 で無効）")
+    p.add_argument("--hibernate", type=float, metavar="MINUTES", help="プレイヤー不在がこの分数続いたら休止し、接続時に再起動する（0 で無効）")
+    p.add_argument("--detach", action="store_true", help="バックグラウンドで起動する")
+
+    p = sub.add_parser("status", help="サーバーの状態とリソース使用量")
+    add_dir(p)
+    p.add_argument("--json", action="store_true")
+
+    p = sub.add_parser("ping", help="Server List Ping でプレイヤー数・応答時間を取得")
+    add_dir(p)
+    p.add_argument("targets", nargs="*", metavar="HOST[:PORT]", help="省略時は server.properties のポート")
+    p.add_argument("--port", type=int, help="ポートを上書きする")
+    p.add_argument("--timeout", type=float, default=STATUS_TIMEOUT)
+    p.add_argument("--json", action="store_true")
+
+    p = sub.add_parser("instances", help="複数サーバーの登録・一括起動（run は 1 プロセスで全インスタンスを監視）")
+    add_dir(p)
+    p.add_argument("action", nargs="?", default="list", choices=("list", "add", "remove", "run"))
+    p.add_argument("names", nargs="*", help="インスタンス名（run / list で省略時は全て）。run 中は NAME:コマンド で個別に送信")
+    p.add_argument("--type", choices=provider_names())
+    p.add_argument("--version", dest="version")
+    p.add_argument("--ram")
+    p.add_argument("--java")
+    p.add_argument("--args")
+    p.add_argument("--profile", choices=list(JVM_PROFILES))
+    p.add_argument("--timeout", type=float, default=INSTANCE_STOP_TIMEOUT, help="一括停止の待ち時間（秒）")
+    p.add_argument("--json", action="store_true")
+
+    p = sub.add_parser("appcds", help="AppCDS アーカイブの状態・起動時間の履歴")
+    add_dir(p)
+    p.add_argument("action", nargs="?", default="status", choices=("status", "on", "off", "clear"))
+    p.add_argument("--limit", type=int, default=10)
+
+    p = sub.add_parser("gc", help="GC ログの記録設定・停止時間の分析")
+    add_dir(p)
+    p.add_argument("action", nargs="?", default="report", choices=("report", "on", "off"))
+    p.add_argument("--json", action="store_true")
+
+    p = sub.add_parser("diag", help="ラグ発生時のスレッドダンプ・クラスヒストグラム取得")
+    add_dir(p)
+    p.add_argument("action", nargs="?", default="list", choices=("list", "capture", "on", "off"))
+    p.add_argument("--jfr", type=int, metavar="SECONDS", help="capture 時に JFR 記録も開始する")
+    p.add_argument("--no-histogram", action="store_true", help="GC.class_histogram（Full GC を伴う）を取得しない")
+    p.add_argument("--limit", type=int, default=10)
+
+    p = sub.add_parser("java", help="インストール済み Java の検出")
+    p.add_argument("--for", dest="for_version", help="この Minecraft バージョンに合う Java を選ぶ")
+    p.add_argument("--use", action="store_true", help="選んだ Java を設定ファイルに保存する")
+    p.add_argument("--rescan", action="store_true", help="検出結果を再取得する")
+    p.add_argument("--json", action="store_true")
+
+    p = sub.add_parser("jvm", help="JVM チューニングプロファイルのプレビュー・保存")
+    p.add_argument("--profile", choices=list(JVM_PROFILES))
+    p.add_argument("--ram")
+    p.add_argument("--java")
+    p.add_argument("--list", action="store_true", help="プロファイル一覧")
+    p.add_argument("--args-only", action="store_true", help="引数のみを出力する")
+    p.add_argument("--save", action="store_true", help="プロファイルと引数を設定ファイルに保存する")
+
+    p = sub.add_parser("stop", help="サーバー停止")
+    add_dir(p)
+    p.add_argument("--timeout", type=float, default=STOP_TIMEOUT)
+    p.add_argument("--force", action="store_true", help="時間内に終了しなければ強制終了")
+
+    p = sub.add_parser("send", help="コンソールコマンド送信")
+    add_dir(p)
+    p.add_argument("command", nargs="+")
+    p.add_argument("--rcon", action="store_true", help="制御ソケットを使わず RCON で直接送信する")
+    p.add_argument("--host", help="RCON ホスト（省略時は server.properties）")
+    p.add_argument("--port", type=int, help="RCON ポート")
+    p.add_argument("--password", help="RCON パスワード")
+
+    p = sub.add_parser("props", help="server.properties の参照・編集")
+    add_dir(p)
+    p.add_argument("action", choices=("list", "get", "set"))
+    p.add_argument("items", nargs="*", help="get: KEY ... / set: KEY=VALUE ...")
+
+    p = sub.add_parser("bench-startup", help="起動時間の計測（import 内訳と最初のウィンドウ表示まで）")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--top", type=int, default=10)
+    p.add_argument("--budget-ms", type=float, default=0)
+    p.add_argument("--skip-gui", action="store_true")
+
+    p = sub.add_parser("bench-console", help="コンソール表示の速度計測（1 行ずつ after と tick まとめ描画の比較）")
+    p.add_argument("--lines", type=int, default=100000)
+    p.add_argument("--mode", nargs="+", choices=("per-line", "tick"), default=["per-line", "tick"])
+    p.add_argument("--tick-ms", type=int, default=0)
+    p.add_argument("--per-tick", type=int, default=0)
+    p.add_argument("--timeout", type=float, default=300)
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = build_parser().parse_args(argv)
+    cfg = load_config()
+    try:
+        if args.command_name == "versions":
+            return cmd_versions(args, cfg)
+        if args.command_name == "setup":
+            return cmd_setup(args, cfg)
+        if args.command_name == "start":
+            return cmd_start(args, cfg, argv)
+        if args.command_name == "status":
+            return cmd_status(args, cfg)
+        if args.command_name == "stop":
+            return cmd_stop(args, cfg)
+        if args.command_name == "send":
+            return cmd_send(args, cfg)
+        if args.command_name == "instances":
+            return cmd_instances(args, cfg)
+        if args.command_name == "ping":
+            return cmd_ping(args, cfg)
+        if args.command_name == "appcds":
+            return cmd_appcds(args, cfg)
+        if args.command_name == "gc":
+            return cmd_gc(args, cfg)
+        if args.command_name == "diag":
+            return cmd_diag(args, cfg)
+        if args.command_name == "java":
+            return cmd_java(args, cfg)
+        if args.command_name == "jvm":
+            return cmd_jvm(args, cfg)
+        if args.command_name == "bench-startup":
+            return cmd_bench_startup(args, cfg)
+        if args.command_name == "bench-console":
+            return cmd_bench_console(args, cfg)
+        return cmd_props(args, cfg)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        _err(f"エラー: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1250 @@
+import os
+import time
+import threading
+import subprocess
+import socket
+import json
+import re
+import sqlite3
+import codecs
+import hashlib
+import shutil
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime
+
+
+def _http():
+    import requests
+    return requests
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def http_session():
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = _create_http_session(load_config())
+    return _http_session
+
+def _create_http_session(cfg: dict):
+    requests = _http()
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    def num(key, default, cast):
+        try:
+            return cast(cfg.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    retry = Retry(
+        total=num("http_retries", HTTP_RETRIES, int),
+        connect=num("http_retries", HTTP_RETRIES, int),
+        read=num("http_retries", HTTP_RETRIES, int),
+        backoff_factor=num("http_backoff", HTTP_BACKOFF, float),
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=num("http_pool_connections", HTTP_POOL_CONNECTIONS, int),
+        pool_maxsize=num("http_pool_maxsize", HTTP_POOL_MAXSIZE, int),
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "User-Agent": f"MC_ServerSoft/{__version__}",
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+def reset_http_session() -> None:
+    global _http_session
+    with _http_session_lock:
+        if _http_session is not None:
+            try:
+                _http_session.close()
+            except Exception:
+                pass
+        _http_session = None
+
+def _http_cache_ttl() -> float:
+    try:
+        return float(load_config().get("http_cache_ttl", HTTP_CACHE_TTL))
+    except (TypeError, ValueError):
+        return HTTP_CACHE_TTL
+
+def _http_cache_paths(url: str) -> tuple[Path, Path]:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    base = config_path().parent / HTTP_CACHE_DIR / key[:2]
+    return base / f"{key}.json", base / f"{key}.body"
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    ensure_dir(path.parent)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def cached_get(url: str, ttl: float | None = None, timeout: float = 10, headers: dict | None = None) -> bytes:
+    if ttl is None:
+        ttl = _http_cache_ttl()
+    meta_path, body_path = _http_cache_paths(url)
+    meta = None
+    if meta_path.exists() and body_path.exists():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            meta = None
+    if meta and time.time() - float(meta.get("fetched", 0)) < ttl:
+        try:
+            return body_path.read_bytes()
+        except OSError:
+            meta = None
+
+    req_headers = dict(headers or {})
+    if meta:
+        if meta.get("etag"):
+            req_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            req_headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        r = http_session().get(url, headers=req_headers, timeout=timeout)
+        if r.status_code == 304 and meta:
+            body = body_path.read_bytes()
+        else:
+            r.raise_for_status()
+            body = r.content
+            _write_atomic(body_path, body)
+            meta = {"url": url}
+        meta.update({
+            "fetched": time.time(),
+            "etag": r.headers.get("ETag") or meta.get("etag"),
+            "last_modified": r.headers.get("Last-Modified") or meta.get("last_modified"),
+        })
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        return body
+    except Exception:
+        if meta and body_path.exists():
+            return body_path.read_bytes()
+        raise
+
+def cached_get_json(url: str, ttl: float | None = None, timeout: float = 10):
+    return json.loads(cached_get(url, ttl=ttl, timeout=timeout))
+
+def cached_get_text(url: str, ttl: float | None = None, timeout: float = 10) -> str:
+    return cached_get(url, ttl=ttl, timeout=timeout).decode("utf-8", errors="replace")
+
+def _load_beautifulsoup():
+    try:
+        from bs4 import BeautifulSoup
+    except Exception:
+        return None
+    return BeautifulSoup
+
+
+__version__ = "2.0.0"
+
+CONFIG_FILENAME = "mc_server_config.json"
+
+CONSOLE_TICK_MS = 50
+CONSOLE_MAX_LINES_PER_TICK = 500
+CONSOLE_SCROLLBACK_LINES = 5000
+CONSOLE_BUFFER_MAX_LINES = 20000
+CONSOLE_OVERFLOW_LOG = "logs/console-overflow.log"
+CONSOLE_ENCODING = "utf-8"
+READER_CHUNK_SIZE = 64 * 1024
+STARTUP_BUDGET_MS = 1500
+
+HTTP_POOL_CONNECTIONS = 8
+HTTP_POOL_MAXSIZE = 4
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+HTTP_CACHE_DIR = "cache/http"
+HTTP_CACHE_TTL = 600
+HTTP_CACHE_TTL_IMMUTABLE = 30 * 24 * 3600
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+DOWNLOAD_STATE_FLUSH_BYTES = 4 * 1024 * 1024
+
+CATALOG_DB = "cache/catalog.sqlite3"
+CATALOG_SCHEMA = 3
+CATALOG_BUILD_TTL = 600
+
+JAR_STORE_DIR = "cache/jars"
+JAR_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+FICLONE = 0x40049409
+
+PROPERTY_DEFINITIONS = [
+    ("motd", "サーバー名 (MOTD)", "A Minecraft Server", False),
+    ("server-port", "サーバーポート", "25565", False),
+    ("server-ip", "サーバーIP（空欄で自動）", "", False),
+    ("max-players", "最大プレイヤー数", "20", False),
+    ("online-mode", "オンラインモード（true=認証あり）", "true", True),
+    ("level-name", "ワールド名", "world", False),
+    ("level-seed", "ワールドシード", "", False),
+    ("gamemode", "ゲームモード", "survival", False),
+    ("difficulty", "難易度 (0=peaceful,1=easy,2=normal,3=hard)", "1", False),
+    ("pvp", "PvP を有効にする", "true", True),
+    ("view-distance", "ビュー距離 (チャンク)", "10", False),
+    ("spawn-monsters", "モンスター生成", "true", True),
+    ("spawn-npcs", "NPC 生成", "true", True),
+    ("spawn-animals", "動物生成", "true", True),
+    ("spawn-protection", "スポーン保護範囲", "16", False),
+    ("enforce-whitelist", "ホワイトリストを強制", "false", True),
+    ("enable-command-block", "コマンドブロックを許可", "false", True),
+    ("allow-flight", "飛行を許可", "false", True),
+    ("generate-structures", "構造物を生成", "true", True),
+    ("level-type", "ワールドタイプ", "default", False),
+    ("snooper-enabled", "Snooper 送信を有効", "true", True),
+    ("resource-pack", "リソースパック URL", "", False),
+    ("enable-rcon", "RCON を有効にする", "false", True),
+    ("rcon.password", "RCON パスワード", "", False),
+    ("rcon.port", "RCON ポート", "25575", False),
+    ("max-tick-time", "最大ティック時間 (ms)", "60000", False),
+    ("function-permission-level", "関数の権限レベル", "2", False),
+    ("op-permission-level", "OP 権限レベル", "4", False),
+    ("query.enabled", "Query を有効にする", "false", True),
+    ("query.port", "Query ポート", "25565", False),
+    ("debug", "デバッグモード", "false", True),
+    ("allow-nether", "ネザーを許可", "true", True),
+    ("announce-player-achievements", "実績通知 (古い)", "true", True),
+]
+
+
+def ensure_dir(p: Path) -> None:
+    p.mkdir(parents=True, exist_ok=True)
+
+def _new_hashers(expected_hashes: dict | None) -> dict:
+    hashers = {"sha256": hashlib.sha256()}
+    for alg in (expected_hashes or {}):
+        try:
+            hashers[alg] = hashlib.new(alg)
+        except ValueError:
+            pass
+    return hashers
+
+def _hash_file(path: Path, algorithms) -> dict:
+    hashers = {alg: hashlib.new(alg) for alg in algorithms}
+    if not hashers:
+        return {}
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(DOWNLOAD_CHUNK_SIZE * 4)
+            if not chunk:
+                break
+            for h in hashers.values():
+                h.update(chunk)
+    return {alg: h.hexdigest() for alg, h in hashers.items()}
+
+def _verify_hashes(actual: dict, expected_hashes: dict | None) -> None:
+    for alg, want in (expected_hashes or {}).items():
+        got = actual.get(alg)
+        if got is not None and want and got.lower() != str(want).lower():
+            raise RuntimeError(f"{alg} ハッシュが一致しません (期待値 {want}, 実際 {got})")
+
+def _probe_download(url: str) -> tuple[str, int, bool, str | None]:
+    try:
+        r = http_session().head(url, allow_redirects=True, timeout=15, headers={"Accept-Encoding": "identity"})
+        r.raise_for_status()
+    except Exception:
+        return url, 0, False, None
+    total = int(r.headers.get("content-length", 0) or 0)
+    ranges = r.headers.get("accept-ranges", "").lower() == "bytes"
+    validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+    return r.url, total, ranges, validator
+
+def _load_download_state(state_path: Path, url: str, total: int, validator: str | None) -> dict | None:
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    if state.get("url") != url or state.get("size") != total or state.get("validator") != validator:
+        return None
+    return state
+
+def _save_download_state(state_path: Path, state: dict) -> None:
+    try:
+        _write_atomic(state_path, json.dumps(state).encode("utf-8"))
+    except Exception:
+        pass
+
+def _preallocate(path: Path, size: int) -> None:
+    mode = "r+b" if path.exists() else "wb"
+    with open(path, mode) as f:
+        f.truncate(size)
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+            except OSError:
+                pass
+
+def _download_segmented(url: str, part: Path, state_path: Path, state: dict, total: int, callback=None) -> None:
+    lock = threading.Lock()
+    progress = {"done": sum(seg[2] for seg in state["segments"]), "unsaved": 0}
+    errors: list[Exception] = []
+
+    def worker(seg: list) -> None:
+        start, end = seg[0], seg[1]
+        if start + seg[2] > end:
+            return
+        headers = {"Range": f"bytes={start + seg[2]}-{end}", "Accept-Encoding": "identity"}
+        try:
+            with http_session().get(url, headers=headers, stream=True, timeout=30) as r:
+                if r.status_code != 206:
+                    raise RuntimeError(f"Range リクエストが拒否されました (HTTP {r.status_code})")
+                with open(part, "r+b", buffering=0) as f:
+                    f.seek(start + seg[2])
+                    for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if not chunk:
+                            continue
+                        chunk = chunk[:end + 1 - start - seg[2]]
+                        f.write(chunk)
+                        with lock:
+                            seg[2] += len(chunk)
+                            progress["done"] += len(chunk)
+                            progress["unsaved"] += len(chunk)
+                            if progress["unsaved"] >= DOWNLOAD_STATE_FLUSH_BYTES:
+                                progress["unsaved"] = 0
+                                _save_download_state(state_path, state)
+                            if callback:
+                                callback(progress["done"], total)
+                        if start + seg[2] > end:
+                            break
+        except Exception as e:
+            with lock:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(seg,), daemon=True) for seg in state["segments"]]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _save_download_state(state_path, state)
+    if errors:
+        raise errors[0]
+    if any(seg[0] + seg[2] <= seg[1] for seg in state["segments"]):
+        raise RuntimeError("ダウンロードが途中で終了しました")
+
+def _download_single(url: str, part: Path, total: int, ranges: bool, hashers: dict, callback=None) -> None:
+    offset = part.stat().st_size if ranges and part.exists() else 0
+    if total and offset > total:
+        offset = 0
+    headers = {"Accept-Encoding": "identity"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    with http_session().get(url, headers=headers, stream=True, timeout=30) as r:
+        r.raise_for_status()
+        if offset and r.status_code != 206:
+            offset = 0
+        if r.status_code == 200:
+            total = total or int(r.headers.get("content-length", 0) or 0)
+        mode = "r+b" if offset else "wb"
+        with open(part, mode) as f:
+            if offset:
+                f.seek(0)
+                while f.tell() < offset:
+                    chunk = f.read(min(DOWNLOAD_CHUNK_SIZE * 4, offset - f.tell()))
+                    if not chunk:
+                        break
+                    for h in hashers.values():
+                        h.update(chunk)
+                f.seek(offset)
+                f.truncate()
+            downloaded = offset
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+                    for h in hashers.values():
+                        h.update(chunk)
+                    downloaded += len(chunk)
+                    if callback:
+                        callback(downloaded, total)
+    if total and part.stat().st_size != total:
+        raise RuntimeError(f"ダウンロードサイズが一致しません ({part.stat().st_size} / {total} バイト)")
+
+def download_file_stream(url: str, dest_path: Path, callback=None, expected_hashes: dict | None = None,
+                         segments: int = DOWNLOAD_SEGMENTS) -> dict:
+    dest_path = Path(dest_path)
+    ensure_dir(dest_path.parent)
+    part = dest_path.with_name(dest_path.name + ".part")
+    state_path = dest_path.with_name(dest_path.name + ".part.json")
+
+    final_url, total, ranges, validator = _probe_download(url)
+    try:
+        attempts = max(1, int(load_config().get("http_retries", HTTP_RETRIES)) + 1)
+    except (TypeError, ValueError):
+        attempts = HTTP_RETRIES + 1
+
+    for attempt in range(attempts):
+        hashers = _new_hashers(expected_hashes)
+        try:
+            if ranges and total >= DOWNLOAD_SEGMENT_MIN_SIZE and segments > 1:
+                state = _load_download_state(state_path, final_url, total, validator)
+                if state is None or not part.exists():
+                    step = -(-total // segments)
+                    state = {
+                        "url": final_url,
+                        "size": total,
+                        "validator": validator,
+                        "segments": [[i, min(i + step, total) - 1, 0] for i in range(0, total, step)],
+                    }
+                    _preallocate(part, total)
+                    _save_download_state(state_path, state)
+                _download_segmented(final_url, part, state_path, state, total, callback)
+                actual = _hash_file(part, hashers.keys())
+            else:
+                if not ranges:
+                    try:
+                        part.unlink()
+                    except FileNotFoundError:
+                        pass
+                _download_single(final_url, part, total, ranges, hashers, callback)
+                actual = {alg: h.hexdigest() for alg, h in hashers.items()}
+            break
+        except Exception:
+            if attempt + 1 >= attempts:
+                raise
+            time.sleep(min(HTTP_BACKOFF * (2 ** attempt), 10))
+
+    try:
+        _verify_hashes(actual, expected_hashes)
+    except RuntimeError:
+        for p in (part, state_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+        raise
+    os.replace(part, dest_path)
+    try:
+        state_path.unlink()
+    except FileNotFoundError:
+        pass
+    return actual
+
+def _lock_file(f) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                time.sleep(0.05)
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+def _unlock_file(f) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class JarStore:
+    def __init__(self, root: Path, max_bytes: int = JAR_STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.index_path = self.root / "index.json"
+        self.lock_path = self.root / "index.lock"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            ensure_dir(self.root)
+            with open(self.lock_path, "a+b") as f:
+                _lock_file(f)
+                try:
+                    yield
+                finally:
+                    _unlock_file(f)
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.root / "objects" / sha256[:2] / f"{sha256}.jar"
+
+    def _load_index(self) -> dict:
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except Exception:
+            index = {}
+        index.setdefault("objects", {})
+        index.setdefault("aliases", {})
+        return index
+
+    def _save_index(self, index: dict) -> None:
+        _write_atomic(self.index_path, json.dumps(index, indent=1).encode("utf-8"))
+
+    def _key_for(self, index: dict, hashes: dict) -> str | None:
+        if hashes.get("sha256"):
+            return str(hashes["sha256"]).lower()
+        for alg, value in hashes.items():
+            key = index["aliases"].get(f"{alg}:{str(value).lower()}")
+            if key:
+                return key
+        return None
+
+    def _lookup(self, hashes: dict) -> Path | None:
+        index = self._load_index()
+        key = self._key_for(index, hashes)
+        if not key or key not in index["objects"]:
+            return None
+        obj = self._object_path(key)
+        if not obj.exists() or obj.stat().st_size != index["objects"][key].get("size"):
+            index["objects"].pop(key, None)
+            self._save_index(index)
+            return None
+        index["objects"][key]["last_used"] = time.time()
+        self._save_index(index)
+        return obj
+
+    def lookup(self, hashes: dict | None) -> Path | None:
+        if not hashes:
+            return None
+        with self._locked():
+            return self._lookup(hashes)
+
+    def checkout(self, hashes: dict | None, dest: Path) -> str | None:
+        if not hashes:
+            return None
+        with self._locked():
+            obj = self._lookup(hashes)
+            return link_or_copy(obj, dest) if obj else None
+
+    def add(self, path: Path, hashes: dict) -> Path | None:
+        sha256 = str(hashes.get("sha256", "")).lower()
+        if not sha256:
+            return None
+        with self._locked():
+            index = self._load_index()
+            obj = self._object_path(sha256)
+            if not obj.exists():
+                link_or_copy(path, obj)
+            index["objects"][sha256] = {"size": obj.stat().st_size, "last_used": time.time(), "name": Path(path).name}
+            for alg, value in hashes.items():
+                if alg != "sha256" and value:
+                    index["aliases"][f"{alg}:{str(value).lower()}"] = sha256
+            self._evict(index, keep=sha256)
+            self._save_index(index)
+            return obj
+
+    def _evict(self, index: dict, keep: str | None = None) -> None:
+        objects = index["objects"]
+        total = sum(o.get("size", 0) for o in objects.values())
+        for key, meta in sorted(objects.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                self._object_path(key).unlink()
+            except FileNotFoundError:
+                pass
+            total -= meta.get("size", 0)
+            del objects[key]
+        live = set(objects)
+        index["aliases"] = {a: k for a, k in index["aliases"].items() if k in live}
+
+def _reflink(src: Path, dest: Path) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as fs, open(dest, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        return True
+    except OSError:
+        try:
+            dest.unlink()
+        except FileNotFoundError:
+            pass
+        return False
+
+def link_or_copy(src: Path, dest: Path) -> str:
+    src = Path(src)
+    dest = Path(dest)
+    ensure_dir(dest.parent)
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.link")
+    try:
+        tmp.unlink()
+    except FileNotFoundError:
+        pass
+    if _reflink(src, tmp):
+        mode = "reflink"
+    else:
+        try:
+            os.link(src, tmp)
+            mode = "hardlink"
+        except OSError:
+            shutil.copy2(src, tmp)
+            mode = "copy"
+    os.replace(tmp, dest)
+    return mode
+
+_jar_stores: dict[Path, JarStore] = {}
+_jar_stores_lock = threading.Lock()
+
+def jar_store() -> JarStore:
+    cfg = load_config()
+    root = Path(cfg.get("jar_store_dir") or (config_path().parent / JAR_STORE_DIR)).resolve()
+    try:
+        max_bytes = int(cfg.get("jar_store_max_bytes", JAR_STORE_MAX_BYTES))
+    except (TypeError, ValueError):
+        max_bytes = JAR_STORE_MAX_BYTES
+    with _jar_stores_lock:
+        store = _jar_stores.get(root)
+        if store is None:
+            store = _jar_stores[root] = JarStore(root, max_bytes)
+        store.max_bytes = max_bytes
+    return store
+
+def get_local_ip() -> str:
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except Exception:
+        try:
+            return socket.gethostbyname(socket.gethostname())
+        except Exception:
+            return "127.0.0.1"
+
+def get_global_ip() -> str | None:
+    try:
+        r = http_session().get("https://api.ipify.org", timeout=5)
+        r.raise_for_status()
+        return r.text.strip()
+    except Exception:
+        return None
+
+def timestamp() -> str:
+    return datetime.now().strftime("[%Y-%m-%d %H:%M:%S] ")
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            import asyncio
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mcsoft-asyncio", daemon=True).start()
+    return _loop
+
+def run_in_loop(coro, timeout: float | None = None):
+    import asyncio
+    import concurrent.futures
+    fut = asyncio.run_coroutine_threadsafe(coro, background_loop())
+    try:
+        return fut.result(timeout)
+    except concurrent.futures.TimeoutError:
+        fut.cancel()
+        raise RuntimeError("応答がタイムアウトしました")
+
+
+class ConsoleBuffer:
+    def __init__(self, rate_window: float = 2.0, max_lines: int = CONSOLE_BUFFER_MAX_LINES):
+        self._lines: deque[str] = deque(maxlen=max(1, int(max_lines)))
+        self.rate_window = rate_window
+        self.total_in = 0
+        self.total_out = 0
+        self.dropped = 0
+        self._rate_mark = time.monotonic()
+        self._rate_count = 0
+        self.lines_per_sec = 0.0
+
+    def push(self, line: str) -> None:
+        if not line.endswith("\n"):
+            line += "\n"
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(line)
+        self.total_in += 1
+
+    def push_many(self, lines) -> None:
+        for line in lines:
+            self.push(line)
+
+    def pending(self) -> int:
+        return len(self._lines)
+
+    def drain(self, max_lines: int) -> list[str]:
+        n = min(max_lines, len(self._lines))
+        pop = self._lines.popleft
+        out = [pop() for _ in range(n)]
+        self.total_out += n
+        self._rate_count += n
+        now = time.monotonic()
+        elapsed = now - self._rate_mark
+        if elapsed >= self.rate_window:
+            self.lines_per_sec = self._rate_count / elapsed
+            self._rate_mark = now
+            self._rate_count = 0
+        return out
+
+    def clear(self) -> None:
+        self._lines.clear()
+
+
+class ConsoleScrollback:
+    def __init__(self, max_lines: int = CONSOLE_SCROLLBACK_LINES, overflow_path: Path | None = None):
+        self.max_lines = max(100, int(max_lines))
+        self.slack = max(1, self.max_lines // 10)
+        self._lines: deque[str] = deque()
+        self._lock = threading.Lock()
+        self.overflow_path = overflow_path
+        self._overflow_file = None
+
+    def set_overflow_path(self, path: Path | None) -> None:
+        with self._lock:
+            if path != self.overflow_path:
+                self._close_overflow()
+                self.overflow_path = path
+
+    def extend(self, lines: list[str]) -> int:
+        with self._lock:
+            self._lines.extend(lines)
+            excess = len(self._lines) - self.max_lines
+            if excess < self.slack:
+                return 0
+            pop = self._lines.popleft
+            dropped = [pop() for _ in range(excess)]
+            self._write_overflow(dropped)
+            return excess
+
+    def snapshot(self) -> str:
+        with self._lock:
+            return "".join(self._lines)
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def _write_overflow(self, lines: list[str]) -> None:
+        if not self.overflow_path:
+            return
+        try:
+            if self._overflow_file is None:
+                ensure_dir(self.overflow_path.parent)
+                self._overflow_file = open(self.overflow_path, "a", encoding="utf-8", errors="replace")
+            self._overflow_file.write("".join(lines))
+            self._overflow_file.flush()
+        except Exception:
+            self._close_overflow()
+
+    def _close_overflow(self) -> None:
+        try:
+            if self._overflow_file:
+                self._overflow_file.close()
+        except Exception:
+            pass
+        self._overflow_file = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_overflow()
+
+
+class ChunkedLineReader:
+    def __init__(self, fd: int | None, chunk_size: int = READER_CHUNK_SIZE, encoding: str = CONSOLE_ENCODING):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder(CONSOLE_ENCODING)(errors="replace")
+        self._pending = ""
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.started = time.monotonic()
+
+    def read_batch(self) -> list[str] | None:
+        return self.decode(os.read(self.fd, self.chunk_size))
+
+    def decode(self, data: bytes) -> list[str] | None:
+        if not data:
+            tail = self._pending + self._decoder.decode(b"", final=True)
+            self._pending = ""
+            if tail:
+                self.lines_read += 1
+                return [tail.rstrip("\r")]
+            return None
+        self.bytes_read += len(data)
+        text = self._pending + self._decoder.decode(data)
+        lines = text.split("\n")
+        self._pending = lines.pop()
+        self.lines_read += len(lines)
+        return [line.rstrip("\r") for line in lines]
+
+    def throughput(self) -> tuple[float, float]:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return self.lines_read / elapsed, self.bytes_read / elapsed
+
+
+_PRERELEASE_RANKS = {"snapshot": 0, "pre": 1, "prerelease": 1, "rc": 2}
+_RELEASE_RANK = 3
+_POST_RELEASE_RANK = 4
+
+def version_key(version: str) -> tuple:
+    m = re.match(r"^(\d+(?:\.\d+)+)(.*)$", version.strip())
+    if not m:
+        return (0, (), 0, tuple(int(x) for x in re.findall(r"\d+", version)), version)
+    nums = tuple(int(x) for x in m.group(1).split("."))
+    nums = nums + (0,) * (4 - len(nums))
+    rest = m.group(2).lstrip("-_+ ")
+    if not rest:
+        return (1, nums, _RELEASE_RANK, (), "")
+    tag = re.match(r"[A-Za-z]+", rest)
+    rank = _PRERELEASE_RANKS.get(tag.group(0).lower(), _POST_RELEASE_RANK) if tag else _POST_RELEASE_RANK
+    return (1, nums, rank, tuple(int(x) for x in re.findall(r"\d+", rest)), rest)
+
+def version_sort_string(version: str) -> str:
+    known, nums, rank, extra, _ = version_key(version)
+    return "!".join((
+        str(known),
+        ".".join(f"{n:08d}" for n in nums),
+        str(rank),
+        ".".join(f"{n:08d}" for n in extra),
+    ))
+
+def sort_versions(versions, reverse: bool = True) -> list[str]:
+    return sorted(versions, key=version_key, reverse=reverse)
+
+def guess_release_type(version: str) -> str:
+    rank = version_key(version)[2]
+    if version_key(version)[0] == 0 or rank == 0:
+        return "snapshot"
+    if rank < _RELEASE_RANK:
+        return "pre-release"
+    return "release"
+
+
+class VersionCatalog:
+    def __init__(self, db_path: Path):
+        ensure_dir(Path(db_path).parent)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            if self._db.execute("PRAGMA user_version").fetchone()[0] < CATALOG_SCHEMA:
+                self._db.execute("DROP TABLE IF EXISTS builds")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS versions (
+                    provider TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    release_type TEXT NOT NULL DEFAULT 'release',
+                    mc_version TEXT NOT NULL,
+                    sort_key TEXT NOT NULL,
+                    url TEXT,
+                    synced_at REAL NOT NULL,
+                    PRIMARY KEY (provider, id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS versions_order ON versions (provider, sort_key);
+                CREATE INDEX IF NOT EXISTS versions_type ON versions (provider, release_type, sort_key);
+                CREATE INDEX IF NOT EXISTS versions_mc ON versions (mc_version, provider);
+                CREATE TABLE IF NOT EXISTS builds (
+                    provider TEXT NOT NULL,
+                    mc_version TEXT NOT NULL,
+                    build TEXT NOT NULL,
+                    sort_key TEXT NOT NULL,
+                    channel TEXT,
+                    name TEXT,
+                    url TEXT,
+                    sha256 TEXT,
+                    sha1 TEXT,
+                    md5 TEXT,
+                    synced_at REAL NOT NULL,
+                    PRIMARY KEY (provider, mc_version, build)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS builds_order ON builds (provider, mc_version, sort_key);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    provider TEXT PRIMARY KEY,
+                    synced_at REAL NOT NULL,
+                    count INTEGER NOT NULL
+                );
+            """)
+            self._db.execute(f"PRAGMA user_version = {CATALOG_SCHEMA}")
+
+    def sync_versions(self, provider: str, records: list[dict]) -> int:
+        now = time.time()
+        with self._lock, self._db:
+            existing = {
+                row["id"]: (row["release_type"], row["mc_version"], row["sort_key"], row["url"])
+                for row in self._db.execute("SELECT id, release_type, mc_version, sort_key, url FROM versions WHERE provider = ?", (provider,))
+            }
+            changed = []
+            seen = set()
+            for r in records:
+                vid = r["id"]
+                seen.add(vid)
+                row = (
+                    r.get("release_type") or guess_release_type(vid),
+                    r.get("mc_version") or vid,
+                    r.get("sort_key") or version_sort_string(vid),
+                    r.get("url"),
+                )
+                if existing.get(vid) != row:
+                    changed.append((provider, vid) + row + (now,))
+            if changed:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO versions (provider, id, release_type, mc_version, sort_key, url, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    changed)
+            removed = [(provider, vid) for vid in existing.keys() - seen]
+            if removed:
+                self._db.executemany("DELETE FROM versions WHERE provider = ? AND id = ?", removed)
+            self._db.execute("INSERT OR REPLACE INTO sync_state (provider, synced_at, count) VALUES (?, ?, ?)",
+                             (provider, now, len(seen)))
+        return len(changed) + len(removed)
+
+    def sync_builds(self, provider: str, mc_version: str, builds: list[dict]) -> int:
+        now = time.time()
+        with self._lock, self._db:
+            known = {row[0] for row in self._db.execute(
+                "SELECT build FROM builds WHERE provider = ? AND mc_version = ?", (provider, mc_version))}
+            rows = [
+                (provider, mc_version, str(b["build"]), b.get("sort_key") or version_sort_string(str(b["build"])),
+                 b.get("channel"), b.get("name"), b.get("url"), b.get("sha256"), b.get("sha1"), b.get("md5"), now)
+                for b in builds
+            ]
+            if rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO builds (provider, mc_version, build, sort_key, channel, name, url, sha256, sha1, md5, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+        return len({row[2] for row in rows} - known)
+
+    def versions(self, provider: str, release_type: str | None = None, limit: int | None = None) -> list[str]:
+        sql = "SELECT id FROM versions WHERE provider = ?"
+        params: list = [provider]
+        if release_type:
+            sql += " AND release_type = ?"
+            params.append(release_type)
+        sql += " ORDER BY sort_key DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, params)]
+
+    def get(self, provider: str, version_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM versions WHERE provider = ? AND id = ?", (provider, version_id)).fetchone()
+        return dict(row) if row else None
+
+    def latest_version(self, provider: str, release_type: str | None = "release") -> str | None:
+        found = self.versions(provider, release_type, limit=1)
+        return found[0] if found else None
+
+    def versions_for_mc(self, mc_version: str, provider: str | None = None) -> list[dict]:
+        sql = "SELECT * FROM versions WHERE mc_version = ?"
+        params: list = [mc_version]
+        if provider:
+            sql += " AND provider = ?"
+            params.append(provider)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql + " ORDER BY sort_key DESC", params)]
+
+    def latest_build(self, provider: str, mc_version: str, channels=None) -> dict | None:
+        sql = "SELECT * FROM builds WHERE provider = ? AND mc_version = ?"
+        params: list = [provider, mc_version]
+        if channels:
+            sql += f" AND channel IN ({', '.join('?' * len(channels))})"
+            params.extend(channels)
+        with self._lock:
+            row = self._db.execute(sql + " ORDER BY sort_key DESC LIMIT 1", params).fetchone()
+        return dict(row) if row else None
+
+    def builds(self, provider: str, mc_version: str) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM builds WHERE provider = ? AND mc_version = ? ORDER BY sort_key DESC",
+                                    (provider, mc_version)).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_build(self, provider: str, mc_version: str, build: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM builds WHERE provider = ? AND mc_version = ? AND build = ?",
+                                   (provider, mc_version, str(build))).fetchone()
+        return dict(row) if row else None
+
+    def synced_at(self, provider: str) -> float | None:
+        with self._lock:
+            row = self._db.execute("SELECT synced_at FROM sync_state WHERE provider = ?", (provider,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+_catalog: VersionCatalog | None = None
+_catalog_lock = threading.Lock()
+
+def version_catalog() -> VersionCatalog:
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = VersionCatalog(config_path().parent / CATALOG_DB)
+        return _catalog
+
+
+def download_plugin_from_spigot_page(url: str, plugins_dir: Path, status_callback=None) -> Path:
+    if status_callback:
+        status_callback("プラグインページ解析中...")
+    headers = {"User-Agent": "Mozilla/5.0"}
+
+    if url.lower().endswith(".jar"):
+        dest_name = Path(url.split("?")[0]).name
+        dest = plugins_dir / dest_name
+        download_file_stream(url, dest)
+        return dest
+
+    BeautifulSoup = _load_beautifulsoup()
+    if BeautifulSoup is None:
+        raise RuntimeError("BeautifulSoup (bs4) が必要です。pip install beautifulsoup4 を実行してください。")
+
+    resp = http_session().get(url, headers=headers, timeout=20)
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, "html.parser")
+
+    a = soup.find("a", class_="downloadButton")
+    if not a:
+        a = soup.find("a", href=lambda href: href and "download" in href.lower())
+    if not a or not a.get("href"):
+        raise RuntimeError("ダウンロードリンクをページ内から検出できませんでした。")
+
+    dl_url = a.get("href")
+    if dl_url.startswith("/"):
+        dl_url = "https://www.spigotmc.org" + dl_url
+
+    if status_callback:
+        status_callback("中間ページ取得中...")
+    inter_resp = http_session().get(dl_url, headers=headers, timeout=20, allow_redirects=True)
+    inter_resp.raise_for_status()
+
+    if inter_resp.url.lower().endswith(".jar"):
+        final_url = inter_resp.url
+    else:
+        soup2 = BeautifulSoup(inter_resp.text, "html.parser")
+        jar_a = soup2.find("a", href=lambda href: href and href.lower().endswith(".jar"))
+        if not jar_a:
+            raise RuntimeError("最終的な.jarリンクを検出できませんでした。")
+        final_url = jar_a.get("href")
+        if final_url.startswith("/"):
+            final_url = "https://www.spigotmc.org" + final_url
+
+    if status_callback:
+        status_callback("ダウンロード中...")
+    r2 = http_session().get(final_url, headers=headers, allow_redirects=True, stream=True, timeout=30)
+    r2.raise_for_status()
+
+    filename = None
+    cd = r2.headers.get("Content-Disposition")
+    if cd and "filename=" in cd:
+        try:
+            filename = cd.split("filename=")[1].strip().strip('"').split(";")[0]
+        except Exception:
+            pass
+    if not filename:
+        filename = Path(final_url.split("?")[0]).name
+    if not filename.lower().endswith(".jar"):
+        filename = f"plugin_{int(time.time())}.jar"
+
+    ensure_dir(plugins_dir)
+    dest = plugins_dir / filename
+    with open(dest, "wb") as fw:
+        for chunk in r2.iter_content(chunk_size=8192):
+            if chunk:
+                fw.write(chunk)
+
+    return dest
+
+
+def config_path() -> Path:
+    base = Path(__file__).resolve().parent
+    return base / CONFIG_FILENAME
+
+DEFAULT_CONFIG = {
+    "java_path": "",
+    "args": "",
+    "install_dir": str(Path.cwd()),
+    "ram": "2048",
+    "server_type": "paper",
+    "version": "",
+    "jvm_profile": "aikar",
+    "appcds": False,
+    "gc_log": False,
+    "metrics_interval": 1.0,
+    "metrics_history": 600,
+    "metrics_port": 0,
+    "telemetry_poll_seconds": 30,
+    "telemetry_tps_alert": 18.0,
+    "telemetry_mspt_alert": 50.0,
+    "telemetry_gc_stall_ms": 200.0,
+    "diagnostics": False,
+    "diag_cooldown": 300,
+    "diag_keep": 20,
+    "diag_jfr_seconds": 0,
+    "diag_class_histogram": True,
+    "status_poll_seconds": 10,
+    "hibernate": False,
+    "hibernate_minutes": 15,
+    "hibernate_motd": "",
+    "instances": [],
+    "console_tick_ms": CONSOLE_TICK_MS,
+    "console_max_lines_per_tick": CONSOLE_MAX_LINES_PER_TICK,
+    "console_scrollback_lines": CONSOLE_SCROLLBACK_LINES,
+    "console_encoding": CONSOLE_ENCODING,
+    "reader_mode": "chunked",
+    "startup_budget_ms": STARTUP_BUDGET_MS,
+    "http_retries": HTTP_RETRIES,
+    "http_backoff": HTTP_BACKOFF,
+    "http_pool_connections": HTTP_POOL_CONNECTIONS,
+    "http_pool_maxsize": HTTP_POOL_MAXSIZE,
+    "http_cache_ttl": HTTP_CACHE_TTL,
+    "jar_store_dir": "",
+    "jar_store_max_bytes": JAR_STORE_MAX_BYTES,
+}
+
+def load_config() -> dict:
+    p = config_path()
+    if p.exists():
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                j = json.load(f)
+            
+            for k, v in DEFAULT_CONFIG.items():
+                if k not in j:
+                    j[k] = v
+            return j
+        except Exception:
+            return DEFAULT_CONFIG.copy()
+    else:
+        return DEFAULT_CONFIG.copy()
+
+def save_config(cfg: dict):
+    try:
+        with open(config_path(), "w", encoding="utf-8") as f:
+            json.dump(cfg, f, ensure_ascii=False, indent=2)
+    except Exception:
+        pass
+
+
+DEFAULT_SERVER_PROPERTIES = {
+    "motd": "A Minecraft Server",
+    "server-port": "25565",
+    "max-players": "20",
+    "online-mode": "true",
+    "level-name": "world",
+    "gamemode": "survival",
+    "difficulty": "1",
+    "pvp": "true",
+}
+
+def default_args(ram: str) -> str:
+    ram_mb = ram if str(ram).isdigit() else "2048"
+    return f"-Xmx{ram_mb}M -Xms{ram_mb}M nogui"
+
+def resolve_java_exec(java_path: str) -> str:
+    java_exec = (java_path or "").strip() or "java"
+    if java_exec and Path(java_exec).is_dir():
+        for name in ("java.exe", "java"):
+            guessed = Path(java_exec) / "bin" / name
+            if guessed.exists():
+                return str(guessed)
+    return java_exec
+
+def find_forge_args_file(server_dir: Path) -> Path | None:
+    name = "win_args.txt" if os.name == "nt" else "unix_args.txt"
+    found = sorted(server_dir.glob(f"libraries/net/minecraftforge/forge/*/{name}"), key=lambda p: version_key(p.parent.name))
+    return found[-1] if found else None
+
+def find_server_jar(server_dir: Path) -> Path | None:
+    args_file = find_forge_args_file(server_dir)
+    if args_file:
+        return args_file
+    jars = [p for p in server_dir.glob("*.jar") if not p.name.endswith("-installer.jar")]
+    if not jars:
+        return None
+    return max(jars, key=lambda p: (p.stat().st_mtime_ns, p.name))
+
+def split_jvm_args(args_text: str, ram: str) -> list[str]:
+    args_text = (args_text or "").strip() or default_args(ram)
+    return [a for a in args_text.split() if a.lower() != "nogui"]
+
+def build_server_command(jar: Path, java_path: str, args_text: str, ram: str) -> list[str]:
+    java_exec = resolve_java_exec(java_path)
+    args_parts = split_jvm_args(args_text, ram)
+    if jar.suffix == ".txt":
+        return [java_exec] + args_parts + ["@" + str(jar.resolve()), "nogui"]
+    return [java_exec] + args_parts + ["-jar", jar.name, "nogui"]
+
+def launch_server(cmd: list[str], server_dir: Path, **popen_kwargs) -> subprocess.Popen:
+    return subprocess.Popen(cmd, cwd=str(server_dir),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, **popen_kwargs)
+
+def write_console_command(proc: subprocess.Popen, cmd: str, encoding: str = CONSOLE_ENCODING) -> bool:
+    if not proc.stdin or proc.poll() is not None:
+        return False
+    proc.stdin.write((cmd + "\n").encode(encoding, errors="replace"))
+    proc.stdin.flush()
+    return True
+
+def close_process_pipes(proc: subprocess.Popen) -> None:
+    for pipe in (proc.stdin, proc.stdout):
+        try:
+            if pipe:
+                pipe.close()
+        except Exception:
+            pass
+
+def read_server_port(server_dir: Path) -> int:
+    try:
+        return int(read_properties(server_dir / "server.properties").get("server-port", "25565").strip())
+    except Exception:
+        return 25565
+
+def read_properties(prop_path: Path) -> dict[str, str]:
+    props: dict[str, str] = {}
+    if prop_path.exists():
+        with open(prop_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.strip().startswith("#") or "=" not in line:
+                    continue
+                k, v = line.strip().split("=", 1)
+                props[k] = v
+    return props
+
+def write_properties(prop_path: Path, values: dict[str, str]) -> None:
+    out = dict(values)
+    if prop_path.exists():
+        with open(prop_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if "=" in line and not line.strip().startswith("#"):
+                    k = line.split("=", 1)[0]
+                    if k not in out:
+                        out[k] = line.split("=", 1)[1].rstrip("\n")
+    with open(prop_path, "w", encoding="utf-8") as f:
+        for k, v in out.items():
+            f.write(f"{k}={v}\n")
@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+
+from mc_core import ensure_dir, resolve_java_exec
+
+DIAG_DIR = "diagnostics"
+DIAG_COOLDOWN = 300
+DIAG_KEEP = 20
+DIAG_TIMEOUT = 60
+DIAG_SAMPLE_GAP = 1.0
+DIAG_TRIGGERS = ("cant_keep_up", "watchdog", "high_mspt")
+JCMD_EXE = "jcmd.exe" if os.name == "nt" else "jcmd"
+
+THREAD_NAME = re.compile(r'^"(.*?)"(?: #| daemon| prio=|$)')
+THREAD_CPU = re.compile(r" cpu=([\d.]+)ms")
+THREAD_STATE = re.compile(r"^\s+java\.lang\.Thread\.State: (\S+)")
+HISTOGRAM_ROW = re.compile(r"^\s*\d+:\s+(\d+)\s+(\d+)\s+(.+?)\s*$")
+
+
+class ThreadInfo(NamedTuple):
+    name: str
+    state: str
+    cpu_ms: float | None
+    top_frame: str
+
+
+def find_jcmd(java_path: str) -> str | None:
+    exe = resolve_java_exec(java_path)
+    if not os.path.isabs(exe):
+        exe = shutil.which(exe) or exe
+    if os.path.isabs(exe):
+        candidate = Path(os.path.realpath(exe)).parent / JCMD_EXE
+        if candidate.is_file():
+            return str(candidate)
+    return shutil.which("jcmd")
+
+def run_jcmd(jcmd: str, pid: int, *command: str, timeout: float = DIAG_TIMEOUT) -> str:
+    try:
+        out = subprocess.run([jcmd, str(pid), *command], capture_output=True, text=True,
+                             errors="replace", timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"jcmd {command[0]} がタイムアウトしました")
+    except OSError as e:
+        raise RuntimeError(f"jcmd を実行できません: {e}")
+    if out.returncode != 0:
+        raise RuntimeError(f"jcmd {command[0]} が失敗しました: {(out.stderr or out.stdout).strip()[:300]}")
+    return out.stdout
+
+
+def parse_thread_dump(text: str) -> list[ThreadInfo]:
+    threads = []
+    name = None
+    cpu = None
+    state = ""
+    frame = ""
+    for line in text.splitlines():
+        if line.startswith('"'):
+            if name is not None:
+                threads.append(ThreadInfo(name, state, cpu, frame))
+            m = THREAD_NAME.match(line)
+            name = m.group(1) if m else line.strip('"')
+            c = THREAD_CPU.search(line)
+            cpu = float(c.group(1)) if c else None
+            state = ""
+            frame = ""
+        elif name is not None:
+            if not state:
+                m = THREAD_STATE.match(line)
+                if m:
+                    state = m.group(1)
+            if not frame and line.lstrip().startswith("at "):
+                frame = line.strip()[3:]
+    if name is not None:
+        threads.append(ThreadInfo(name, state, cpu, frame))
+    return threads
+
+def hot_threads(before: list[ThreadInfo], after: list[ThreadInfo], limit: int = 5) -> list[tuple[ThreadInfo, float]]:
+    earlier = {t.name: t.cpu_ms for t in before if t.cpu_ms is not None}
+    ranked = []
+    for t in after:
+        if t.cpu_ms is None:
+            continue
+        delta = t.cpu_ms - earlier.get(t.name, t.cpu_ms)
+        if delta > 0:
+            ranked.append((t, delta))
+    if not ranked:
+        ranked = [(t, 0.0) for t in after if t.state == "RUNNABLE" and t.top_frame]
+    ranked.sort(key=lambda r: r[1], reverse=True)
+    return ranked[:limit]
+
+def parse_class_histogram(text: str, limit: int = 10) -> list[tuple[str, int, int]]:
+    rows = []
+    for line in text.splitlines():
+        m = HISTOGRAM_ROW.match(line)
+        if m:
+            rows.append((m.group(3), int(m.group(1)), int(m.group(2))))
+            if len(rows) >= limit:
+                break
+    return rows
+
+
+def list_captures(server_dir: Path) -> list[Path]:
+    root = Path(server_dir) / DIAG_DIR
+    if not root.is_dir():
+        return []
+    return sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.name)
+
+def prune_captures(server_dir: Path, keep: int = DIAG_KEEP) -> None:
+    captures = list_captures(server_dir)
+    for old in captures[:max(0, len(captures) - keep)]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class LagDiagnostics:
+    def __init__(self, server_dir: Path, pid: int, java_path: str, cooldown: float = DIAG_COOLDOWN,
+                 keep: int = DIAG_KEEP, jfr_seconds: int = 0, histogram: bool = True, on_capture=None):
+        self.server_dir = Path(server_dir)
+        self.pid = pid
+        self.jcmd = find_jcmd(java_path)
+        self.cooldown = cooldown
+        self.keep = keep
+        self.jfr_seconds = int(jfr_seconds or 0)
+        self.histogram = histogram
+        self.on_capture = on_capture
+        self._last = 0.0
+        self._busy = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.jcmd is not None
+
+    def trigger(self, event) -> bool:
+        if event.kind not in DIAG_TRIGGERS or self.jcmd is None:
+            return False
+        now = time.monotonic()
+        if now - self._last < self.cooldown or not self._busy.acquire(blocking=False):
+            return False
+        self._last = now
+
+        def job():
+            try:
+                path, text = self.capture(event.message)
+            except Exception as e:
+                path, text = None, f"診断情報の取得に失敗しました: {e}"
+            finally:
+                self._busy.release()
+            if self.on_capture:
+                try:
+                    self.on_capture(path, text)
+                except Exception:
+                    pass
+        threading.Thread(target=job, name="lag-diagnostics", daemon=True).start()
+        return True
+
+    def capture(self, reason: str = "") -> tuple[Path, str]:
+        if self.jcmd is None:
+            raise RuntimeError("jcmd が見つかりません（JDK が必要です）")
+        out_dir = self.server_dir / DIAG_DIR / time.strftime("%Y%m%d-%H%M%S")
+        ensure_dir(out_dir)
+        errors = []
+        first = run_jcmd(self.jcmd, self.pid, "Thread.print")
+        (out_dir / "threads-1.txt").write_text(first, encoding="utf-8")
+        time.sleep(DIAG_SAMPLE_GAP)
+        second = run_jcmd(self.jcmd, self.pid, "Thread.print")
+        (out_dir / "threads-2.txt").write_text(second, encoding="utf-8")
+        classes = []
+        if self.histogram:
+            try:
+                hist = run_jcmd(self.jcmd, self.pid, "GC.class_histogram")
+                (out_dir / "class-histogram.txt").write_text(hist, encoding="utf-8")
+                classes = parse_class_histogram(hist)
+            except RuntimeError as e:
+                errors.append(str(e))
+        jfr = False
+        if self.jfr_seconds > 0:
+            try:
+                run_jcmd(self.jcmd, self.pid, "JFR.start", f"name=mcsoft-{out_dir.name}", f"duration={self.jfr_seconds}s",
+                         f"filename={(out_dir / 'recording.jfr').resolve()}", "settings=profile")
+                jfr = True
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S')} {reason}".strip(), "", "CPU を使っているスレッド:"]
+        for t, delta in hot_threads(parse_thread_dump(first), parse_thread_dump(second)):
+            usage = f"{delta / (DIAG_SAMPLE_GAP * 10):5.1f}%" if delta else "    - "
+            lines.append(f"  {usage} {t.name} [{t.state}] {t.top_frame}")
+        if classes:
+            lines += ["", "メモリを多く使っているクラス:"]
+            lines += [f"  {b / (1024 * 1024):8.1f}MB {n:>10} {name}" for name, n, b in classes]
+        if jfr:
+            lines += ["", f"JFR 記録中: recording.jfr ({self.jfr_seconds} 秒)"]
+        if errors:
+            lines += [""] + ["* " + e for e in errors]
+        text = "\n".join(lines)
+        (out_dir / "summary.txt").write_text(text + "\n", encoding="utf-8")
+        prune_captures(self.server_dir, self.keep)
+        return out_dir, text
+
+
+def diagnostics_from_config(config: dict, server_dir: Path, pid: int, java_path: str,
+                            on_capture=None) -> LagDiagnostics | None:
+    if not config.get("diagnostics"):
+        return None
+    try:
+        cooldown = float(config.get("diag_cooldown", DIAG_COOLDOWN))
+        keep = int(config.get("diag_keep", DIAG_KEEP))
+        jfr_seconds = int(config.get("diag_jfr_seconds") or 0)
+    except (TypeError, ValueError):
+        cooldown, keep, jfr_seconds = DIAG_COOLDOWN, DIAG_KEEP, 0
+    return LagDiagnostics(server_dir, pid, java_path, cooldown, keep, jfr_seconds,
+                          bool(config.get("diag_class_histogram", True)), on_capture)
@@ -0,0 +1,350 @@
+import os
+import re
+import time
+import threading
+from collections import deque
+from pathlib import Path
+
+from mc_telemetry import percentile
+
+GC_LOG_FILE = "logs/gc.log"
+GC_LOG_FILE_COUNT = 5
+GC_LOG_FILE_SIZE = "20M"
+GC_LOG_MIN_JAVA = 9
+GC_TAIL_INTERVAL = 2.0
+GC_TAIL_CHUNK = 4 * 1024 * 1024
+GC_HISTORY = 2000
+GC_RATE_WINDOW = 5 * 60
+GC_TREND_WINDOW = 30 * 60
+GC_PAUSE_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+GC_LINE = re.compile(r"\bGC\((\d+)\) (.*)$")
+GC_UPTIME = re.compile(r"\[(\d+(?:[.,]\d+)?)s\]")
+GC_PAUSE = re.compile(r"^(?:[yYoO]: )?Pause (.*?)([\d.]+)ms\s*$")
+HEAP_TRANSITION = re.compile(r"(\d+(?:\.\d+)?)([BKMGT])(?:\((\d+)%\))?->(\d+(?:\.\d+)?)([BKMGT])(?:\((\d+)%\))?(?:\((\d+(?:\.\d+)?)([BKMGT])\))?")
+SIZE_UNITS = {"B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def gc_log_flags(java_major: int | None, path: str = GC_LOG_FILE) -> list[str]:
+    if java_major is None or java_major < GC_LOG_MIN_JAVA:
+        return []
+    return [f"-Xlog:gc*:file={path}:time,uptime:filecount={GC_LOG_FILE_COUNT},filesize={GC_LOG_FILE_SIZE}"]
+
+def has_gc_logging(jvm_args: list[str]) -> bool:
+    return any(a.startswith("-Xlog:gc") or a.startswith("-Xloggc") for a in jvm_args)
+
+def _size(value: str, unit: str) -> float:
+    return float(value) * SIZE_UNITS[unit]
+
+def _mb(n: float) -> str:
+    return f"{n / SIZE_UNITS['M']:.0f}MB"
+
+
+class GcAnalyzer:
+    def __init__(self, on_pause=None, history: int = GC_HISTORY):
+        self.on_pause = on_pause
+        self.pauses: deque = deque(maxlen=history)
+        self.bucket_counts = [0] * (len(GC_PAUSE_BUCKETS_MS) + 1)
+        self.pause_count = 0
+        self.pause_total_ms = 0.0
+        self.pause_max_ms = 0.0
+        self.full_gcs = 0
+        self.collections = 0
+        self.heap: deque = deque(maxlen=history)
+        self.allocations: deque = deque(maxlen=history)
+        self.allocated_total = 0.0
+        self.capacity: float | None = None
+        self.uptime = 0.0
+        self._prev: tuple[float, float] | None = None
+        self._last_id = -1
+        self._lock = threading.Lock()
+
+    def feed(self, lines) -> None:
+        for line in lines:
+            if "GC(" not in line:
+                continue
+            m = GC_LINE.search(line)
+            if not m:
+                continue
+            gc_id, rest = int(m.group(1)), m.group(2)
+            u = GC_UPTIME.search(line[:m.start()])
+            uptime = float(u.group(1).replace(",", ".")) if u else None
+            with self._lock:
+                if uptime is not None:
+                    if uptime < self.uptime:
+                        self._prev = None
+                        self._last_id = -1
+                        self.heap.clear()
+                        self.allocations.clear()
+                    self.uptime = uptime
+                if gc_id != self._last_id:
+                    self._last_id = gc_id
+                    self.collections += 1
+                pause = None
+                if "Pause" in rest:
+                    p = GC_PAUSE.match(rest)
+                    if p:
+                        pause = float(p.group(2))
+                        self._record_pause(pause, p.group(1).startswith("Full"))
+                if "->" in rest and ":" not in rest:
+                    t = HEAP_TRANSITION.search(rest)
+                    if t:
+                        self._record_heap(t)
+            if pause is not None and self.on_pause:
+                try:
+                    self.on_pause(pause)
+                except Exception:
+                    pass
+
+    def _record_pause(self, pause: float, full: bool) -> None:
+        self.pauses.append(pause)
+        self.pause_count += 1
+        self.pause_total_ms += pause
+        self.pause_max_ms = max(self.pause_max_ms, pause)
+        if full:
+            self.full_gcs += 1
+        i = 0
+        while i < len(GC_PAUSE_BUCKETS_MS) and pause > GC_PAUSE_BUCKETS_MS[i]:
+            i += 1
+        self.bucket_counts[i] += 1
+
+    def _record_heap(self, t) -> None:
+        before = _size(t.group(1), t.group(2))
+        after = _size(t.group(4), t.group(5))
+        if t.group(7):
+            self.capacity = _size(t.group(7), t.group(8))
+        elif t.group(6) and int(t.group(6)) > 0:
+            self.capacity = after * 100 / int(t.group(6))
+        if self._prev is not None:
+            dt = self.uptime - self._prev[0]
+            allocated = before - self._prev[1]
+            if dt > 0 and allocated >= 0:
+                self.allocations.append((self.uptime, allocated, dt))
+                self.allocated_total += allocated
+        self._prev = (self.uptime, after)
+        self.heap.append((self.uptime, after))
+
+    def allocation_rate(self, window: float = GC_RATE_WINDOW) -> float | None:
+        with self._lock:
+            recent = [(a, dt) for u, a, dt in self.allocations if u >= self.uptime - window]
+        seconds = sum(dt for a, dt in recent)
+        return sum(a for a, dt in recent) / seconds if seconds > 0 else None
+
+    def heap_trend(self, window: float = GC_TREND_WINDOW) -> float | None:
+        with self._lock:
+            points = [(u, h) for u, h in self.heap if u >= self.uptime - window]
+        if len(points) < 3:
+            return None
+        n = len(points)
+        mx = sum(u for u, h in points) / n
+        my = sum(h for u, h in points) / n
+        var = sum((u - mx) ** 2 for u, h in points)
+        if var <= 0:
+            return None
+        return sum((u - mx) * (h - my) for u, h in points) / var * 60 / SIZE_UNITS["M"]
+
+    def report(self) -> dict:
+        with self._lock:
+            pauses = list(self.pauses)
+            heap = list(self.heap)
+            report = {
+                "collections": self.collections, "pauses": self.pause_count, "full_gcs": self.full_gcs,
+                "pause_total_ms": self.pause_total_ms, "pause_max_ms": self.pause_max_ms,
+                "histogram": list(zip([*GC_PAUSE_BUCKETS_MS, None], self.bucket_counts)),
+                "uptime": self.uptime, "capacity": self.capacity, "allocated_total": self.allocated_total,
+            }
+        for q in (50, 95, 99):
+            report[f"pause_p{q}_ms"] = percentile(pauses, q)
+        report["heap_after"] = heap[-1][1] if heap else None
+        report["heap_after_max"] = max(h for u, h in heap) if heap else None
+        report["allocation_rate"] = self.allocation_rate()
+        report["heap_trend"] = self.heap_trend()
+        return report
+
+    def summary(self) -> str:
+        r = self.report()
+        if not r["pauses"]:
+            return ""
+        parts = [f"GC 停止 {r['pauses']} 回 p95 {r['pause_p95_ms']:.0f}ms max {r['pause_max_ms']:.0f}ms"]
+        if r["allocation_rate"] is not None:
+            parts.append(f"割当 {_mb(r['allocation_rate'])}/s")
+        if r["heap_after"] is not None:
+            parts.append(f"GC後 {_mb(r['heap_after'])}")
+        return "  ".join(parts)
+
+    def collect(self, labels: dict) -> list[tuple]:
+        with self._lock:
+            counts = list(self.bucket_counts)
+            total, count, full = self.pause_total_ms, self.pause_count, self.full_gcs
+            capacity = self.capacity
+            after = self.heap[-1][1] if self.heap else None
+        help_text = "Stop-the-world GC pause durations from the GC log"
+        out = []
+        cumulative = 0
+        for le, n in zip([*GC_PAUSE_BUCKETS_MS, None], counts):
+            cumulative += n
+            bound = "+Inf" if le is None else f"{le / 1000:g}"
+            out.append(("mcsoft_gc_pause_seconds_bucket", "histogram", help_text, dict(labels, le=bound), cumulative))
+        out.append(("mcsoft_gc_pause_seconds_sum", "histogram", help_text, labels, total / 1000))
+        out.append(("mcsoft_gc_pause_seconds_count", "histogram", help_text, labels, count))
+        out.append(("mcsoft_gc_full_total", "counter", "Full GC pauses found in the GC log", labels, full))
+        rate = self.allocation_rate()
+        if rate is not None:
+            out.append(("mcsoft_gc_allocation_rate_bytes", "gauge", "Heap allocation rate between collections (bytes/s)", labels, rate))
+        if after is not None:
+            out.append(("mcsoft_gc_heap_after_bytes", "gauge", "Heap occupancy after the latest collection", labels, after))
+        if capacity is not None:
+            out.append(("mcsoft_gc_heap_capacity_bytes", "gauge", "Committed heap reported by the GC log", labels, capacity))
+        return out
+
+
+def gc_advice(report: dict) -> list[str]:
+    notes = []
+    cap = report.get("capacity")
+    peak = report.get("heap_after_max")
+    if cap and peak is not None:
+        ratio = peak / cap
+        if ratio >= 0.8:
+            notes.append(f"GC 後のヒープ使用率が {ratio:.0%} に達しています。割当メモリを増やすことを検討してください。")
+        elif ratio < 0.3 and report["collections"] >= 20:
+            notes.append(f"GC 後のヒープ使用率は最大 {ratio:.0%} です。割当メモリを減らしても問題ない可能性があります。")
+    p99 = report.get("pause_p99_ms")
+    if p99 is not None and p99 > 200:
+        notes.append(f"p99 停止時間が {p99:.0f}ms です。ZGC プロファイル（JDK 17 以降）を検討してください。")
+    if report.get("full_gcs"):
+        notes.append(f"Full GC が {report['full_gcs']} 回発生しています。メモリ不足または明示的 GC の可能性があります。")
+    trend = report.get("heap_trend")
+    if trend is not None and trend > 10 and report.get("uptime", 0) >= 600:
+        notes.append(f"GC 後のヒープが毎分 {trend:.0f}MB 増え続けています。メモリリークの可能性があります。")
+    return notes
+
+def describe_gc_report(report: dict) -> str:
+    if not report["pauses"] and not report["collections"]:
+        return "GC ログに記録がありません。"
+    lines = [f"GC {report['collections']} 回 / 稼働 {report['uptime'] / 60:.1f} 分"]
+    if report["pauses"]:
+        lines.append(f"停止時間: 合計 {report['pause_total_ms'] / 1000:.2f}s / 最大 {report['pause_max_ms']:.1f}ms / "
+                     f"p50 {report['pause_p50_ms']:.1f}ms / p95 {report['pause_p95_ms']:.1f}ms / p99 {report['pause_p99_ms']:.1f}ms")
+        top = max(n for le, n in report["histogram"]) or 1
+        lo = 0
+        for le, n in report["histogram"]:
+            label = f"{lo}-{le}ms" if le is not None else f">{lo}ms"
+            lo = le
+            if n:
+                lines.append(f"  {label:>12} {'█' * max(1, round(n / top * 30))} {n}")
+    if report["allocation_rate"] is not None:
+        lines.append(f"割り当て速度: {_mb(report['allocation_rate'])}/s")
+    if report["heap_after"] is not None:
+        text = f"GC 後ヒープ: {_mb(report['heap_after'])} (最大 {_mb(report['heap_after_max'])})"
+        if report["capacity"]:
+            text += f" / {_mb(report['capacity'])}"
+        if report["heap_trend"] is not None:
+            text += f"  傾向 {report['heap_trend']:+.1f}MB/分"
+        lines.append(text)
+    notes = gc_advice(report)
+    if notes:
+        lines.append("")
+        lines += ["* " + n for n in notes]
+    return "\n".join(lines)
+
+
+def gc_log_files(server_dir: Path, path: str = GC_LOG_FILE) -> list[Path]:
+    current = Path(server_dir) / path
+    rotated = [p for p in current.parent.glob(current.name + ".*") if p.suffix[1:].isdigit()]
+    rotated.sort(key=lambda p: p.stat().st_mtime)
+    return rotated + ([current] if current.exists() else [])
+
+def analyze_gc_logs(server_dir: Path, path: str = GC_LOG_FILE) -> GcAnalyzer:
+    analyzer = GcAnalyzer()
+    for p in gc_log_files(server_dir, path):
+        try:
+            with open(p, "r", encoding="utf-8", errors="replace") as f:
+                for chunk in iter(lambda: f.readlines(GC_TAIL_CHUNK), []):
+                    analyzer.feed(chunk)
+        except OSError:
+            pass
+    return analyzer
+
+
+class GcLogTailer:
+    def __init__(self, path: Path, on_lines, interval: float = GC_TAIL_INTERVAL, since: float | None = None):
+        self.path = Path(path)
+        self.on_lines = on_lines
+        self.interval = interval
+        self.since = since
+        self._ident = None
+        self._offset = 0
+        self._partial = b""
+        self._stop = threading.Event()
+
+    def start(self) -> "GcLogTailer":
+        threading.Thread(target=self._run, name="gc-log-tail", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                pass
+        try:
+            self.poll()
+        except Exception:
+            pass
+
+    def _rotated_file(self) -> Path | None:
+        if not self._ident or not self._ident[1]:
+            return None
+        for p in self.path.parent.glob(self.path.name + ".*"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) == self._ident:
+                return p
+        return None
+
+    def _read(self, path: Path) -> None:
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            while True:
+                data = f.read(GC_TAIL_CHUNK)
+                if not data:
+                    break
+                self._offset += len(data)
+                data = self._partial + data
+                cut = data.rfind(b"\n") + 1
+                self._partial = data[cut:]
+                if cut:
+                    self.on_lines(data[:cut].decode("utf-8", errors="replace").splitlines())
+
+    def poll(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        if self._ident is None and self.since is not None and st.st_mtime < self.since:
+            return
+        ident = (st.st_dev, st.st_ino)
+        if self._ident is not None and (ident != self._ident or st.st_size < self._offset):
+            old = self._rotated_file()
+            if old is not None:
+                self._read(old)
+            self._offset = 0
+            self._partial = b""
+        self._ident = ident
+        if st.st_size > self._offset:
+            self._read(self.path)
+
+
+def start_gc_monitor(server_dir: Path, manifest: dict, since: float | None = None,
+                     on_pause=None) -> tuple[GcAnalyzer | None, GcLogTailer | None]:
+    path = manifest.get("gc_log")
+    if not path:
+        return None, None
+    analyzer = GcAnalyzer(on_pause)
+    tailer = GcLogTailer(Path(server_dir) / path, analyzer.feed, since=time.time() if since is None else since).start()
+    return analyzer, tailer
@@ -0,0 +1,260 @@
+import re
+import json
+import time
+import struct
+import asyncio
+import threading
+from pathlib import Path
+
+from mc_core import read_properties, read_server_port, run_in_loop
+from mc_status import ServerStatus, decode_varint, encode_packet, encode_string, read_packet
+
+HIBERNATE_MINUTES = 15
+HIBERNATE_CHECK_SECONDS = 15
+HIBERNATE_TIMEOUT = 5.0
+HIBERNATE_MOTD = "§7休止中 - 接続すると起動します"
+HIBERNATE_VERSION = "休止中"
+WAKE_MESSAGE = "サーバーを起動しています。しばらくしてから再接続してください。"
+
+ANSI_CODES = re.compile(r"\x1b\[[0-9;]*[A-Za-z]|§.")
+PLAYER_JOINED = re.compile(r"\]: (\w{1,16}) joined the game")
+PLAYER_LEFT = re.compile(r"\]: (\w{1,16}) left the game")
+PLAYER_LIST = re.compile(r"There are (\d+)(?: of a max of |/)(\d+) players online")
+
+
+class PlayerTracker:
+    def __init__(self):
+        self.players: set[str] = set()
+        self.online = 0
+        self.max_players = 0
+        self.last_active = time.monotonic()
+        self._lock = threading.Lock()
+
+    def feed(self, lines) -> None:
+        for line in lines:
+            if "the game" not in line and "players online" not in line:
+                continue
+            line = ANSI_CODES.sub("", line)
+            with self._lock:
+                m = PLAYER_JOINED.search(line)
+                if m:
+                    self.players.add(m.group(1))
+                    self.online = max(self.online + 1, len(self.players))
+                elif (m := PLAYER_LEFT.search(line)):
+                    self.players.discard(m.group(1))
+                    self.online = max(0, self.online - 1)
+                elif (m := PLAYER_LIST.search(line)):
+                    self.online, self.max_players = int(m.group(1)), int(m.group(2))
+                    if not self.online:
+                        self.players.clear()
+                self._touch()
+
+    def observe_status(self, status: ServerStatus) -> None:
+        if not status.online:
+            return
+        with self._lock:
+            self.online, self.max_players = status.players_online, status.players_max
+            if not self.online:
+                self.players.clear()
+            self._touch()
+
+    def _touch(self) -> None:
+        if self.online > 0:
+            self.last_active = time.monotonic()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.players.clear()
+            self.online = 0
+            self.last_active = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        with self._lock:
+            return 0.0 if self.online > 0 else time.monotonic() - self.last_active
+
+
+class SleepListener:
+    def __init__(self, host: str | None, port: int, on_wake, motd: str = HIBERNATE_MOTD, max_players: int = 20):
+        self.host = host or None
+        self.port = int(port)
+        self.on_wake = on_wake
+        self.motd = motd
+        self.max_players = max_players
+        self.woken = False
+        self._server: asyncio.AbstractServer | None = None
+
+    def start(self) -> "SleepListener":
+        run_in_loop(self._start(), HIBERNATE_TIMEOUT * 2)
+        return self
+
+    async def _start(self) -> None:
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as e:
+            raise RuntimeError(f"ポート {self.port} で待ち受けできません: {e}")
+
+    def close(self) -> None:
+        try:
+            run_in_loop(self._close(), HIBERNATE_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _close(self) -> None:
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            first = await asyncio.wait_for(reader.readexactly(1), HIBERNATE_TIMEOUT)
+            if first == b"\xfe":
+                text = f"§1\x00127\x00{HIBERNATE_VERSION}\x00{ANSI_CODES.sub('', self.motd)}\x000\x00{self.max_players}"
+                writer.write(b"\xff" + struct.pack(">H", len(text)) + text.encode("utf-16-be"))
+                await writer.drain()
+                return
+            raw = first
+            while raw[-1] & 0x80 and len(raw) < 5:
+                raw += await asyncio.wait_for(reader.readexactly(1), HIBERNATE_TIMEOUT)
+            length, _ = decode_varint(raw, 0)
+            data = await asyncio.wait_for(reader.readexactly(length), HIBERNATE_TIMEOUT)
+            packet_id, pos = decode_varint(data, 0)
+            if packet_id != 0x00:
+                return
+            protocol, pos = decode_varint(data, pos)
+            host_len, pos = decode_varint(data, pos)
+            next_state, _ = decode_varint(data, pos + host_len + 2)
+            if protocol >= 1 << 31:
+                protocol -= 1 << 32
+            if next_state == 1:
+                await self._status(reader, writer, protocol)
+            elif next_state in (2, 3):
+                writer.write(encode_packet(0x00, encode_string(json.dumps({"text": WAKE_MESSAGE}, ensure_ascii=False))))
+                await writer.drain()
+                self._wake()
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    async def _status(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, protocol: int) -> None:
+        while True:
+            packet_id, data = await asyncio.wait_for(read_packet(reader), HIBERNATE_TIMEOUT)
+            if packet_id == 0x00:
+                info = {"version": {"name": HIBERNATE_VERSION, "protocol": protocol},
+                        "players": {"max": self.max_players, "online": 0, "sample": []},
+                        "description": {"text": self.motd}}
+                writer.write(encode_packet(0x00, encode_string(json.dumps(info, ensure_ascii=False))))
+            elif packet_id == 0x01:
+                writer.write(encode_packet(0x01, data[:8]))
+                await writer.drain()
+                return
+            await writer.drain()
+
+    def _wake(self) -> None:
+        if self.woken:
+            return
+        self.woken = True
+        server, self._server = self._server, None
+        if server is not None:
+            server.close()
+        try:
+            self.on_wake()
+        except Exception:
+            pass
+
+
+class Hibernator:
+    def __init__(self, idle_minutes: float, on_idle, on_wake, motd: str = "", ready=None):
+        self.idle_seconds = max(1.0, float(idle_minutes) * 60)
+        self.on_idle = on_idle
+        self.on_wake = on_wake
+        self.motd = motd or HIBERNATE_MOTD
+        self.ready = ready
+        self.tracker = PlayerTracker()
+        self.state = "running"
+        self.listener: SleepListener | None = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> "Hibernator":
+        threading.Thread(target=self._run, name="hibernate-watch", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._close_listener()
+
+    @property
+    def sleeping(self) -> bool:
+        return self.state == "sleeping"
+
+    def feed(self, lines) -> None:
+        self.tracker.feed(lines)
+
+    def observe_status(self, status: ServerStatus) -> None:
+        self.tracker.observe_status(status)
+
+    def resume(self) -> None:
+        self._close_listener()
+        with self._lock:
+            self.state = "running"
+        self.tracker.reset()
+
+    def _run(self) -> None:
+        while not self._stop.wait(HIBERNATE_CHECK_SECONDS):
+            if self.state != "running":
+                continue
+            if self.ready is not None and not self.ready():
+                self.tracker.reset()
+                continue
+            if self.tracker.idle_seconds() < self.idle_seconds:
+                continue
+            with self._lock:
+                if self.state != "running":
+                    continue
+                self.state = "stopping"
+            try:
+                self.on_idle()
+            except Exception:
+                with self._lock:
+                    self.state = "running"
+                self.tracker.reset()
+
+    def server_stopped(self, server_dir: Path) -> bool:
+        with self._lock:
+            if self.state != "stopping":
+                return False
+            self.state = "sleeping"
+        props = read_properties(Path(server_dir) / "server.properties")
+        try:
+            max_players = int(props.get("max-players", "20"))
+        except ValueError:
+            max_players = 20
+        try:
+            self.listener = SleepListener(props.get("server-ip", "").strip(), read_server_port(Path(server_dir)),
+                                          self._woken, self.motd, max_players).start()
+        except Exception:
+            with self._lock:
+                self.state = "running"
+            raise
+        return True
+
+    def _woken(self) -> None:
+        with self._lock:
+            self.state = "waking"
+        self.listener = None
+        threading.Thread(target=self.on_wake, name="hibernate-wake", daemon=True).start()
+
+    def _close_listener(self) -> None:
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.close()
+
+
+def hibernate_minutes(config: dict) -> float:
+    if not config.get("hibernate"):
+        return 0.0
+    try:
+        return float(config.get("hibernate_minutes", HIBERNATE_MINUTES))
+    except (TypeError, ValueError):
+        return float(HIBERNATE_MINUTES)
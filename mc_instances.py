@@ -0,0 +1,320 @@
+import os
+import time
+import asyncio
+import subprocess
+from pathlib import Path
+
+from mc_core import (
+    CONSOLE_ENCODING,
+    CONSOLE_OVERFLOW_LOG,
+    CONSOLE_SCROLLBACK_LINES,
+    READER_CHUNK_SIZE,
+    ChunkedLineReader,
+    ConsoleScrollback,
+    background_loop,
+    close_process_pipes,
+    launch_server,
+    run_in_loop,
+    save_config,
+    timestamp,
+    write_console_command,
+)
+from mc_jvm import StartupRecorder, with_appcds
+from mc_launch import prepare_launch, manifest_command, manifest_env
+from mc_status import ServerStatus, StatusPoller, describe_status, status_address, status_poll_interval
+
+INSTANCE_STOP_TIMEOUT = 60.0
+INSTANCE_PROFILE_KEYS = ("server_type", "version", "ram", "java_path", "args", "jvm_profile", "appcds", "gc_log",
+                         "console_encoding")
+INSTANCE_STATES = {"stopped": "停止中", "starting": "起動中", "running": "稼働中", "stopping": "停止処理中"}
+
+
+class ServerInstance:
+    def __init__(self, name: str, profile: dict, base_config: dict, on_output=None, on_state=None):
+        self.name = name
+        self.profile = {k: v for k, v in profile.items() if k != "name"}
+        self.base_config = base_config
+        self.on_output = on_output
+        self.on_state = on_state
+        self.state = "stopped"
+        self.proc = None
+        self.encoding = CONSOLE_ENCODING
+        self.returncode: int | None = None
+        self.started_at: float | None = None
+        self.recorder: StartupRecorder | None = None
+        self.status: ServerStatus | None = None
+        try:
+            scrollback = int(base_config.get("console_scrollback_lines", CONSOLE_SCROLLBACK_LINES))
+        except (TypeError, ValueError):
+            scrollback = CONSOLE_SCROLLBACK_LINES
+        self.console = ConsoleScrollback(scrollback)
+        self._stopped: asyncio.Event | None = None
+
+    @property
+    def server_dir(self) -> Path:
+        return Path(self.profile["install_dir"])
+
+    @property
+    def pid(self) -> int | None:
+        return self.proc.pid if self.proc is not None and self.state != "stopped" else None
+
+    def settings(self) -> dict:
+        return dict(self.base_config, **self.profile)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        if self.on_state:
+            try:
+                self.on_state(self)
+            except Exception:
+                pass
+
+    def start(self) -> None:
+        if self.state != "stopped":
+            raise RuntimeError(f"{self.name} はすでに起動しています")
+        settings = self.settings()
+        manifest, _ = prepare_launch(self.server_dir, settings)
+        if not manifest:
+            raise RuntimeError(f"{self.name}: サーバーJARが見つかりません")
+        cmd = manifest_command(manifest)
+        mode = "off"
+        if settings.get("appcds"):
+            try:
+                cmd, mode = with_appcds(cmd, self.server_dir, self.server_dir / manifest["target"], manifest["java"])
+            except Exception:
+                mode = "off"
+        self.recorder = StartupRecorder(self.server_dir, mode)
+        self.encoding = settings.get("console_encoding") or CONSOLE_ENCODING
+        self.console.set_overflow_path(self.server_dir / CONSOLE_OVERFLOW_LOG)
+        self._set_state("starting")
+        self._lines(["起動: " + " ".join(cmd)])
+        try:
+            run_in_loop(self._spawn(cmd, manifest_env(manifest)), 30)
+        except Exception:
+            self._set_state("stopped")
+            raise
+
+    async def _spawn(self, cmd: list[str], env: dict | None) -> None:
+        reader = ChunkedLineReader(None, encoding=self.encoding)
+        self._stopped = asyncio.Event()
+        self.returncode = None
+        if os.name == "nt":
+            self.proc = await asyncio.create_subprocess_exec(*cmd, cwd=str(self.server_dir), env=env,
+                                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                             stderr=subprocess.STDOUT)
+            asyncio.ensure_future(self._pump_stream(reader))
+        else:
+            self.proc = launch_server(cmd, self.server_dir, env=env)
+            fd = self.proc.stdout.fileno()
+            os.set_blocking(fd, False)
+            asyncio.get_running_loop().add_reader(fd, self._on_readable, fd, reader)
+        self.started_at = time.time()
+
+    def _on_readable(self, fd: int, reader: ChunkedLineReader) -> None:
+        try:
+            data = os.read(fd, READER_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        lines = reader.decode(data)
+        if lines is None:
+            asyncio.get_running_loop().remove_reader(fd)
+            asyncio.ensure_future(self._reap())
+        elif lines:
+            self._lines(lines)
+
+    async def _pump_stream(self, reader: ChunkedLineReader) -> None:
+        try:
+            while True:
+                lines = reader.decode(await self.proc.stdout.read(READER_CHUNK_SIZE))
+                if lines is None:
+                    break
+                if lines:
+                    self._lines(lines)
+        except Exception:
+            pass
+        await self._reap()
+
+    async def _reap(self) -> None:
+        if os.name == "nt":
+            rc = await self.proc.wait()
+        else:
+            while (rc := self.proc.poll()) is None:
+                await asyncio.sleep(0.2)
+            close_process_pipes(self.proc)
+        self.returncode = rc
+        self._lines([f"サーバー停止（終了コード {rc}）"])
+        self.console.close()
+        self._set_state("stopped")
+        self._stopped.set()
+
+    def _lines(self, lines: list[str]) -> None:
+        if self.recorder is not None and not self.recorder.done and self.recorder.feed(lines) is not None:
+            self._set_state("running")
+        ts = timestamp()
+        stamped = [ts + line + "\n" for line in lines]
+        self.console.extend(stamped)
+        if self.on_output:
+            try:
+                self.on_output(self, stamped)
+            except Exception:
+                pass
+
+    def send(self, cmd: str) -> bool:
+        if self.proc is None or self.state == "stopped":
+            return False
+        if os.name == "nt":
+            asyncio.run_coroutine_threadsafe(self._write((cmd + "\n").encode(self.encoding, errors="replace")), background_loop())
+            return True
+        try:
+            return write_console_command(self.proc, cmd, self.encoding)
+        except Exception:
+            return False
+
+    async def _write(self, data: bytes) -> None:
+        try:
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+        except Exception:
+            pass
+
+    async def stop_async(self, timeout: float = INSTANCE_STOP_TIMEOUT) -> int | None:
+        if self.state == "stopped" or self._stopped is None:
+            return self.returncode
+        self._set_state("stopping")
+        self.send("stop")
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout)
+        except asyncio.TimeoutError:
+            try:
+                self.proc.kill()
+            except Exception:
+                pass
+            await self._stopped.wait()
+        return self.returncode
+
+    def stop(self, timeout: float = INSTANCE_STOP_TIMEOUT) -> int | None:
+        return run_in_loop(self.stop_async(timeout), timeout + 15)
+
+    def describe(self) -> dict:
+        uptime = time.time() - self.started_at if self.started_at and self.state != "stopped" else 0
+        return {"name": self.name, "state": self.state, "label": INSTANCE_STATES.get(self.state, self.state),
+                "pid": self.pid, "uptime": uptime, "dir": str(self.server_dir),
+                "players": describe_status(self.status) if self.state != "stopped" else "",
+                "returncode": self.returncode}
+
+
+class InstanceRegistry:
+    def __init__(self, config: dict, on_output=None, on_state=None, external_owner=None):
+        self.config = config
+        self.on_output = on_output
+        self.on_state = on_state
+        self.external_owner = external_owner
+        self.instances: dict[str, ServerInstance] = {}
+        self._status: StatusPoller | None = None
+        for profile in config.get("instances") or []:
+            if profile.get("name") and profile.get("install_dir"):
+                self.instances[profile["name"]] = ServerInstance(profile["name"], profile, config, self._output, self._state)
+
+    def names(self) -> list[str]:
+        return list(self.instances)
+
+    def get(self, name: str) -> ServerInstance:
+        inst = self.instances.get(name)
+        if inst is None:
+            raise RuntimeError(f"インスタンスが見つかりません: {name}")
+        return inst
+
+    def add(self, name: str, install_dir: str, **profile) -> ServerInstance:
+        name = name.strip()
+        if not name:
+            raise RuntimeError("インスタンス名を入力してください")
+        if name in self.instances:
+            raise RuntimeError(f"同じ名前のインスタンスがあります: {name}")
+        entry = {"install_dir": str(Path(install_dir))}
+        entry.update({k: v for k, v in profile.items() if k in INSTANCE_PROFILE_KEYS and v not in (None, "")})
+        inst = ServerInstance(name, entry, self.config, self._output, self._state)
+        self.instances[name] = inst
+        self._save()
+        return inst
+
+    def remove(self, name: str) -> None:
+        if self.get(name).state != "stopped":
+            raise RuntimeError(f"{name} は起動中のため削除できません")
+        del self.instances[name]
+        self._save()
+
+    def _save(self) -> None:
+        self.config["instances"] = [dict(inst.profile, name=inst.name) for inst in self.instances.values()]
+        save_config(self.config)
+
+    def _output(self, inst: ServerInstance, lines: list[str]) -> None:
+        if self.on_output:
+            self.on_output(inst, lines)
+
+    def _state(self, inst: ServerInstance) -> None:
+        poller = self._poller()
+        if poller is not None:
+            if inst.state == "starting":
+                poller.add_target(inst.name, *status_address(inst.server_dir))
+            elif inst.state == "stopped":
+                poller.remove_target(inst.name)
+                inst.status = None
+        if self.on_state:
+            self.on_state(inst)
+
+    def _poller(self) -> StatusPoller | None:
+        if self._status is None and status_poll_interval(self.config) > 0:
+            self._status = StatusPoller(status_poll_interval(self.config), on_result=self._on_status).start()
+        return self._status
+
+    def _on_status(self, name: str, status: ServerStatus) -> None:
+        inst = self.instances.get(name)
+        if inst is not None:
+            inst.status = status
+
+    def owner_of(self, server_dir, exclude: ServerInstance | None = None) -> str | None:
+        target = Path(server_dir).resolve()
+        for inst in self.instances.values():
+            if inst is not exclude and inst.state != "stopped" and inst.server_dir.resolve() == target:
+                return inst.name
+        return None
+
+    def _check_dir(self, inst: ServerInstance) -> None:
+        owner = self.owner_of(inst.server_dir, exclude=inst)
+        if owner is None and self.external_owner is not None:
+            owner = self.external_owner(inst.server_dir)
+        if owner:
+            raise RuntimeError(f"{inst.server_dir} は {owner} で起動中です")
+
+    def start(self, names=None) -> dict[str, str]:
+        errors = {}
+        for name in names or self.names():
+            try:
+                inst = self.get(name)
+                if inst.state == "stopped":
+                    self._check_dir(inst)
+                    inst.start()
+            except Exception as e:
+                errors[name] = str(e)
+        return errors
+
+    def stop(self, names=None, timeout: float = INSTANCE_STOP_TIMEOUT) -> dict[str, int | None]:
+        targets = [self.get(n) for n in (names or self.names())]
+
+        async def stop_all():
+            return await asyncio.gather(*(inst.stop_async(timeout) for inst in targets), return_exceptions=True)
+        results = run_in_loop(stop_all(), timeout + 15)
+        return {inst.name: (None if isinstance(rc, BaseException) else rc) for inst, rc in zip(targets, results)}
+
+    def running(self) -> list[ServerInstance]:
+        return [inst for inst in self.instances.values() if inst.state != "stopped"]
+
+    def rows(self) -> list[dict]:
+        return [inst.describe() for inst in self.instances.values()]
+
+    def close(self) -> None:
+        if self._status is not None:
+            self._status.stop()
+            self._status = None
@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+import glob
+import json
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from typing import NamedTuple
+
+from mc_core import config_path, ensure_dir, resolve_java_exec, version_key
+
+JAVA_PROBE_CACHE = "cache/java_probe.json"
+JAVA_PROBE_TIMEOUT = 15
+JAVA_EXE = "java.exe" if os.name == "nt" else "java"
+
+UNIX_JAVA_GLOBS = [
+    "/usr/lib/jvm/*",
+    "/usr/lib64/jvm/*",
+    "/usr/java/*",
+    "/opt/java/*",
+    "/opt/jdk*",
+    "/Library/Java/JavaVirtualMachines/*/Contents/Home",
+    "~/Library/Java/JavaVirtualMachines/*/Contents/Home",
+    "~/.sdkman/candidates/java/*",
+    "~/.jdks/*",
+    "~/.gradle/jdks/*",
+]
+WINDOWS_JAVA_GLOBS = [
+    "{pf}/Java/*",
+    "{pf}/Eclipse Adoptium/*",
+    "{pf}/Eclipse Foundation/*",
+    "{pf}/Microsoft/jdk-*",
+    "{pf}/Zulu/*",
+    "{pf}/Amazon Corretto/*",
+    "{pf}/BellSoft/*",
+    "~/.jdks/*",
+]
+WINDOWS_REGISTRY_KEYS = [
+    r"SOFTWARE\JavaSoft\JDK",
+    r"SOFTWARE\JavaSoft\Java Development Kit",
+    r"SOFTWARE\JavaSoft\JRE",
+    r"SOFTWARE\JavaSoft\Java Runtime Environment",
+    r"SOFTWARE\Eclipse Adoptium\JDK",
+    r"SOFTWARE\Eclipse Adoptium\JRE",
+    r"SOFTWARE\Microsoft\JDK",
+    r"SOFTWARE\Azul Systems\Zulu",
+]
+
+MC_JAVA_REQUIREMENTS = [
+    ((1, 20, 5), 21, None),
+    ((1, 18), 17, None),
+    ((1, 17), 16, None),
+    ((1, 13), 8, 16),
+    ((1, 0), 8, 8),
+]
+SNAPSHOT_JAVA_REQUIREMENTS = [
+    ((24, 14), 21),
+    ((21, 44), 17),
+    ((21, 19), 16),
+]
+
+
+class JavaRuntime(NamedTuple):
+    path: str
+    home: str
+    major: int
+    version: str
+    vendor: str
+    arch: str
+    vm_version: str
+
+
+def parse_java_properties(text: str) -> dict[str, str]:
+    props = {}
+    for line in text.splitlines():
+        m = re.match(r"^\s{4}([\w.]+) = (.*)$", line)
+        if m:
+            props[m.group(1)] = m.group(2).strip()
+    return props
+
+def java_major_from_version(version: str) -> int | None:
+    m = re.match(r"^(\d+)(?:\.(\d+))?", version or "")
+    if not m:
+        return None
+    major = int(m.group(1))
+    if major == 1 and m.group(2):
+        major = int(m.group(2))
+    return major
+
+
+_probe_lock = threading.Lock()
+_probe_cache: dict | None = None
+
+def _probe_cache_path() -> Path:
+    return config_path().parent / JAVA_PROBE_CACHE
+
+def _load_probe_cache() -> dict:
+    global _probe_cache
+    if _probe_cache is None:
+        try:
+            with open(_probe_cache_path(), "r", encoding="utf-8") as f:
+                _probe_cache = json.load(f)
+        except Exception:
+            _probe_cache = {}
+    return _probe_cache
+
+def _save_probe_cache() -> None:
+    path = _probe_cache_path()
+    try:
+        ensure_dir(path.parent)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_probe_cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except Exception:
+        pass
+
+def _run_probe(exe: str) -> JavaRuntime | None:
+    try:
+        out = subprocess.run([exe, "-XshowSettings:properties", "-version"], capture_output=True, text=True,
+                             timeout=JAVA_PROBE_TIMEOUT, errors="replace")
+    except Exception:
+        return None
+    props = parse_java_properties(out.stderr + out.stdout)
+    version = props.get("java.version", "")
+    major = java_major_from_version(props.get("java.specification.version") or version)
+    if major is None:
+        return None
+    return JavaRuntime(exe, props.get("java.home", str(Path(exe).parent.parent)), major, version,
+                       props.get("java.vendor", ""), props.get("os.arch", ""),
+                       props.get("java.vm.version") or props.get("java.runtime.version", ""))
+
+def probe_java(java_path: str) -> JavaRuntime | None:
+    exe = resolve_java_exec(java_path)
+    if not os.path.isabs(exe):
+        exe = shutil.which(exe) or exe
+    try:
+        real = os.path.realpath(exe)
+        st = os.stat(real)
+    except OSError:
+        return None
+    stamp = [st.st_mtime_ns, st.st_size]
+    with _probe_lock:
+        cache = _load_probe_cache()
+        entry = cache.get(real)
+        if entry and entry.get("stamp") == stamp:
+            return JavaRuntime(*entry["runtime"]) if entry.get("runtime") else None
+    runtime = _run_probe(real)
+    with _probe_lock:
+        cache[real] = {"stamp": stamp, "runtime": list(runtime) if runtime else None}
+        _save_probe_cache()
+    return runtime
+
+
+def _windows_registry_homes() -> list[str]:
+    homes = []
+    try:
+        import winreg
+    except Exception:
+        return homes
+    for hive in (winreg.HKEY_LOCAL_MACHINE, winreg.HKEY_CURRENT_USER):
+        for key_path in WINDOWS_REGISTRY_KEYS:
+            try:
+                key = winreg.OpenKey(hive, key_path)
+            except OSError:
+                continue
+            with key:
+                i = 0
+                while True:
+                    try:
+                        sub = winreg.EnumKey(key, i)
+                    except OSError:
+                        break
+                    i += 1
+                    for sub_path in (sub, sub + r"\hotspot\MSI"):
+                        try:
+                            with winreg.OpenKey(key, sub_path) as sk:
+                                for name in ("JavaHome", "Path", "InstallationPath"):
+                                    try:
+                                        homes.append(winreg.QueryValueEx(sk, name)[0])
+                                    except OSError:
+                                        pass
+                        except OSError:
+                            pass
+    return homes
+
+def candidate_java_paths() -> list[str]:
+    homes = []
+    if os.environ.get("JAVA_HOME"):
+        homes.append(os.environ["JAVA_HOME"])
+    patterns = list(UNIX_JAVA_GLOBS)
+    if os.name == "nt":
+        patterns = []
+        for env in ("ProgramFiles", "ProgramFiles(x86)", "ProgramW6432"):
+            if os.environ.get(env):
+                patterns += [p.replace("{pf}", os.environ[env]) for p in WINDOWS_JAVA_GLOBS]
+        homes += _windows_registry_homes()
+    elif sys.platform == "darwin":
+        try:
+            out = subprocess.run(["/usr/libexec/java_home", "-V"], capture_output=True, text=True, timeout=5)
+            homes += re.findall(r"\s(/\S.*?/Contents/Home)\s*$", out.stderr, re.M)
+        except Exception:
+            pass
+    for pattern in patterns:
+        homes += glob.glob(os.path.expanduser(pattern))
+
+    found = []
+    seen = set()
+    on_path = shutil.which("java")
+    if on_path:
+        homes.insert(0, str(Path(os.path.realpath(on_path)).parent.parent))
+    for home in homes:
+        exe = Path(home) / "bin" / JAVA_EXE
+        try:
+            real = os.path.realpath(exe)
+        except OSError:
+            continue
+        if real in seen or not os.path.isfile(real):
+            continue
+        seen.add(real)
+        found.append(real)
+    return found
+
+_discovered: list[JavaRuntime] | None = None
+
+def discover_java(rescan: bool = False) -> list[JavaRuntime]:
+    global _discovered
+    if _discovered is not None and not rescan:
+        return _discovered
+    runtimes = []
+    for exe in candidate_java_paths():
+        rt = probe_java(exe)
+        if rt and all(rt.path != r.path for r in runtimes):
+            runtimes.append(rt)
+    runtimes.sort(key=lambda r: (r.major, version_key(r.version)), reverse=True)
+    _discovered = runtimes
+    return runtimes
+
+
+def java_major_range(mc_version: str) -> tuple[int, int | None]:
+    mc = (mc_version or "").strip().split("-")[0]
+    m = re.match(r"^(\d{2})w(\d{2})", mc)
+    if m:
+        week = (int(m.group(1)), int(m.group(2)))
+        return next((major for since, major in SNAPSHOT_JAVA_REQUIREMENTS if week >= since), 8), None
+    if re.match(r"^(rd|inf|[abc])[\d-]", mc):
+        return 8, None
+    if not re.match(r"^\d+\.\d+", mc):
+        return MC_JAVA_REQUIREMENTS[0][1], None
+    nums = version_key(mc)[1]
+    return next(((low, high) for since, low, high in MC_JAVA_REQUIREMENTS if nums >= since + (0,) * (4 - len(since))), (8, None))
+
+def required_java_major(mc_version: str) -> int:
+    return java_major_range(mc_version)[0]
+
+def describe_java_requirement(mc_version: str) -> str:
+    low, high = java_major_range(mc_version)
+    if high is None:
+        return f"Java {low} 以上"
+    return f"Java {low}" if low == high else f"Java {low}〜{high}"
+
+def pick_java(mc_version: str, runtimes: list[JavaRuntime] | None = None) -> JavaRuntime | None:
+    need, limit = java_major_range(mc_version)
+    runtimes = discover_java() if runtimes is None else runtimes
+    ok = [r for r in runtimes if r.major >= need and (limit is None or r.major <= limit)]
+    if not ok:
+        return None
+    return min(ok, key=lambda r: (r.major, [-n for n in version_key(r.version)[1]]))
+
+def effective_java_path(java_path: str, mc_version: str) -> str:
+    if (java_path or "").strip():
+        return java_path
+    rt = pick_java(mc_version)
+    return rt.path if rt else ""
+
+def check_java_compat(java_path: str, mc_version: str) -> str | None:
+    rt = probe_java(java_path)
+    if rt is None:
+        return None
+    need, limit = java_major_range(mc_version)
+    if rt.major < need:
+        return f"Minecraft {mc_version} には Java {need} 以上が必要です（選択中: Java {rt.major}）。"
+    if limit is not None and rt.major > limit:
+        return f"Minecraft {mc_version} は Java {limit} までしか対応していません（選択中: Java {rt.major}）。"
+    return None
+
+def describe_java(rt: JavaRuntime) -> str:
+    return f"Java {rt.major} ({rt.version}, {rt.vendor}, {rt.arch}) - {rt.path}"
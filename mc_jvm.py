@@ -0,0 +1,329 @@
+import os
+import re
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import NamedTuple
+
+from mc_core import ensure_dir
+from mc_java import probe_java
+
+JVM_PROFILES = {
+    "aikar": "G1GC（Aikar 推奨フラグ）",
+    "zgc": "ZGC（JDK 15 以降、21 以降は世代別）",
+    "shenandoah": "Shenandoah GC（JDK 15 以降の対応ビルドのみ）",
+    "basic": "最小構成（-Xmx/-Xms のみ）",
+}
+DEFAULT_JVM_PROFILE = "aikar"
+G1_LARGE_HEAP_MB = 12 * 1024
+HEAP_HEADROOM_MB = 1024
+APPCDS_DIR = ".mcsoft/appcds"
+APPCDS_STATE = "state.json"
+APPCDS_MIN_JAVA = 13
+STARTUP_LOG = "logs/mcsoft-startup.jsonl"
+STARTUP_DONE_PATTERN = re.compile(r'Done \((\d+(?:[.,]\d+)?)s\)!')
+
+AIKAR_COMMON_FLAGS = [
+    "-XX:+UseG1GC",
+    "-XX:+ParallelRefProcEnabled",
+    "-XX:MaxGCPauseMillis=200",
+    "-XX:+UnlockExperimentalVMOptions",
+    "-XX:+DisableExplicitGC",
+    "-XX:+AlwaysPreTouch",
+    "-XX:G1HeapWastePercent=5",
+    "-XX:G1MixedGCCountTarget=4",
+    "-XX:G1MixedGCLiveThresholdPercent=90",
+    "-XX:G1RSetUpdatingPauseTimePercent=5",
+    "-XX:SurvivorRatio=32",
+    "-XX:+PerfDisableSharedMem",
+    "-XX:MaxTenuringThreshold=1",
+]
+AIKAR_SMALL_HEAP_FLAGS = [
+    "-XX:G1NewSizePercent=30",
+    "-XX:G1MaxNewSizePercent=40",
+    "-XX:G1HeapRegionSize=8M",
+    "-XX:G1ReservePercent=20",
+    "-XX:InitiatingHeapOccupancyPercent=15",
+]
+AIKAR_LARGE_HEAP_FLAGS = [
+    "-XX:G1NewSizePercent=40",
+    "-XX:G1MaxNewSizePercent=50",
+    "-XX:G1HeapRegionSize=16M",
+    "-XX:G1ReservePercent=15",
+    "-XX:InitiatingHeapOccupancyPercent=20",
+]
+AIKAR_MARKER_FLAGS = ["-Dusing.aikars.flags=https://mcflags.emc.gs", "-Daikars.new.flags=true"]
+
+
+class HostInfo(NamedTuple):
+    cores: int
+    memory_mb: int | None
+    large_pages: str | None
+
+
+class JvmProfile(NamedTuple):
+    name: str
+    args: str
+    notes: list[str]
+
+
+def detect_cores() -> int:
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except Exception:
+        return max(1, os.cpu_count() or 1)
+
+def detect_memory_mb() -> int | None:
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) // 1024
+    except Exception:
+        pass
+    if os.name == "nt":
+        try:
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+            stat = MEMORYSTATUSEX()
+            stat.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+                return stat.ullTotalPhys // (1024 * 1024)
+        except Exception:
+            pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except Exception:
+        return None
+
+def detect_large_pages() -> str | None:
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("HugePages_Total:") and int(line.split()[1]) > 0:
+                    return "-XX:+UseLargePages"
+    except Exception:
+        pass
+    try:
+        thp = Path("/sys/kernel/mm/transparent_hugepage/enabled").read_text(encoding="ascii")
+        if "[always]" in thp or "[madvise]" in thp:
+            return "-XX:+UseTransparentHugePages"
+    except Exception:
+        pass
+    return None
+
+_host_info: HostInfo | None = None
+
+def host_info() -> HostInfo:
+    global _host_info
+    if _host_info is None:
+        _host_info = HostInfo(detect_cores(), detect_memory_mb(), detect_large_pages())
+    return _host_info
+
+
+def java_major_version(java_path: str) -> int | None:
+    rt = probe_java(java_path)
+    return rt.major if rt else None
+
+
+def _heap_mb(ram) -> int:
+    return int(ram) if str(ram).strip().isdigit() else 2048
+
+def build_jvm_profile(profile: str, ram, java_major: int | None = None, host: HostInfo | None = None) -> JvmProfile:
+    host = host or host_info()
+    heap = _heap_mb(ram)
+    notes = []
+    if profile not in JVM_PROFILES:
+        notes.append(f"不明なプロファイル '{profile}' のため {DEFAULT_JVM_PROFILE} を使用します。")
+        profile = DEFAULT_JVM_PROFILE
+    if host.memory_mb and heap > host.memory_mb - HEAP_HEADROOM_MB:
+        notes.append(f"メモリ {heap}MB は搭載メモリ {host.memory_mb}MB に対して大きすぎます。OS 用に {HEAP_HEADROOM_MB}MB 以上残してください。")
+
+    if profile == "zgc" and java_major is not None and java_major < 15:
+        notes.append(f"Java {java_major} では ZGC を使用できないため G1 にフォールバックします。")
+        profile = "aikar"
+    if profile == "shenandoah" and java_major is not None and java_major < 15:
+        notes.append(f"Java {java_major} では Shenandoah を使用できないため G1 にフォールバックします。")
+        profile = "aikar"
+
+    flags = [f"-Xms{heap}M", f"-Xmx{heap}M"]
+    if profile == "aikar":
+        flags += AIKAR_COMMON_FLAGS
+        flags += AIKAR_LARGE_HEAP_FLAGS if heap >= G1_LARGE_HEAP_MB else AIKAR_SMALL_HEAP_FLAGS
+        flags += AIKAR_MARKER_FLAGS
+        notes.append("G1 リージョン " + ("16M（12GB 以上のヒープ）" if heap >= G1_LARGE_HEAP_MB else "8M（12GB 未満のヒープ）"))
+    elif profile == "zgc":
+        flags += ["-XX:+UseZGC"]
+        if java_major is not None and 21 <= java_major < 23:
+            flags += ["-XX:+ZGenerational"]
+        elif java_major is None:
+            notes.append("Java のバージョンを判定できませんでした。JDK 21/22 では -XX:+ZGenerational の追加を推奨します。")
+        flags += ["-XX:+AlwaysPreTouch", "-XX:+DisableExplicitGC", "-XX:+PerfDisableSharedMem",
+                  f"-XX:ConcGCThreads={max(1, host.cores // 4)}"]
+    elif profile == "shenandoah":
+        flags += ["-XX:+UseShenandoahGC", "-XX:+AlwaysPreTouch", "-XX:+DisableExplicitGC",
+                  "-XX:+PerfDisableSharedMem", f"-XX:ConcGCThreads={max(1, host.cores // 4)}"]
+        notes.append("Oracle JDK など一部のビルドには Shenandoah が含まれていません。")
+
+    if profile != "basic" and host.large_pages:
+        flags.append(host.large_pages)
+        notes.append(f"ラージページを有効化しました ({host.large_pages})")
+    return JvmProfile(profile, " ".join(flags), notes)
+
+def jvm_args_for(config: dict, ram=None, java_path: str | None = None) -> str:
+    profile = config.get("jvm_profile") or DEFAULT_JVM_PROFILE
+    java = config.get("java_path", "") if java_path is None else java_path
+    major = java_major_version(java) if profile in ("zgc", "shenandoah") else None
+    return build_jvm_profile(profile, ram if ram is not None else config.get("ram", "2048"), major).args
+
+def describe_jvm_profile(result: JvmProfile, host: HostInfo | None = None) -> str:
+    host = host or host_info()
+    mem = f"{host.memory_mb}MB" if host.memory_mb else "不明"
+    lines = [f"プロファイル: {result.name} - {JVM_PROFILES[result.name]}",
+             f"CPU コア: {host.cores} / メモリ: {mem}",
+             "",
+             result.args]
+    if result.notes:
+        lines.append("")
+        lines += ["* " + n for n in result.notes]
+    return "\n".join(lines)
+
+
+def _launch_target_digest(target: Path, state: dict) -> str:
+    st = target.stat()
+    cached = state.get("target") or {}
+    if cached.get("path") == str(target) and cached.get("size") == st.st_size and cached.get("mtime") == st.st_mtime_ns:
+        return cached["sha256"]
+    h = hashlib.sha256()
+    with open(target, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    state["target"] = {"path": str(target), "size": st.st_size, "mtime": st.st_mtime_ns, "sha256": h.hexdigest()}
+    return state["target"]["sha256"]
+
+def _read_appcds_state(cds_dir: Path) -> dict:
+    try:
+        with open(cds_dir / APPCDS_STATE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _write_appcds_state(cds_dir: Path, state: dict) -> None:
+    ensure_dir(cds_dir)
+    tmp = cds_dir / (APPCDS_STATE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, cds_dir / APPCDS_STATE)
+
+def appcds_flags(server_dir: Path, target: Path, java_path: str) -> tuple[list[str], str]:
+    rt = probe_java(java_path)
+    if rt is None or rt.major < APPCDS_MIN_JAVA:
+        return [], "off"
+    version = f"{rt.version} {rt.vendor} {rt.vm_version} {rt.arch} {rt.path}"
+    cds_dir = Path(server_dir) / APPCDS_DIR
+    state = _read_appcds_state(cds_dir)
+    try:
+        digest = _launch_target_digest(Path(target), state)
+    except Exception:
+        return [], "off"
+    key = hashlib.sha256(f"{digest}\n{version}".encode("utf-8")).hexdigest()[:16]
+    archive = cds_dir / f"server-{key}.jsa"
+    if state.get("key") == key and archive.exists() and archive.stat().st_size > 0:
+        mode = "use"
+        flags = [f"-XX:SharedArchiveFile={archive.resolve()}"]
+    else:
+        ensure_dir(cds_dir)
+        for old in cds_dir.glob("server-*.jsa"):
+            if old != archive:
+                try:
+                    old.unlink()
+                except Exception:
+                    pass
+        mode = "train"
+        flags = [f"-XX:ArchiveClassesAtExit={archive.resolve()}"]
+    state["key"] = key
+    state["java"] = version
+    _write_appcds_state(cds_dir, state)
+    return flags, mode
+
+def with_appcds(cmd: list[str], server_dir: Path, target: Path, java_path: str) -> tuple[list[str], str]:
+    flags, mode = appcds_flags(server_dir, target, java_path)
+    return cmd[:1] + flags + cmd[1:], mode
+
+def clear_appcds(server_dir: Path) -> int:
+    removed = 0
+    cds_dir = Path(server_dir) / APPCDS_DIR
+    for p in list(cds_dir.glob("server-*.jsa")) + [cds_dir / APPCDS_STATE]:
+        try:
+            p.unlink()
+            removed += 1
+        except Exception:
+            pass
+    return removed
+
+
+class StartupRecorder:
+    def __init__(self, server_dir: Path, mode: str = "off"):
+        self.log_path = Path(server_dir) / STARTUP_LOG
+        self.mode = mode
+        self.started = time.monotonic()
+        self.done = False
+        self.seconds: float | None = None
+
+    def feed(self, lines) -> float | None:
+        if self.done:
+            return None
+        for line in lines:
+            if "Done (" not in line:
+                continue
+            m = STARTUP_DONE_PATTERN.search(line)
+            if m:
+                self.done = True
+                self.seconds = time.monotonic() - self.started
+                self._record(float(m.group(1).replace(",", ".")))
+                return self.seconds
+        return None
+
+    def _record(self, reported: float) -> None:
+        entry = {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "seconds": round(self.seconds, 3),
+                 "reported": reported, "appcds": self.mode}
+        try:
+            ensure_dir(self.log_path.parent)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except Exception:
+            pass
+
+def startup_history(server_dir: Path, limit: int = 0) -> list[dict]:
+    entries = []
+    try:
+        with open(Path(server_dir) / STARTUP_LOG, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except Exception:
+                    pass
+    except Exception:
+        pass
+    return entries[-limit:] if limit else entries
+
+def startup_summary(entries: list[dict]) -> dict[str, tuple[int, float]]:
+    summary = {}
+    for mode in ("off", "train", "use"):
+        times = [e["seconds"] for e in entries if e.get("appcds") == mode]
+        if times:
+            summary[mode] = (len(times), sum(times) / len(times))
+    return summary
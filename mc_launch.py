@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import shlex
+import shutil
+import hashlib
+from pathlib import Path
+
+from mc_core import ensure_dir, find_server_jar, resolve_java_exec, split_jvm_args
+from mc_java import effective_java_path, probe_java
+from mc_gc import GC_LOG_FILE, GC_LOG_MIN_JAVA, gc_log_flags, has_gc_logging
+from mc_jvm import DEFAULT_JVM_PROFILE, jvm_args_for
+
+LAUNCH_MANIFEST = ".mcsoft/launch.json"
+LAUNCH_MANIFEST_VERSION = 1
+START_BAT = "start.bat"
+START_SH = "start.sh"
+ARGFILE_NAMES = {"nt": "win_args.txt", "posix": "unix_args.txt"}
+
+
+def launch_inputs(settings: dict) -> dict:
+    return {
+        "args": (settings.get("args") or "").strip(),
+        "ram": str(settings.get("ram") or ""),
+        "java_path": (settings.get("java_path") or "").strip(),
+        "jvm_profile": settings.get("jvm_profile") or DEFAULT_JVM_PROFILE,
+        "gc_log": bool(settings.get("gc_log")),
+    }
+
+def _file_stamp(path: Path) -> list[int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _target_args(target: str) -> list[str]:
+    if target.endswith(".txt"):
+        return ["@" + target]
+    return ["-jar", target]
+
+def _resolve_java_binary(java_path: str) -> str:
+    exe = resolve_java_exec(java_path)
+    if not os.path.isabs(exe):
+        exe = shutil.which(exe) or exe
+    return os.path.realpath(exe) if os.path.isabs(exe) else exe
+
+def manifest_path(server_dir: Path) -> Path:
+    return Path(server_dir) / LAUNCH_MANIFEST
+
+def write_launch_manifest(server_dir: Path, target: Path, java_path: str, args_text: str, settings: dict | None = None,
+                          env: dict | None = None, server_type: str = "", mc_version: str = "") -> dict:
+    server_dir = Path(server_dir)
+    target = Path(target)
+    try:
+        rel = target.resolve().relative_to(server_dir.resolve()).as_posix()
+    except ValueError:
+        rel = target.resolve().as_posix()
+    settings = settings or {}
+    java = _resolve_java_binary(java_path)
+    jvm_args = split_jvm_args(args_text, settings.get("ram", ""))
+    gc_log = None
+    if has_gc_logging(jvm_args):
+        gc_log = next((GC_LOG_FILE for a in jvm_args if f"file={GC_LOG_FILE}" in a), None)
+    elif settings.get("gc_log"):
+        rt = probe_java(java)
+        flags = gc_log_flags(rt.major if rt else None)
+        if flags:
+            jvm_args += flags
+            gc_log = GC_LOG_FILE
+    manifest = {
+        "version": LAUNCH_MANIFEST_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "server_type": server_type or settings.get("server_type", ""),
+        "mc_version": mc_version or settings.get("version", ""),
+        "target": rel,
+        "target_sha256": _sha256(server_dir / rel),
+        "target_stamp": _file_stamp(server_dir / rel),
+        "java": java,
+        "java_stamp": _file_stamp(Path(java)) if os.path.isabs(java) else None,
+        "jvm_args": jvm_args,
+        "env": dict(env or {}),
+        "gc_log": gc_log,
+        "inputs": launch_inputs(settings),
+        "command": [java] + jvm_args + _target_args(rel) + ["nogui"],
+    }
+    _save_launch_manifest(server_dir, manifest)
+    write_start_scripts(server_dir, manifest)
+    return manifest
+
+def _save_launch_manifest(server_dir: Path, manifest: dict) -> None:
+    path = manifest_path(server_dir)
+    ensure_dir(path.parent)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def load_launch_manifest(server_dir: Path) -> dict | None:
+    try:
+        with open(manifest_path(server_dir), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception:
+        return None
+    if manifest.get("version") != LAUNCH_MANIFEST_VERSION:
+        return None
+    return manifest
+
+def validate_launch_manifest(server_dir: Path, manifest: dict, settings: dict | None = None, target: Path | None = None) -> str | None:
+    server_dir = Path(server_dir)
+    if settings is not None and manifest.get("inputs") != launch_inputs(settings):
+        return "起動設定が変更されました"
+    target_path = server_dir / manifest["target"]
+    if target is not None and Path(target).resolve() != target_path.resolve():
+        return "起動ファイルが変更されました"
+    stamp = _file_stamp(target_path)
+    if stamp is None:
+        return f"{manifest['target']} が見つかりません"
+    if stamp != manifest.get("target_stamp"):
+        if _sha256(target_path) != manifest.get("target_sha256"):
+            return f"{manifest['target']} が更新されています"
+        manifest["target_stamp"] = stamp
+    if manifest.get("java_stamp") is not None and _file_stamp(Path(manifest["java"])) != manifest["java_stamp"]:
+        return "Java が更新または削除されました"
+    return None
+
+def _ensure_log_dirs(server_dir: Path, manifest: dict) -> None:
+    if manifest.get("gc_log"):
+        ensure_dir((server_dir / manifest["gc_log"]).parent)
+
+def prepare_launch(server_dir: Path, settings: dict, target: Path | None = None) -> tuple[dict | None, str | None]:
+    server_dir = Path(server_dir)
+    manifest = load_launch_manifest(server_dir)
+    reason = None
+    if manifest is not None:
+        stamp = manifest.get("target_stamp")
+        reason = validate_launch_manifest(server_dir, manifest, settings, target)
+        if reason is None:
+            if manifest.get("target_stamp") != stamp:
+                try:
+                    _save_launch_manifest(server_dir, manifest)
+                except Exception:
+                    pass
+            _ensure_log_dirs(server_dir, manifest)
+            return manifest, None
+    target = Path(target) if target else find_server_jar(server_dir)
+    if not target:
+        return None, reason
+    java_path = effective_java_path(settings.get("java_path", ""), settings.get("version", ""))
+    args_text = (settings.get("args") or "").strip() or jvm_args_for(settings, settings.get("ram"), java_path)
+    manifest = write_launch_manifest(server_dir, target, java_path, args_text, settings,
+                                     env=(manifest or {}).get("env"))
+    _ensure_log_dirs(server_dir, manifest)
+    note = f"{reason}。起動マニフェストを再作成しました" if reason else "起動マニフェストを作成しました"
+    if settings.get("gc_log") and not manifest.get("gc_log"):
+        note += f"（GC ログには Java {GC_LOG_MIN_JAVA} 以降が必要です）"
+    return manifest, note
+
+def manifest_command(manifest: dict, nogui: bool = True) -> list[str]:
+    cmd = list(manifest["command"])
+    if not nogui and cmd and cmd[-1] == "nogui":
+        cmd.pop()
+    return cmd
+
+def manifest_env(manifest: dict) -> dict | None:
+    extra = manifest.get("env") or {}
+    if not extra:
+        return None
+    env = dict(os.environ)
+    env.update({str(k): str(v) for k, v in extra.items()})
+    return env
+
+
+def _script_command(manifest: dict, platform: str) -> list[str]:
+    cmd = manifest_command(manifest)
+    target = manifest["target"]
+    if target.endswith(".txt"):
+        name = ARGFILE_NAMES[platform]
+        target = target.rsplit("/", 1)[0] + "/" + name if "/" in target else name
+        cmd = cmd[:-2] + ["@" + target, "nogui"]
+    return cmd
+
+def _bat_quote(arg: str) -> str:
+    arg = arg.replace("%", "%%")
+    return f'"{arg}"' if any(c in arg for c in ' &()^|<>') else arg
+
+def write_start_scripts(server_dir: Path, manifest: dict) -> None:
+    server_dir = Path(server_dir)
+    env = manifest.get("env") or {}
+
+    cmd = _script_command(manifest, "nt")
+    lines = ["@echo off", "cd /d \"%~dp0\""]
+    lines += [f'set "{k}={v}"' for k, v in env.items()]
+    lines += [f'"{cmd[0]}" ' + " ".join(_bat_quote(a) for a in cmd[1:]), "pause", ""]
+    (server_dir / START_BAT).write_text("\n".join(lines), encoding="utf-8", newline="\r\n")
+
+    cmd = _script_command(manifest, "posix")
+    lines = ["#!/bin/sh", 'cd "$(dirname "$0")" || exit 1']
+    lines += [f"export {k}={shlex.quote(str(v))}" for k, v in env.items()]
+    lines += ["exec " + " ".join(shlex.quote(a) for a in cmd) + ' "$@"', ""]
+    sh = server_dir / START_SH
+    sh.write_text("\n".join(lines), encoding="utf-8", newline="\n")
+    try:
+        sh.chmod(0o755)
+    except Exception:
+        pass
@@ -0,0 +1,306 @@
+import os
+import time
+import threading
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_INTERVAL = 1.0
+METRICS_HISTORY = 600
+METRICS_HOST = "127.0.0.1"
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+SAMPLE_FIELDS = ("time", "cpu_percent", "rss_bytes", "threads", "read_bytes", "write_bytes", "open_fds")
+
+
+def _load_psutil():
+    try:
+        import psutil
+    except Exception:
+        return None
+    return psutil
+
+
+class MetricRing:
+    def __init__(self, fields=SAMPLE_FIELDS, capacity: int = METRICS_HISTORY):
+        self.fields = tuple(fields)
+        self.capacity = max(2, int(capacity))
+        self._data = {f: array("d", bytes(8 * self.capacity)) for f in self.fields}
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, sample: dict) -> None:
+        with self._lock:
+            i = self._head
+            for f in self.fields:
+                self._data[f][i] = float(sample.get(f, 0.0))
+            self._head = (i + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+
+    def latest(self) -> dict | None:
+        with self._lock:
+            if not self._count:
+                return None
+            i = (self._head - 1) % self.capacity
+            return {f: self._data[f][i] for f in self.fields}
+
+    def series(self, field: str, n: int = 0) -> list[float]:
+        with self._lock:
+            count = self._count if not n else min(n, self._count)
+            start = (self._head - count) % self.capacity
+            col = self._data[field]
+            if start + count <= self.capacity:
+                return col[start:start + count].tolist()
+            return col[start:].tolist() + col[:start + count - self.capacity].tolist()
+
+
+def sparkline(values, width: int = 0, lo: float | None = None, hi: float | None = None) -> str:
+    values = list(values)
+    if width and len(values) > width:
+        values = values[-width:]
+    if not values:
+        return ""
+    lo = min(values) if lo is None else lo
+    hi = max(values) if hi is None else hi
+    span = hi - lo
+    if span <= 0:
+        return SPARK_CHARS[0] * len(values)
+    top = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[max(0, min(top, int((v - lo) / span * top + 0.5)))] for v in values)
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}GB"
+
+
+class ProcStatReader:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.base = f"/proc/{pid}"
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def read(self) -> dict:
+        with open(f"{self.base}/stat", "rb") as f:
+            stat = f.read()
+        fields = stat[stat.rindex(b")") + 2:].split()
+        cpu = (int(fields[11]) + int(fields[12])) / self.ticks
+        threads = int(fields[17])
+        rss = int(fields[21]) * self.page_size
+        read_bytes = write_bytes = 0
+        try:
+            with open(f"{self.base}/io", "rb") as f:
+                for line in f:
+                    if line.startswith(b"read_bytes:"):
+                        read_bytes = int(line.split()[1])
+                    elif line.startswith(b"write_bytes:"):
+                        write_bytes = int(line.split()[1])
+        except OSError:
+            pass
+        try:
+            fds = len(os.listdir(f"{self.base}/fd"))
+        except OSError:
+            fds = 0
+        return {"cpu_seconds": cpu, "rss_bytes": rss, "threads": threads,
+                "read_bytes": read_bytes, "write_bytes": write_bytes, "open_fds": fds}
+
+
+class PsutilReader:
+    def __init__(self, pid: int, psutil):
+        self.proc = psutil.Process(pid)
+
+    def read(self) -> dict:
+        p = self.proc
+        with p.oneshot():
+            cpu = p.cpu_times()
+            sample = {"cpu_seconds": cpu.user + cpu.system, "rss_bytes": p.memory_info().rss,
+                      "threads": p.num_threads(), "read_bytes": 0, "write_bytes": 0, "open_fds": 0}
+            try:
+                io = p.io_counters()
+                sample["read_bytes"], sample["write_bytes"] = io.read_bytes, io.write_bytes
+            except Exception:
+                pass
+            try:
+                sample["open_fds"] = p.num_handles() if os.name == "nt" else p.num_fds()
+            except Exception:
+                pass
+        return sample
+
+def process_reader(pid: int):
+    if os.path.exists(f"/proc/{pid}/stat"):
+        return ProcStatReader(pid)
+    psutil = _load_psutil()
+    if psutil is None:
+        return None
+    try:
+        return PsutilReader(pid, psutil)
+    except Exception:
+        return None
+
+
+class ProcessSampler:
+    def __init__(self, pid: int, interval: float = METRICS_INTERVAL, capacity: int = METRICS_HISTORY):
+        self.pid = pid
+        self.interval = max(0.1, float(interval))
+        self.ring = MetricRing(SAMPLE_FIELDS, capacity)
+        self.reader = process_reader(pid)
+        self.samples_total = 0
+        self._last_cpu: tuple[float, float] | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def available(self) -> bool:
+        return self.reader is not None
+
+    def start(self) -> "ProcessSampler":
+        if self.reader is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"sampler-{self.pid}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def sample_once(self) -> dict | None:
+        try:
+            raw = self.reader.read()
+        except Exception:
+            return None
+        now = time.monotonic()
+        cpu_percent = 0.0
+        if self._last_cpu is not None:
+            dt = now - self._last_cpu[0]
+            if dt > 0:
+                cpu_percent = max(0.0, (raw["cpu_seconds"] - self._last_cpu[1]) / dt * 100.0)
+        self._last_cpu = (now, raw["cpu_seconds"])
+        sample = dict(raw, time=time.time(), cpu_percent=cpu_percent)
+        self.ring.append(sample)
+        self.samples_total += 1
+        return sample
+
+    def _run(self) -> None:
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            if self.sample_once() is None:
+                break
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                next_at = time.monotonic()
+                delay = 0
+            if self._stop.wait(delay):
+                break
+
+    def summary(self, width: int = 40) -> str:
+        last = self.ring.latest()
+        if not last:
+            return ""
+        cpu = self.ring.series("cpu_percent", width)
+        rss = self.ring.series("rss_bytes", width)
+        return (f"CPU {last['cpu_percent']:5.1f}% {sparkline(cpu, lo=0)}  "
+                f"RSS {format_bytes(last['rss_bytes'])} {sparkline(rss)}  "
+                f"threads {int(last['threads'])}  fds {int(last['open_fds'])}")
+
+    def collect(self, labels: dict) -> list[tuple]:
+        last = self.ring.latest()
+        up = 1.0 if self.running else 0.0
+        out = [("mcsoft_process_up", "gauge", "Whether the sampled server process is alive", labels, up),
+               ("mcsoft_sampler_samples_total", "counter", "Samples taken by the process sampler", labels, self.samples_total)]
+        if last:
+            out += [
+                ("mcsoft_process_cpu_percent", "gauge", "CPU usage of the server process (100 = one core)", labels, last["cpu_percent"]),
+                ("mcsoft_process_resident_memory_bytes", "gauge", "Resident set size of the server process", labels, last["rss_bytes"]),
+                ("mcsoft_process_threads", "gauge", "Thread count of the server process", labels, last["threads"]),
+                ("mcsoft_process_io_read_bytes_total", "counter", "Bytes read from storage by the server process", labels, last["read_bytes"]),
+                ("mcsoft_process_io_write_bytes_total", "counter", "Bytes written to storage by the server process", labels, last["write_bytes"]),
+                ("mcsoft_process_open_fds", "gauge", "Open file descriptors or handles of the server process", labels, last["open_fds"]),
+            ]
+        return out
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render_prometheus(samples: list[tuple]) -> str:
+    lines = []
+    described = set()
+    for name, mtype, help_text, labels, value in samples:
+        family = name.rsplit("_", 1)[0] if mtype == "histogram" and name.endswith(("_bucket", "_sum", "_count")) else name
+        if family not in described:
+            described.add(family)
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {mtype}")
+        label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items()))
+        lines.append(f"{name}{{{label_text}}} {float(value):.6g}" if label_text else f"{name} {float(value):.6g}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    def __init__(self, port: int, host: str = METRICS_HOST):
+        self.host = host
+        self.port = int(port)
+        self._collectors: list = []
+        self._lock = threading.Lock()
+        self._httpd: ThreadingHTTPServer | None = None
+
+    def add_collector(self, collector) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector) -> None:
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def render(self) -> str:
+        samples = []
+        with self._lock:
+            collectors = list(self._collectors)
+        for c in collectors:
+            try:
+                samples.extend(c())
+            except Exception:
+                pass
+        samples.sort(key=lambda s: s[0])
+        return render_prometheus(samples)
+
+    def start(self) -> "MetricsServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = server.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
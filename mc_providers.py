@@ -0,0 +1,568 @@
+import io
+import os
+import time
+import threading
+import subprocess
+import xml.etree.ElementTree as ET
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
+
+from mc_core import (
+    CATALOG_BUILD_TTL,
+    HTTP_CACHE_TTL_IMMUTABLE,
+    DEFAULT_SERVER_PROPERTIES,
+    cached_get,
+    cached_get_json,
+    cached_get_text,
+    ensure_dir,
+    download_file_stream,
+    jar_store,
+    resolve_java_exec,
+    write_properties,
+    sort_versions,
+    version_key,
+    version_sort_string,
+    close_process_pipes,
+    guess_release_type,
+    version_catalog,
+)
+from mc_launch import ARGFILE_NAMES, write_launch_manifest
+
+PAPER_API_ROOT = "https://api.papermc.io/v2"
+MOJANG_MANIFEST = "https://launchermeta.mojang.com/mc/game/version_manifest.json"
+PURPUR_API_ROOT = "https://api.purpurmc.org/v2"
+FABRIC_META_ROOT = "https://meta.fabricmc.net/v2"
+FORGE_MAVEN_ROOT = "https://maven.minecraftforge.net/net/minecraftforge/forge"
+FORGE_METADATA_URL = f"{FORGE_MAVEN_ROOT}/maven-metadata.xml"
+FORGE_PROMOTIONS_URL = "https://files.minecraftforge.net/net/minecraftforge/forge/promotions_slim.json"
+
+VERSION_FETCH_TIMEOUT = 10
+FORGE_INDEX_TTL = 300
+TICK_QUERY_SINCE = (1, 20, 3, 0)
+FORGE_INSTALL_TIMEOUT = 900
+FORGE_ARGFILE_SINCE = (1, 17, 0, 0)
+JAR_HASHES = ("sha256", "sha1", "md5")
+
+
+class JarResolution(NamedTuple):
+    url: str | None
+    name: str | None
+    hashes: dict
+    build: str | None = None
+
+
+class ServerProvider:
+    name = ""
+    label = ""
+    prefetch_timeout = VERSION_FETCH_TIMEOUT
+    resolve_channels: tuple[str, ...] | None = None
+
+    def __init__(self, fetch_json=None, fetch_text=None):
+        self.fetch_json = fetch_json or cached_get_json
+        self.fetch_text = fetch_text or cached_get_text
+
+    def list_versions(self, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        raise NotImplementedError
+
+    def list_builds(self, version: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        return []
+
+    def split_version(self, version: str) -> tuple[str, str | None]:
+        return version, None
+
+    def build_hashes(self, version: str, build: dict, timeout: float = VERSION_FETCH_TIMEOUT) -> dict:
+        return {}
+
+    def missing_build(self, version: str) -> str:
+        return f"{self.label} {version} のビルドが見つかりません"
+
+    def install(self, jar_path: Path, server_dir: Path, java_path: str, status_callback=None) -> Path:
+        return jar_path
+
+    def telemetry_commands(self, version: str) -> tuple[str, ...]:
+        known, nums = version_key(version.split("-")[0])[:2]
+        return ("tick query",) if known and nums >= TICK_QUERY_SINCE else ()
+
+
+class PaperProvider(ServerProvider):
+    def __init__(self, project: str = "paper", label: str = "PaperMC", **kwargs):
+        super().__init__(**kwargs)
+        self.name = project
+        self.project = project
+        self.label = label
+
+    def telemetry_commands(self, version: str) -> tuple[str, ...]:
+        return ("tps", "mspt")
+
+    def list_versions(self, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        j = self.fetch_json(f"{PAPER_API_ROOT}/projects/{self.project}", timeout=timeout)
+        return [{"id": v} for v in j.get("versions", [])]
+
+    def list_builds(self, version: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        j = self.fetch_json(f"{PAPER_API_ROOT}/projects/{self.project}/versions/{version}/builds", timeout=timeout)
+        builds = []
+        for b in j.get("builds", []):
+            app = b.get("downloads", {}).get("application", {})
+            name = app.get("name") or f"{self.project}-{version}-{b.get('build')}.jar"
+            builds.append({
+                "build": int(b.get("build", 0)),
+                "name": name,
+                "url": f"{PAPER_API_ROOT}/projects/{self.project}/versions/{version}/builds/{b.get('build')}/downloads/{name}",
+                "sha256": app.get("sha256"),
+                "channel": b.get("channel"),
+            })
+        return builds
+
+
+class PurpurProvider(ServerProvider):
+    name = "purpur"
+    label = "Purpur"
+
+    def telemetry_commands(self, version: str) -> tuple[str, ...]:
+        return ("tps", "mspt")
+
+    def list_versions(self, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        j = self.fetch_json(f"{PURPUR_API_ROOT}/purpur", timeout=timeout)
+        if isinstance(j, dict):
+            versions = j.get("versions", [])
+        elif isinstance(j, list):
+            versions = j
+        else:
+            versions = []
+        return [{"id": v} for v in versions]
+
+    def list_builds(self, version: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        j = self.fetch_json(f"{PURPUR_API_ROOT}/purpur/{version}", timeout=timeout)
+        all_builds = j.get("builds", {}).get("all", []) if isinstance(j, dict) else []
+        return [
+            {
+                "build": int(b),
+                "name": f"purpur-{version}-{b}.jar",
+                "url": f"{PURPUR_API_ROOT}/purpur/{version}/{b}/download",
+            }
+            for b in all_builds if str(b).isdigit()
+        ]
+
+    def build_hashes(self, version: str, build: dict, timeout: float = VERSION_FETCH_TIMEOUT) -> dict:
+        try:
+            info = self.fetch_json(f"{PURPUR_API_ROOT}/purpur/{version}/{build['build']}",
+                                   ttl=HTTP_CACHE_TTL_IMMUTABLE, timeout=timeout)
+        except Exception:
+            return {}
+        return {"md5": info["md5"]} if info.get("md5") else {}
+
+
+class VanillaProvider(ServerProvider):
+    name = "vanilla"
+    label = "Vanilla"
+
+    def list_versions(self, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        manifest = self.fetch_json(MOJANG_MANIFEST, timeout=timeout)
+        return [
+            {
+                "id": v["id"],
+                "release_type": v.get("type", "release"),
+                "sort_key": "2!" + v.get("releaseTime", ""),
+                "url": v.get("url"),
+            }
+            for v in manifest.get("versions", [])
+        ]
+
+    def list_builds(self, version: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        catalog = version_catalog()
+        vinfo = catalog.get(self.name, version)
+        if not vinfo or not vinfo.get("url"):
+            sync_provider(self, timeout)
+            vinfo = catalog.get(self.name, version)
+        if not vinfo or not vinfo.get("url"):
+            raise RuntimeError("指定バージョンが見つかりません")
+        info = self.fetch_json(vinfo["url"], ttl=HTTP_CACHE_TTL_IMMUTABLE, timeout=timeout)
+        server_info = info.get("downloads", {}).get("server", {})
+        if not server_info.get("url"):
+            raise RuntimeError(f"{version} にはサーバーJARが公開されていません")
+        return [{"build": version, "name": f"vanilla-{version}.jar", "url": server_info["url"], "sha1": server_info.get("sha1")}]
+
+
+class FabricProvider(ServerProvider):
+    name = "fabric"
+    label = "Fabric"
+
+    def list_versions(self, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        j = self.fetch_json(f"{FABRIC_META_ROOT}/versions/game", timeout=timeout)
+        return [
+            {"id": e["version"], "release_type": "release" if e.get("stable") else guess_release_type(e["version"])}
+            for e in j if isinstance(e, dict) and e.get("version")
+        ]
+
+    def _entries(self, entries: list, key: str) -> list[tuple[bool, str]]:
+        versions = []
+        for e in entries:
+            item = e.get(key, e) if isinstance(e, dict) else {}
+            if isinstance(item, dict) and item.get("version"):
+                versions.append((bool(item.get("stable")), item["version"]))
+        return versions
+
+    def list_builds(self, version: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        loaders = self._entries(self.fetch_json(f"{FABRIC_META_ROOT}/versions/loader/{version}", timeout=timeout), "loader")
+        if not loaders:
+            raise RuntimeError(f"Fabric Loader が {version} に対応していません")
+        installers = self._entries(self.fetch_json(f"{FABRIC_META_ROOT}/versions/installer", timeout=timeout), "installer")
+        if not installers:
+            raise RuntimeError("Fabric Installer のバージョンを取得できませんでした")
+        installer = next((v for ok, v in installers if ok), installers[0][1])
+        return [
+            {
+                "build": loader,
+                "channel": "stable" if stable else "beta",
+                "sort_key": ("1!" if stable else "0!") + version_sort_string(loader),
+                "name": f"fabric-server-mc.{version}-loader.{loader}-launcher.{installer}.jar",
+                "url": f"{FABRIC_META_ROOT}/versions/loader/{version}/{loader}/{installer}/server/jar",
+            }
+            for stable, loader in loaders
+        ]
+
+
+class ForgeProvider(ServerProvider):
+    name = "forge"
+    label = "Forge"
+    prefetch_timeout = 20
+    resolve_channels = ("recommended", "latest")
+    promotion_ranks = {"recommended": "2", "latest": "1"}
+
+    def __init__(self, fetch_bytes=None, **kwargs):
+        super().__init__(**kwargs)
+        self.fetch_bytes = fetch_bytes or cached_get
+        self._index = None
+        self._index_lock = threading.Lock()
+
+    def _parse_metadata(self, data: bytes) -> list[str]:
+        versions = []
+        for _, elem in ET.iterparse(io.BytesIO(data), events=("end",)):
+            if elem.tag == "version" and elem.text:
+                versions.append(elem.text.strip())
+            elem.clear()
+        return versions
+
+    def _load_index(self, timeout: float) -> dict:
+        with self._index_lock:
+            if self._index and time.monotonic() - self._index["at"] < FORGE_INDEX_TTL:
+                return self._index
+        versions = self._parse_metadata(self.fetch_bytes(FORGE_METADATA_URL, timeout=timeout))
+        try:
+            promos = self.fetch_json(FORGE_PROMOTIONS_URL, timeout=timeout).get("promos", {})
+        except Exception:
+            promos = {}
+        full = {}
+        for key, build in promos.items():
+            mc, _, kind = key.rpartition("-")
+            match = next((v for v in versions if v == f"{mc}-{build}" or v.startswith(f"{mc}-{build}-")), None)
+            if match:
+                full[(mc, kind)] = match
+        index = {"at": time.monotonic(), "versions": versions, "promos": full}
+        with self._index_lock:
+            self._index = index
+        return index
+
+    def telemetry_commands(self, version: str) -> tuple[str, ...]:
+        return ("forge tps",)
+
+    def list_versions(self, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        index = self._load_index(timeout)
+        records = []
+        for v in index["versions"]:
+            mc, _, build = v.partition("-")
+            records.append({
+                "id": v,
+                "mc_version": mc,
+                "release_type": "release",
+                "sort_key": version_sort_string(mc) + "~" + version_sort_string(build.split("-")[0]),
+                "url": forge_installer_url(v),
+            })
+        return records
+
+    def list_builds(self, version: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+        index = self._load_index(timeout)
+        mc = version.split("-")[0]
+        tags = {v: kind for (pmc, kind), v in index["promos"].items() if pmc == mc}
+        builds = [v for v in index["versions"] if v.split("-")[0] == mc and "-" in v]
+        builds.sort(key=lambda v: version_key(v.split("-")[1]), reverse=True)
+        return [
+            {
+                "build": v.partition("-")[2],
+                "id": v,
+                "promotion": tags.get(v),
+                "channel": tags.get(v),
+                "sort_key": self.promotion_ranks.get(tags.get(v), "0") + "!" + version_sort_string(v.split("-")[1]),
+                "name": f"forge-{v}-installer.jar",
+                "url": forge_installer_url(v),
+            }
+            for v in builds
+        ]
+
+    def split_version(self, version: str) -> tuple[str, str | None]:
+        mc, _, build = version.partition("-")
+        return mc, build or None
+
+    def missing_build(self, version: str) -> str:
+        mc, _, build = version.partition("-")
+        index = self._index or {"versions": []}
+        if build or not any(v.split("-")[0] == mc for v in index["versions"]):
+            return f"Forge {version} が見つかりません"
+        return f"Forge {mc} には recommended / latest のプロモーションがありません"
+
+    def build_hashes(self, version: str, build: dict, timeout: float = VERSION_FETCH_TIMEOUT) -> dict:
+        try:
+            digest = self.fetch_text(build["url"] + ".sha1", ttl=HTTP_CACHE_TTL_IMMUTABLE, timeout=timeout).split()[0]
+        except Exception:
+            return {}
+        return {"sha1": digest.lower()} if len(digest) == 40 else {}
+
+    def install(self, jar_path: Path, server_dir: Path, java_path: str, status_callback=None) -> Path:
+        if status_callback:
+            status_callback("Forge インストーラーを実行中...")
+        cmd = [resolve_java_exec(java_path), "-jar", jar_path.name, "--installServer"]
+        proc = subprocess.Popen(cmd, cwd=str(server_dir), stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, encoding="utf-8", errors="replace")
+        timer = threading.Timer(FORGE_INSTALL_TIMEOUT, proc.kill)
+        timer.start()
+        tail = deque(maxlen=20)
+        try:
+            for line in proc.stdout:
+                line = line.rstrip()
+                if line:
+                    tail.append(line)
+                    if status_callback:
+                        status_callback("Forge: " + line[-120:])
+            code = proc.wait()
+        finally:
+            timer.cancel()
+            close_process_pipes(proc)
+        if code != 0:
+            raise RuntimeError(f"Forge インストーラーが失敗しました (終了コード {code}):\n" + "\n".join(tail))
+        name = jar_path.name
+        version = name[len("forge-"):-len("-installer.jar")] if name.startswith("forge-") and name.endswith("-installer.jar") else ""
+        target = forge_install_target(server_dir, version) if version else None
+        if not target:
+            raise RuntimeError(f"Forge のインストール後に起動用ファイルが見つかりません（{version or name}）。")
+        try:
+            jar_path.unlink()
+        except Exception:
+            pass
+        return target
+
+
+def forge_installer_url(version: str) -> str:
+    return f"{FORGE_MAVEN_ROOT}/{version}/forge-{version}-installer.jar"
+
+def forge_install_target(server_dir: Path, version: str) -> Path | None:
+    server_dir = Path(server_dir)
+    if version_key(version.split("-")[0])[1] >= FORGE_ARGFILE_SINCE:
+        args_file = server_dir / "libraries" / "net" / "minecraftforge" / "forge" / version / ARGFILE_NAMES.get(os.name, ARGFILE_NAMES["posix"])
+        return args_file if args_file.exists() else None
+    for suffix in ("", "-universal", "-server"):
+        jar = server_dir / f"forge-{version}{suffix}.jar"
+        if jar.exists():
+            return jar
+    return None
+
+
+_providers: dict[str, ServerProvider] = {}
+
+def register_provider(provider: ServerProvider) -> ServerProvider:
+    _providers[provider.name] = provider
+    return provider
+
+def get_provider(name: str) -> ServerProvider:
+    try:
+        return _providers[name]
+    except KeyError:
+        raise RuntimeError(f"未対応のサーバータイプです: {name}")
+
+def provider_names() -> list[str]:
+    return list(_providers)
+
+def providers() -> list[ServerProvider]:
+    return list(_providers.values())
+
+register_provider(PaperProvider())
+register_provider(PurpurProvider())
+register_provider(VanillaProvider())
+register_provider(ForgeProvider())
+register_provider(FabricProvider())
+
+
+def sync_provider(provider: ServerProvider, timeout: float = VERSION_FETCH_TIMEOUT) -> list[dict]:
+    records = provider.list_versions(timeout)
+    if records:
+        try:
+            version_catalog().sync_versions(provider.name, records)
+        except Exception:
+            pass
+    return records
+
+def fetch_server_versions(stype: str, timeout: float = VERSION_FETCH_TIMEOUT) -> list[str]:
+    provider = get_provider(stype)
+    try:
+        records = sync_provider(provider, timeout)
+    except Exception as e:
+        raise RuntimeError(f"{provider.label} バージョン取得に失敗しました: {e}")
+    if not records:
+        raise RuntimeError("バージョン一覧が空です。")
+    if any("sort_key" in r for r in records):
+        return [r["id"] for r in sorted(records, key=lambda r: r.get("sort_key", ""), reverse=True)]
+    return sort_versions(r["id"] for r in records)
+
+def catalog_versions(stype: str) -> list[str]:
+    try:
+        return version_catalog().versions(stype)
+    except Exception:
+        return []
+
+def _catalog_build(provider: ServerProvider, mc_version: str, build: str | None) -> dict | None:
+    if build is not None:
+        return version_catalog().get_build(provider.name, mc_version, build)
+    return version_catalog().latest_build(provider.name, mc_version, provider.resolve_channels)
+
+def resolve_server_jar(stype: str, version: str, timeout: float = VERSION_FETCH_TIMEOUT,
+                       ttl: float = CATALOG_BUILD_TTL) -> JarResolution:
+    provider = get_provider(stype)
+    mc_version, build = provider.split_version(version)
+    row = _catalog_build(provider, mc_version, build)
+    refreshed = False
+    if row is None or time.time() - row["synced_at"] >= ttl:
+        try:
+            builds = provider.list_builds(mc_version, timeout)
+        except Exception:
+            if row is None:
+                raise
+            builds = []
+        if builds:
+            version_catalog().sync_builds(stype, mc_version, builds)
+            row = _catalog_build(provider, mc_version, build)
+            refreshed = True
+    if row is None:
+        raise RuntimeError(provider.missing_build(version))
+    hashes = {alg: row[alg] for alg in JAR_HASHES if row.get(alg)}
+    if not hashes and refreshed:
+        hashes = provider.build_hashes(mc_version, row, timeout)
+        if hashes:
+            version_catalog().sync_builds(stype, mc_version, [dict(row, **hashes)])
+    return JarResolution(row["url"], row["name"], hashes, row["build"])
+
+
+
+class VersionPrefetcher:
+    def __init__(self, server_types=None, timeouts: dict | None = None):
+        self.server_types = tuple(server_types or provider_names())
+        self.timeouts = {name: get_provider(name).prefetch_timeout for name in self.server_types}
+        self.timeouts.update(timeouts or {})
+        self._results: dict[str, list[str]] = {}
+        self._errors: dict[str, Exception] = {}
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self, on_result=None) -> None:
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.server_types)), thread_name_prefix="prefetch")
+        pending = [len(self.server_types)]
+        finished: set[str] = set()
+
+        def finish(stype: str, versions, error) -> None:
+            with self._lock:
+                if self._cancelled.is_set() or stype in finished:
+                    return
+                finished.add(stype)
+                if error is None:
+                    self._results[stype] = versions
+                else:
+                    self._errors[stype] = error
+                pending[0] -= 1
+                if pending[0] == 0:
+                    self._done.set()
+            if on_result:
+                try:
+                    on_result(stype, versions, error)
+                except Exception:
+                    pass
+
+        def job(stype: str, timeout: float):
+            if self._cancelled.is_set():
+                return None
+            return fetch_server_versions(stype, timeout=timeout)
+
+        for stype in self.server_types:
+            timeout = self.timeouts.get(stype, VERSION_FETCH_TIMEOUT)
+            timer = threading.Timer(timeout, finish, (stype, None, TimeoutError(f"{stype} の取得がタイムアウトしました")))
+            timer.daemon = True
+
+            def done(future, stype=stype, timer=timer):
+                timer.cancel()
+                if future.cancelled():
+                    return
+                error = future.exception()
+                finish(stype, None if error else future.result(), error)
+            future = self._executor.submit(job, stype, timeout)
+            timer.start()
+            future.add_done_callback(done)
+        self._executor.shutdown(wait=False)
+
+    def get(self, stype: str) -> list[str] | None:
+        with self._lock:
+            return self._results.get(stype)
+
+    def error(self, stype: str) -> Exception | None:
+        with self._lock:
+            return self._errors.get(stype)
+
+    def put(self, stype: str, versions: list[str]) -> None:
+        with self._lock:
+            self._results[stype] = versions
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        self._done.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def setup_server(server_dir: Path, stype: str, version: str, args: str, java_path: str, status_callback=None,
+                 settings: dict | None = None) -> Path:
+    ensure_dir(server_dir)
+    res = resolve_server_jar(stype, version)
+
+    jar_path = server_dir / res.name
+    store = jar_store()
+    try:
+        mode = store.checkout(res.hashes, jar_path)
+    except Exception:
+        mode = None
+    if mode:
+        if status_callback:
+            status_callback(f"共有キャッシュから配置しました ({mode})")
+    else:
+        if status_callback:
+            status_callback("ダウンロード中...")
+        actual = download_file_stream(res.url, jar_path, expected_hashes=res.hashes)
+        try:
+            store.add(jar_path, dict(res.hashes, **actual))
+        except Exception:
+            pass
+    jar_path = get_provider(stype).install(jar_path, server_dir, java_path, status_callback)
+
+    (server_dir / "eula.txt").write_text("eula=true\n", encoding="utf-8")
+    write_launch_manifest(server_dir, jar_path, java_path, args, dict(settings or {}, args=args),
+                          server_type=stype, mc_version=version)
+
+    prop_path = server_dir / "server.properties"
+    if not prop_path.exists():
+        write_properties(prop_path, DEFAULT_SERVER_PROPERTIES)
+    return jar_path
@@ -0,0 +1,196 @@
+import struct
+import asyncio
+from pathlib import Path
+
+from mc_core import read_properties, run_in_loop
+
+RCON_DEFAULT_PORT = 25575
+RCON_TIMEOUT = 10.0
+RCON_MAX_COMMAND = 1446
+RCON_MAX_PACKET = 1024 * 1024
+TYPE_RESPONSE = 0
+TYPE_COMMAND = 2
+TYPE_AUTH_RESPONSE = 2
+TYPE_AUTH = 3
+TYPE_SENTINEL = 200
+
+
+def encode_packet(request_id: int, ptype: int, body: bytes) -> bytes:
+    return struct.pack("<iii", len(body) + 10, request_id, ptype) + body + b"\x00\x00"
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple[int, int, bytes]:
+    (length,) = struct.unpack("<i", await reader.readexactly(4))
+    if length < 10 or length > RCON_MAX_PACKET:
+        raise RuntimeError(f"RCON パケットが不正です (length={length})")
+    data = await reader.readexactly(length)
+    request_id, ptype = struct.unpack("<ii", data[:8])
+    return request_id, ptype, data[8:-2]
+
+
+class AsyncRconClient:
+    def __init__(self, host: str, port: int, password: str, timeout: float = RCON_TIMEOUT):
+        self.host = host
+        self.port = int(port)
+        self.password = password
+        self.timeout = timeout
+        self.auth_failed = False
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._pending: dict[int, tuple[asyncio.Future, list[bytes]]] = {}
+        self._sentinels: dict[int, int] = {}
+        self._next_id = 0
+        self._connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def _new_id(self) -> int:
+        self._next_id = self._next_id % 0x7FFFFFF0 + 1
+        return self._next_id
+
+    async def connect(self) -> None:
+        if self.connected:
+            return
+        if self.auth_failed:
+            raise RuntimeError("RCON の認証に失敗しました（rcon.password を確認してください）")
+        async with self._connect_lock:
+            if self.connected:
+                return
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                raise RuntimeError(f"RCON に接続できません ({self.host}:{self.port}): {str(e) or 'timeout'}")
+            auth_id = self._new_id()
+            try:
+                writer.write(encode_packet(auth_id, TYPE_AUTH, self.password.encode("utf-8")))
+                await writer.drain()
+                while True:
+                    request_id, ptype, _ = await asyncio.wait_for(read_packet(reader), self.timeout)
+                    if ptype == TYPE_AUTH_RESPONSE:
+                        break
+            except (OSError, EOFError, asyncio.TimeoutError, RuntimeError) as e:
+                writer.close()
+                raise RuntimeError(f"RCON の認証応答がありません: {str(e) or 'timeout'}")
+            if request_id != auth_id:
+                writer.close()
+                self.auth_failed = True
+                raise RuntimeError("RCON の認証に失敗しました（rcon.password を確認してください）")
+            self._reader, self._writer = reader, writer
+            self._task = asyncio.ensure_future(self._read_loop(reader, writer))
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_id, ptype, body = await read_packet(reader)
+                if request_id in self._sentinels:
+                    entry = self._pending.pop(self._sentinels.pop(request_id), None)
+                    if entry and not entry[0].done():
+                        entry[0].set_result(b"".join(entry[1]).decode("utf-8", errors="replace"))
+                elif request_id in self._pending:
+                    self._pending[request_id][1].append(body)
+        except Exception:
+            pass
+        finally:
+            if self._writer is writer:
+                self._drop("RCON 接続が切断されました")
+
+    def _drop(self, reason: str) -> None:
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+        pending = list(self._pending.values())
+        self._pending.clear()
+        self._sentinels.clear()
+        for fut, _ in pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError(reason))
+
+    async def command(self, cmd: str) -> str:
+        data = cmd.encode("utf-8")
+        if len(data) > RCON_MAX_COMMAND:
+            raise RuntimeError(f"コマンドが長すぎます（RCON の上限は {RCON_MAX_COMMAND} バイト）")
+        await self.connect()
+        command_id, sentinel_id = self._new_id(), self._new_id()
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[command_id] = (fut, [])
+        self._sentinels[sentinel_id] = command_id
+        try:
+            self._writer.write(encode_packet(command_id, TYPE_COMMAND, data) + encode_packet(sentinel_id, TYPE_SENTINEL, b""))
+            await self._writer.drain()
+            return await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"RCON の応答がタイムアウトしました: {cmd}")
+        except OSError as e:
+            self._drop(str(e))
+            raise RuntimeError(f"RCON 送信に失敗しました: {e}")
+        finally:
+            self._pending.pop(command_id, None)
+            self._sentinels.pop(sentinel_id, None)
+
+    async def command_many(self, commands) -> list[str]:
+        return list(await asyncio.gather(*(self.command(c) for c in commands)))
+
+    async def close(self) -> None:
+        task = self._task
+        self._drop("RCON 接続を閉じました")
+        if task is not None:
+            task.cancel()
+
+
+class RconClient:
+    def __init__(self, host: str, port: int, password: str, timeout: float = RCON_TIMEOUT):
+        self.client = AsyncRconClient(host, port, password, timeout)
+        self.timeout = timeout
+
+    @property
+    def auth_failed(self) -> bool:
+        return self.client.auth_failed
+
+    def _run(self, coro):
+        return run_in_loop(coro, self.timeout * 2 + 1)
+
+    def command(self, cmd: str) -> str:
+        return self._run(self.client.command(cmd))
+
+    def command_many(self, commands) -> list[str]:
+        return self._run(self.client.command_many(list(commands)))
+
+    def close(self) -> None:
+        try:
+            self._run(self.client.close())
+        except Exception:
+            pass
+
+
+def rcon_settings(server_dir: Path) -> tuple[str, int, str] | None:
+    props = read_properties(Path(server_dir) / "server.properties")
+    if props.get("enable-rcon", "false").strip().lower() != "true":
+        return None
+    password = props.get("rcon.password", "")
+    if not password:
+        return None
+    try:
+        port = int(props.get("rcon.port", RCON_DEFAULT_PORT))
+    except ValueError:
+        port = RCON_DEFAULT_PORT
+    host = props.get("server-ip", "").strip() or "127.0.0.1"
+    return host, port, password
+
+def rcon_for_server(server_dir: Path, timeout: float = RCON_TIMEOUT) -> RconClient | None:
+    settings = rcon_settings(server_dir)
+    return RconClient(*settings, timeout=timeout) if settings else None
+
+def rcon_batch_sender(client: RconClient, on_reply):
+    def send_many(commands) -> bool:
+        if client.auth_failed:
+            return False
+        try:
+            replies = client.command_many(commands)
+        except Exception:
+            return False
+        for reply in replies:
+            on_reply(reply.splitlines())
+        return True
+    return send_many
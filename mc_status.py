@@ -0,0 +1,268 @@
+import re
+import json
+import time
+import struct
+import asyncio
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+from mc_core import background_loop, read_properties, read_server_port, run_in_loop
+
+STATUS_TIMEOUT = 3.0
+STATUS_POLL_SECONDS = 10.0
+STATUS_PROTOCOL = 47
+STATUS_MAX_PACKET = 4 * 1024 * 1024
+STATUS_SAMPLE_LIMIT = 12
+DEFAULT_GAME_PORT = 25565
+COLOR_CODES = re.compile(r"§.")
+
+
+class ServerStatus(NamedTuple):
+    online: bool
+    players_online: int
+    players_max: int
+    sample: list[str]
+    latency_ms: float | None
+    version: str
+    motd: str
+    error: str
+    at: float
+
+
+def encode_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def decode_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+    raise RuntimeError("VarInt が長すぎます")
+
+async def read_varint(reader: asyncio.StreamReader) -> int:
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value
+    raise RuntimeError("VarInt が長すぎます")
+
+def encode_string(text: str) -> bytes:
+    data = text.encode("utf-8")
+    return encode_varint(len(data)) + data
+
+def encode_packet(packet_id: int, payload: bytes = b"") -> bytes:
+    body = encode_varint(packet_id) + payload
+    return encode_varint(len(body)) + body
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    length = await read_varint(reader)
+    if length <= 0 or length > STATUS_MAX_PACKET:
+        raise RuntimeError(f"ステータス応答が不正です (length={length})")
+    data = await reader.readexactly(length)
+    packet_id, pos = decode_varint(data, 0)
+    return packet_id, data[pos:]
+
+def flatten_chat(component) -> str:
+    if isinstance(component, str):
+        return COLOR_CODES.sub("", component)
+    if isinstance(component, list):
+        return "".join(flatten_chat(c) for c in component)
+    if isinstance(component, dict):
+        return flatten_chat(component.get("text", "")) + "".join(flatten_chat(c) for c in component.get("extra", []))
+    return ""
+
+def _offline(error: str) -> ServerStatus:
+    return ServerStatus(False, 0, 0, [], None, "", "", error, time.time())
+
+
+async def ping_status(host: str, port: int = DEFAULT_GAME_PORT, timeout: float = STATUS_TIMEOUT) -> ServerStatus:
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        handshake = encode_varint(STATUS_PROTOCOL) + encode_string(host) + struct.pack(">H", port) + encode_varint(1)
+        writer.write(encode_packet(0x00, handshake) + encode_packet(0x00))
+        await writer.drain()
+        packet_id, data = await asyncio.wait_for(read_packet(reader), timeout)
+        latency = (time.perf_counter() - started) * 1000
+        if packet_id != 0x00:
+            raise RuntimeError(f"想定外のパケット {packet_id:#x}")
+        length, pos = decode_varint(data, 0)
+        info = json.loads(data[pos:pos + length].decode("utf-8", errors="replace"))
+        payload = int(time.time() * 1000) & 0x7FFFFFFFFFFFFFFF
+        try:
+            sent = time.perf_counter()
+            writer.write(encode_packet(0x01, struct.pack(">q", payload)))
+            await writer.drain()
+            packet_id, data = await asyncio.wait_for(read_packet(reader), timeout)
+            if packet_id == 0x01 and data[:8] == struct.pack(">q", payload):
+                latency = (time.perf_counter() - sent) * 1000
+        except (OSError, EOFError, asyncio.TimeoutError, RuntimeError):
+            pass
+    finally:
+        writer.close()
+    players = info.get("players") or {}
+    sample = [p.get("name", "") for p in (players.get("sample") or []) if isinstance(p, dict)][:STATUS_SAMPLE_LIMIT]
+    version = info.get("version") or {}
+    return ServerStatus(True, int(players.get("online", 0)), int(players.get("max", 0)), sample, latency,
+                        COLOR_CODES.sub("", str(version.get("name", ""))), flatten_chat(info.get("description", "")).strip(),
+                        "", time.time())
+
+async def legacy_ping(host: str, port: int = DEFAULT_GAME_PORT, timeout: float = STATUS_TIMEOUT) -> ServerStatus:
+    started = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        writer.write(b"\xfe\x01")
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readexactly(3), timeout)
+        if head[0] != 0xFF:
+            raise RuntimeError("レガシー応答が不正です")
+        (length,) = struct.unpack(">H", head[1:])
+        text = (await asyncio.wait_for(reader.readexactly(length * 2), timeout)).decode("utf-16-be", errors="replace")
+        latency = (time.perf_counter() - started) * 1000
+    finally:
+        writer.close()
+    if text.startswith("§1\x00"):
+        parts = text.split("\x00")
+        version, motd, online, maximum = parts[2], parts[3], parts[4], parts[5]
+    else:
+        motd, online, maximum = (text.rsplit("§", 2) + ["0", "0"])[:3]
+        version = ""
+    return ServerStatus(True, int(online or 0), int(maximum or 0), [], latency, version,
+                        COLOR_CODES.sub("", motd).strip(), "", time.time())
+
+async def query_status_async(host: str, port: int = DEFAULT_GAME_PORT, timeout: float = STATUS_TIMEOUT,
+                             legacy: bool = True) -> ServerStatus:
+    try:
+        return await ping_status(host, port, timeout)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    if legacy and "refused" not in error.lower():
+        try:
+            return await legacy_ping(host, port, timeout)
+        except Exception:
+            pass
+    return _offline(error)
+
+def query_status(host: str, port: int = DEFAULT_GAME_PORT, timeout: float = STATUS_TIMEOUT) -> ServerStatus:
+    return run_in_loop(query_status_async(host, port, timeout), timeout * 4 + 1)
+
+def query_many(targets: dict[str, tuple[str, int]], timeout: float = STATUS_TIMEOUT) -> dict[str, ServerStatus]:
+    async def run():
+        names = list(targets)
+        results = await asyncio.gather(*(query_status_async(*targets[n], timeout) for n in names))
+        return dict(zip(names, results))
+    return run_in_loop(run(), timeout * 4 + 1)
+
+def parse_address(text: str, default_port: int = DEFAULT_GAME_PORT) -> tuple[str, int]:
+    if text.startswith("["):
+        host, _, rest = text[1:].partition("]")
+        return host, int(rest[1:]) if rest.startswith(":") else default_port
+    if text.count(":") == 1:
+        host, port = text.split(":")
+        return host, int(port)
+    return text, default_port
+
+def status_address(server_dir: Path) -> tuple[str, int]:
+    host = read_properties(Path(server_dir) / "server.properties").get("server-ip", "").strip()
+    return host or "127.0.0.1", read_server_port(Path(server_dir))
+
+def status_poll_interval(config: dict) -> float:
+    try:
+        return float(config.get("status_poll_seconds", STATUS_POLL_SECONDS))
+    except (TypeError, ValueError):
+        return STATUS_POLL_SECONDS
+
+def describe_status(status: ServerStatus | None) -> str:
+    if status is None:
+        return ""
+    if not status.online:
+        return f"応答なし ({status.error})" if status.error else "応答なし"
+    text = f"プレイヤー {status.players_online}/{status.players_max}"
+    if status.sample:
+        text += " (" + ", ".join(status.sample[:5]) + (" …" if len(status.sample) > 5 else "") + ")"
+    if status.latency_ms is not None:
+        text += f"  応答 {status.latency_ms:.0f}ms"
+    return text
+
+
+class StatusPoller:
+    def __init__(self, interval: float = STATUS_POLL_SECONDS, timeout: float = STATUS_TIMEOUT, on_result=None):
+        self.interval = max(1.0, float(interval))
+        self.timeout = timeout
+        self.on_result = on_result
+        self.targets: dict[str, tuple[str, int]] = {}
+        self.results: dict[str, ServerStatus] = {}
+        self._lock = threading.Lock()
+        self._future = None
+
+    def add_target(self, name: str, host: str, port: int) -> "StatusPoller":
+        with self._lock:
+            self.targets[name] = (host, int(port))
+        return self
+
+    def remove_target(self, name: str) -> None:
+        with self._lock:
+            self.targets.pop(name, None)
+            self.results.pop(name, None)
+
+    def latest(self, name: str) -> ServerStatus | None:
+        with self._lock:
+            return self.results.get(name)
+
+    def start(self) -> "StatusPoller":
+        if self._future is None:
+            self._future = asyncio.run_coroutine_threadsafe(self._run(), background_loop())
+        return self
+
+    def stop(self) -> None:
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                targets = dict(self.targets)
+            names = list(targets)
+            results = await asyncio.gather(*(query_status_async(*targets[n], self.timeout) for n in names))
+            for name, status in zip(names, results):
+                with self._lock:
+                    if name not in self.targets:
+                        continue
+                    self.results[name] = status
+                if self.on_result:
+                    try:
+                        self.on_result(name, status)
+                    except Exception:
+                        pass
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def collect(self, labels: dict | None = None) -> list[tuple]:
+        out = []
+        with self._lock:
+            results = dict(self.results)
+        for name, st in results.items():
+            lb = dict(labels or {}, instance=name)
+            out.append(("mcsoft_status_up", "gauge", "Whether the server answered a Server List Ping", lb, 1.0 if st.online else 0.0))
+            if st.online:
+                out.append(("mcsoft_players_online", "gauge", "Players online reported by Server List Ping", lb, st.players_online))
+                out.append(("mcsoft_players_max", "gauge", "Player slots reported by Server List Ping", lb, st.players_max))
+                if st.latency_ms is not None:
+                    out.append(("mcsoft_status_latency_seconds", "gauge", "Server List Ping round-trip time", lb, st.latency_ms / 1000))
+        return out
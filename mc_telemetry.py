@@ -0,0 +1,235 @@
+import re
+import math
+import time
+import threading
+from collections import deque
+from typing import NamedTuple
+
+TELEMETRY_WINDOW = 15 * 60
+TELEMETRY_POLL_SECONDS = 30
+TELEMETRY_TPS_ALERT = 18.0
+TELEMETRY_MSPT_ALERT = 50.0
+TELEMETRY_GC_STALL_MS = 200.0
+TELEMETRY_ALERT_COOLDOWN = 60.0
+
+COLOR_CODES = re.compile(r"\x1b\[[0-9;]*[A-Za-z]|§.")
+CANT_KEEP_UP = re.compile(r"Running (\d+)ms or (\d+) ticks behind")
+TPS_LINE = re.compile(r"TPS from last 1m, 5m, 15m: \*?([\d.]+),\s*\*?([\d.]+),\s*\*?([\d.]+)")
+MSPT_VALUES = re.compile(r"([\d.]+)/([\d.]+)/([\d.]+)")
+FORGE_TPS = re.compile(r"Overall\s*:\s*Mean tick time: ([\d.]+) ms\. Mean TPS: ([\d.]+)")
+TICK_QUERY = re.compile(r"Average time per tick: ([\d.]+)\s*ms")
+TICK_TOOK = re.compile(r"A single server tick took ([\d.]+) seconds")
+GC_PAUSE = re.compile(r"GC\(\d+\) Pause .*?([\d.]+)ms\s*$")
+
+
+class TelemetryEvent(NamedTuple):
+    at: float
+    kind: str
+    value: float
+    message: str
+
+
+def percentile(values, pct: float) -> float | None:
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+class RollingSeries:
+    def __init__(self, window: float = TELEMETRY_WINDOW, maxlen: int = 4096):
+        self.window = window
+        self._points: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, value: float, at: float | None = None) -> None:
+        with self._lock:
+            self._points.append((time.time() if at is None else at, float(value)))
+
+    def values(self, since: float | None = None) -> list[float]:
+        now = time.time()
+        cutoff = now - self.window if since is None else since
+        with self._lock:
+            while self._points and self._points[0][0] < now - self.window:
+                self._points.popleft()
+            return [v for t, v in self._points if t >= cutoff]
+
+    def latest(self) -> float | None:
+        return self._points[-1][1] if self._points else None
+
+    def stats(self) -> dict | None:
+        vals = self.values()
+        if not vals:
+            return None
+        return {"count": len(vals), "last": vals[-1], "min": min(vals), "max": max(vals),
+                "p50": percentile(vals, 50), "p95": percentile(vals, 95), "p99": percentile(vals, 99)}
+
+
+class LagTelemetry:
+    def __init__(self, on_alert=None, tps_alert: float = TELEMETRY_TPS_ALERT, mspt_alert: float = TELEMETRY_MSPT_ALERT,
+                 gc_stall_ms: float = TELEMETRY_GC_STALL_MS, window: float = TELEMETRY_WINDOW):
+        self.on_alert = on_alert
+        self.tps_alert = tps_alert
+        self.mspt_alert = mspt_alert
+        self.gc_stall_ms = gc_stall_ms
+        self.series = {name: RollingSeries(window) for name in ("tps", "mspt", "behind_ms", "gc_pause_ms")}
+        self.events: deque = deque(maxlen=200)
+        self.counters = {"cant_keep_up": 0, "skipped_ticks": 0, "watchdog": 0, "gc_stalls": 0}
+        self._expect_mspt = False
+        self._last_alert: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def feed(self, lines) -> None:
+        self._expect_mspt = self._parse(lines, self._expect_mspt)
+
+    def feed_reply(self, lines) -> None:
+        self._parse(lines, False)
+
+    def _parse(self, lines, expect_mspt: bool) -> bool:
+        for line in lines:
+            if expect_mspt:
+                expect_mspt = False
+                m = MSPT_VALUES.search(COLOR_CODES.sub("", line))
+                if m:
+                    self._record("mspt", float(m.group(1)))
+                    continue
+            if "behind" in line and "keep up" in line:
+                m = CANT_KEEP_UP.search(line)
+                if m:
+                    behind, ticks = int(m.group(1)), int(m.group(2))
+                    with self._lock:
+                        self.counters["cant_keep_up"] += 1
+                        self.counters["skipped_ticks"] += ticks
+                    self.series["behind_ms"].add(behind)
+                    self._event("cant_keep_up", behind, f"サーバー処理落ち: {behind}ms ({ticks} tick) 遅延")
+            elif "TPS" in line:
+                clean = COLOR_CODES.sub("", line)
+                m = TPS_LINE.search(clean) or FORGE_TPS.search(clean)
+                if m and m.re is TPS_LINE:
+                    self._record("tps", float(m.group(1)))
+                elif m:
+                    self._record("mspt", float(m.group(1)))
+                    self._record("tps", float(m.group(2)))
+            elif "tick times" in line:
+                expect_mspt = True
+            elif "per tick" in line:
+                m = TICK_QUERY.search(COLOR_CODES.sub("", line))
+                if m:
+                    mspt = float(m.group(1))
+                    self._record("mspt", mspt)
+                    self._record("tps", min(20.0, 1000.0 / mspt) if mspt > 0 else 20.0)
+            elif "not responded for" in line or "stopped responding" in line or "single server tick took" in line:
+                m = TICK_TOOK.search(line)
+                with self._lock:
+                    self.counters["watchdog"] += 1
+                self._event("watchdog", float(m.group(1)) * 1000 if m else 0.0, "ウォッチドッグ: サーバーが応答していません")
+            elif "Pause" in line and "GC(" in line:
+                m = GC_PAUSE.search(line)
+                if m:
+                    self.gc_pause(float(m.group(1)))
+        return expect_mspt
+
+    def gc_pause(self, pause: float) -> None:
+        self.series["gc_pause_ms"].add(pause)
+        if pause >= self.gc_stall_ms:
+            with self._lock:
+                self.counters["gc_stalls"] += 1
+            self._event("gc_stall", pause, f"GC 停止 {pause:.0f}ms")
+
+    def _record(self, name: str, value: float) -> None:
+        self.series[name].add(value)
+        if name == "tps" and value < self.tps_alert:
+            self._event("low_tps", value, f"TPS 低下: {value:.1f}")
+        elif name == "mspt" and value > self.mspt_alert:
+            self._event("high_mspt", value, f"MSPT 上昇: {value:.1f}ms")
+
+    def _event(self, kind: str, value: float, message: str) -> None:
+        ev = TelemetryEvent(time.time(), kind, value, message)
+        with self._lock:
+            self.events.append(ev)
+            last = self._last_alert.get(kind, 0.0)
+            fire = ev.at - last >= TELEMETRY_ALERT_COOLDOWN
+            if fire:
+                self._last_alert[kind] = ev.at
+        if fire and self.on_alert:
+            try:
+                self.on_alert(ev)
+            except Exception:
+                pass
+
+    def recent_events(self, limit: int = 20) -> list[TelemetryEvent]:
+        with self._lock:
+            return list(self.events)[-limit:]
+
+    def summary(self) -> str:
+        parts = []
+        tps = self.series["tps"].stats()
+        mspt = self.series["mspt"].stats()
+        if tps:
+            parts.append(f"TPS {tps['last']:.1f} (min {tps['min']:.1f})")
+        if mspt:
+            parts.append(f"MSPT {mspt['last']:.1f} (p95 {mspt['p95']:.1f})")
+        if self.counters["cant_keep_up"]:
+            parts.append(f"遅延 {self.counters['cant_keep_up']} 回")
+        return "  ".join(parts)
+
+    def collect(self, labels: dict) -> list[tuple]:
+        out = []
+        for name, unit in (("tps", ""), ("mspt", "_milliseconds")):
+            st = self.series[name].stats()
+            if st:
+                out.append((f"mcsoft_server_{name}{unit}", "gauge", f"Latest {name.upper()} reported by the server", labels, st["last"]))
+                for q in ("p50", "p95", "p99"):
+                    out.append((f"mcsoft_server_{name}{unit}_window", "gauge", f"{name.upper()} percentiles over the telemetry window",
+                                dict(labels, quantile=str(int(q[1:]) / 100)), st[q]))
+        for key, value in self.counters.items():
+            out.append((f"mcsoft_server_{key}_total", "counter", f"Console-detected {key.replace('_', ' ')} events", labels, value))
+        return out
+
+
+class TelemetryPoller:
+    def __init__(self, send, commands, interval: float = TELEMETRY_POLL_SECONDS, ready=None, send_many=None):
+        self.send = send
+        self.send_many = send_many
+        self.commands = tuple(commands)
+        self.interval = float(interval)
+        self.ready = ready
+        self._stop = threading.Event()
+
+    def start(self) -> "TelemetryPoller":
+        if self.commands and self.interval > 0:
+            threading.Thread(target=self._run, name="telemetry-poll", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self.ready is not None and not self.ready():
+                continue
+            if self.send_many is not None and self.send_many(self.commands):
+                continue
+            for cmd in self.commands:
+                try:
+                    if not self.send(cmd):
+                        return
+                except Exception:
+                    return
+
+
+def _config_float(config: dict, key: str, default: float) -> float:
+    try:
+        return float(config.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+def telemetry_from_config(config: dict, on_alert=None) -> LagTelemetry:
+    return LagTelemetry(on_alert,
+                        tps_alert=_config_float(config, "telemetry_tps_alert", TELEMETRY_TPS_ALERT),
+                        mspt_alert=_config_float(config, "telemetry_mspt_alert", TELEMETRY_MSPT_ALERT),
+                        gc_stall_ms=_config_float(config, "telemetry_gc_stall_ms", TELEMETRY_GC_STALL_MS))
+
+def telemetry_poll_interval(config: dict) -> float:
+    return _config_float(config, "telemetry_poll_seconds", TELEMETRY_POLL_SECONDS)
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import mc_core
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(tmp_path, monkeypatch):
+    path = tmp_path / mc_core.CONFIG_FILENAME
+    monkeypatch.setattr(mc_core, "config_path", lambda: path)
+    monkeypatch.setattr(mc_core, "_catalog", None)
+    return path
@@ -0,0 +1,41 @@
+import sqlite3
+
+from mc_core import CATALOG_SCHEMA, VersionCatalog
+
+
+def test_forge_builds_keep_their_version_and_order(tmp_path):
+    catalog = VersionCatalog(tmp_path / "catalog.sqlite3")
+    builds = [{"build": b, "name": f"forge-1.20.1-{b}-installer.jar"} for b in ("47.2.0", "47.10.0", "47.2.20")]
+    assert catalog.sync_builds("forge", "1.20.1", builds) == 3
+    assert catalog.sync_builds("forge", "1.20.1", builds) == 0
+    latest = catalog.latest_build("forge", "1.20.1")
+    assert latest["build"] == "47.10.0"
+    assert latest["name"] == "forge-1.20.1-47.10.0-installer.jar"
+    catalog.close()
+
+
+def test_numeric_builds_order_numerically(tmp_path):
+    catalog = VersionCatalog(tmp_path / "catalog.sqlite3")
+    catalog.sync_builds("paper", "1.20.4", [{"build": b} for b in (99, 499, 1000)])
+    assert catalog.latest_build("paper", "1.20.4")["build"] == "1000"
+    catalog.close()
+
+
+def test_old_integer_builds_table_is_rebuilt(tmp_path):
+    path = tmp_path / "catalog.sqlite3"
+    db = sqlite3.connect(str(path))
+    db.executescript("""
+        CREATE TABLE builds (provider TEXT NOT NULL, mc_version TEXT NOT NULL, build INTEGER NOT NULL, name TEXT,
+                             url TEXT, sha256 TEXT, sha1 TEXT, synced_at REAL NOT NULL,
+                             PRIMARY KEY (provider, mc_version, build)) WITHOUT ROWID;
+        INSERT INTO builds VALUES ('forge', '1.20.1', 0, 'forge-1.20.1-47.2.0-installer.jar', NULL, NULL, NULL, 0);
+    """)
+    db.close()
+    catalog = VersionCatalog(path)
+    assert catalog.latest_build("forge", "1.20.1") is None
+    catalog.sync_builds("forge", "1.20.1", [{"build": "47.2.0"}])
+    assert catalog.latest_build("forge", "1.20.1")["build"] == "47.2.0"
+    catalog.close()
+    db = sqlite3.connect(str(path))
+    assert db.execute("PRAGMA user_version").fetchone()[0] == CATALOG_SCHEMA
+    db.close()
@@ -0,0 +1,12 @@
+from mc_core import ConsoleBuffer
+
+
+def test_buffer_drops_oldest_lines_past_its_bound():
+    buffer = ConsoleBuffer(max_lines=3)
+    buffer.push_many(f"line {i}" for i in range(5))
+    assert buffer.pending() == 3
+    assert buffer.dropped == 2
+    assert buffer.total_in == 5
+    assert buffer.drain(10) == ["line 2\n", "line 3\n", "line 4\n"]
+    buffer.push("line 5")
+    assert buffer.dropped == 2
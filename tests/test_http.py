@@ -0,0 +1,82 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import mc_core
+
+ETAG = '"v1"'
+BODY = b'{"versions": ["1.20.4"]}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    mc_core.reset_http_session()
+    yield server
+    mc_core.reset_http_session()
+    server.shutdown()
+    server.server_close()
+
+
+def test_pooled_session_reuses_one_connection(http_server):
+    for i in range(10):
+        assert mc_core.http_session().get(f"{http_server.url}/v/{i}", timeout=5).content == BODY
+    assert http_server.connections == 1
+
+
+def test_unpooled_requests_open_a_connection_each(http_server):
+    requests = mc_core._http()
+    for i in range(10):
+        assert requests.get(f"{http_server.url}/v/{i}", timeout=5).content == BODY
+    assert http_server.connections == 10
+
+
+def test_cached_get_serves_fresh_copy_without_a_request(http_server):
+    url = f"{http_server.url}/fresh"
+    assert mc_core.cached_get(url, ttl=600) == BODY
+    assert mc_core.cached_get(url, ttl=600) == BODY
+    assert len(http_server.requests) == 1
+
+
+def test_cached_get_revalidates_with_etag_and_uses_cached_body_on_304(http_server):
+    url = f"{http_server.url}/stale"
+    assert mc_core.cached_get(url, ttl=0) == BODY
+    assert mc_core.cached_get(url, ttl=0) == BODY
+    assert http_server.requests == [("/stale", None), ("/stale", ETAG)]
+    _, body_path = mc_core._http_cache_paths(url)
+    assert body_path.read_bytes() == BODY
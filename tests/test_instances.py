@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import pytest
+
+from mc_instances import InstanceRegistry
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="fake java is a POSIX script")
+
+FAKE_SERVER = """#!{python}
+import sys, time
+print("[12:00:00 INFO]: Starting minecraft server", flush=True)
+print('[12:00:00 INFO]: Done (0.1s)! For help, type "help"', flush=True)
+for line in sys.stdin:
+    line = line.strip()
+    if line == "stop":
+        print("[12:00:09 INFO]: Stopping the server", flush=True)
+        break
+    print(f"[12:00:05 INFO]: echo {{line}}", flush=True)
+"""
+
+
+def wait_for(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def registry(tmp_path):
+    java = tmp_path / "java"
+    java.write_text(FAKE_SERVER.format(python=sys.executable), encoding="utf-8")
+    java.chmod(0o755)
+    dirs = {}
+    for name in ("a", "b"):
+        d = tmp_path / name
+        d.mkdir()
+        (d / "server.jar").write_bytes(b"jar")
+        dirs[name] = d
+    config = {"java_path": str(java), "args": "-Xmx64M", "status_poll_seconds": 0, "instances": [
+        {"name": "a", "install_dir": str(dirs["a"])},
+        {"name": "a-again", "install_dir": str(dirs["a"] / ".." / "a")},
+        {"name": "b", "install_dir": str(dirs["b"])},
+    ]}
+    reg = InstanceRegistry(config)
+    yield reg
+    reg.stop(timeout=5)
+    reg.close()
+
+
+def test_refuses_a_directory_owned_by_another_instance(registry):
+    errors = registry.start(["a", "a-again", "b"])
+    assert list(errors) == ["a-again"]
+    assert "a で起動中です" in errors["a-again"]
+    assert registry.owner_of(registry.get("a").server_dir) == "a"
+    assert {inst.name for inst in registry.running()} == {"a", "b"}
+
+
+def test_refuses_a_directory_owned_by_the_main_window(registry):
+    main_dir = registry.get("b").server_dir.resolve()
+    registry.external_owner = lambda d: "メイン画面のサーバー" if d.resolve() == main_dir else None
+    errors = registry.start(["a", "b"])
+    assert "メイン画面のサーバー で起動中です" in errors["b"]
+    assert registry.get("b").state == "stopped"
+
+
+def test_commands_reach_the_process_and_stop_is_clean(registry):
+    seen = []
+    registry.on_output = lambda inst, lines: seen.extend(lines)
+    assert registry.start(["a"]) == {}
+    inst = registry.get("a")
+    assert wait_for(lambda: inst.state == "running")
+    assert inst.send("say hi")
+    assert wait_for(lambda: any("echo say hi" in line for line in seen))
+    assert registry.stop(["a"], timeout=5) == {"a": 0}
+    assert inst.state == "stopped"
+    assert registry.owner_of(inst.server_dir) is None
@@ -0,0 +1,74 @@
+import json
+import hashlib
+import subprocess
+import sys
+from pathlib import Path
+
+from mc_core import JarStore, jar_store
+
+ROOT = Path(__file__).resolve().parent.parent
+
+WORKER = """
+import sys, hashlib
+from pathlib import Path
+sys.path.insert(0, sys.argv[1])
+from mc_core import JarStore
+store = JarStore(Path(sys.argv[2]), int(sys.argv[3]))
+src = Path(sys.argv[2]).parent / f"src-{sys.argv[4]}"
+src.mkdir(parents=True, exist_ok=True)
+for i in range(int(sys.argv[5])):
+    data = f"{sys.argv[4]}-{i}".encode() * 64
+    path = src / f"{i}.jar"
+    path.write_bytes(data)
+    store.add(path, {"sha256": hashlib.sha256(data).hexdigest(), "sha1": hashlib.sha1(data).hexdigest()})
+"""
+
+
+def make_jar(tmp_path: Path, name: str, data: bytes) -> tuple[Path, dict]:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return path, {"sha256": hashlib.sha256(data).hexdigest(), "sha1": hashlib.sha1(data).hexdigest()}
+
+
+def run_workers(root: Path, max_bytes: int, workers: int, per_worker: int) -> None:
+    procs = [subprocess.Popen([sys.executable, "-c", WORKER, str(ROOT), str(root), str(max_bytes), str(w), str(per_worker)])
+             for w in range(workers)]
+    assert all(p.wait(timeout=120) == 0 for p in procs)
+
+
+def test_jar_store_is_shared_per_root(isolated_config, tmp_path):
+    assert jar_store() is jar_store()
+    other = tmp_path / "other"
+    isolated_config.write_text(json.dumps({"jar_store_dir": str(other), "jar_store_max_bytes": 1234}), encoding="utf-8")
+    store = jar_store()
+    assert store.root == other.resolve()
+    assert store.max_bytes == 1234
+    assert store is jar_store()
+
+
+def test_checkout_links_cached_object_by_alias(tmp_path):
+    store = JarStore(tmp_path / "store")
+    path, hashes = make_jar(tmp_path, "paper.jar", b"paper" * 100)
+    store.add(path, hashes)
+    dest = tmp_path / "server" / "paper.jar"
+    assert store.checkout({"sha1": hashes["sha1"]}, dest) in ("reflink", "hardlink", "copy")
+    assert dest.read_bytes() == b"paper" * 100
+    assert store.checkout({"sha1": "0" * 40}, tmp_path / "missing.jar") is None
+
+
+def test_processes_do_not_lose_index_entries(tmp_path):
+    root = tmp_path / "store"
+    run_workers(root, 1 << 30, workers=4, per_worker=15)
+    index = json.loads((root / "index.json").read_text(encoding="utf-8"))
+    assert len(index["objects"]) == 60
+    assert len(index["aliases"]) == 60
+
+
+def test_eviction_stays_consistent_across_processes(tmp_path):
+    root = tmp_path / "store"
+    run_workers(root, 8 * 1024, workers=4, per_worker=15)
+    index = json.loads((root / "index.json").read_text(encoding="utf-8"))
+    on_disk = {p.stem for p in (root / "objects").rglob("*.jar")}
+    assert on_disk == set(index["objects"])
+    assert sum(o["size"] for o in index["objects"].values()) <= 8 * 1024
+    assert set(index["aliases"].values()) <= set(index["objects"])
@@ -0,0 +1,25 @@
+import pytest
+
+from mc_java import JavaRuntime, java_major_range, pick_java
+
+
+def runtime(major: int) -> JavaRuntime:
+    version = "1.8.0_402" if major == 8 else f"{major}.0.2"
+    return JavaRuntime(f"/opt/java{major}/bin/java", f"/opt/java{major}", major, version, "Eclipse Adoptium", "x64", version)
+
+
+@pytest.mark.parametrize("version, expected", [
+    ("1.20.6", (21, None)), ("1.18.2", (17, None)), ("1.17.1", (16, None)),
+    ("1.16.5", (8, 16)), ("1.12.2", (8, 8)), ("1.7.10-10.13.4.1614-1.7.10", (8, 8)),
+])
+def test_java_major_range(version, expected):
+    assert java_major_range(version) == expected
+
+
+def test_legacy_versions_do_not_pick_a_newer_java():
+    runtimes = [runtime(21), runtime(17), runtime(11), runtime(8)]
+    assert pick_java("1.20.6", runtimes).major == 21
+    assert pick_java("1.16.5", runtimes).major == 8
+    assert pick_java("1.12.2", runtimes).major == 8
+    assert pick_java("1.16.5", [runtime(21), runtime(17), runtime(11)]).major == 11
+    assert pick_java("1.12.2", [runtime(21), runtime(17)]) is None
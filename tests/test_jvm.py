@@ -0,0 +1,17 @@
+import pytest
+
+from mc_jvm import HostInfo, build_jvm_profile
+
+HOST = HostInfo(cores=16, memory_mb=32 * 1024, large_pages=None)
+
+
+@pytest.mark.parametrize("major, expected", [(11, "aikar"), (12, "aikar"), (14, "aikar"), (15, "shenandoah"), (21, "shenandoah")])
+def test_shenandoah_needs_a_production_jdk(major, expected):
+    result = build_jvm_profile("shenandoah", 4096, major, HOST)
+    assert result.name == expected
+    assert ("-XX:+UseShenandoahGC" in result.args.split()) == (expected == "shenandoah")
+
+
+@pytest.mark.parametrize("profile", ["aikar", "zgc", "shenandoah", "basic"])
+def test_parallel_gc_threads_are_left_to_the_jvm(profile):
+    assert "ParallelGCThreads" not in build_jvm_profile(profile, 4096, 21, HOST).args
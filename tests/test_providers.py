@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+import mc_core
+import mc_providers
+from mc_launch import START_BAT
+from mc_providers import (
+    FABRIC_META_ROOT,
+    FORGE_METADATA_URL,
+    FORGE_PROMOTIONS_URL,
+    MOJANG_MANIFEST,
+    PAPER_API_ROOT,
+    PURPUR_API_ROOT,
+    FabricProvider,
+    ForgeProvider,
+    PaperProvider,
+    PurpurProvider,
+    VanillaProvider,
+    VersionPrefetcher,
+    fetch_server_versions,
+    forge_installer_url,
+    resolve_server_jar,
+)
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+RECORDED = {
+    f"{PAPER_API_ROOT}/projects/paper": "paper_project.json",
+    f"{PAPER_API_ROOT}/projects/paper/versions/1.20.4/builds": "paper_builds_1.20.4.json",
+    f"{PURPUR_API_ROOT}/purpur": "purpur_project.json",
+    f"{PURPUR_API_ROOT}/purpur/1.20.4": "purpur_1.20.4.json",
+    f"{PURPUR_API_ROOT}/purpur/1.20.4/2176": "purpur_1.20.4_2176.json",
+    f"{FABRIC_META_ROOT}/versions/game": "fabric_game.json",
+    f"{FABRIC_META_ROOT}/versions/loader/1.20.4": "fabric_loader_1.20.4.json",
+    f"{FABRIC_META_ROOT}/versions/installer": "fabric_installer.json",
+    MOJANG_MANIFEST: "vanilla_manifest.json",
+    "https://piston-meta.mojang.com/v1/packages/c98adde5094a3041f486b4d42d0386cf87310559/1.20.4.json": "vanilla_1.20.4.json",
+    "https://piston-meta.mojang.com/v1/packages/9b0b4f7b3e5e9c1f8d2a4c6e8b0d2f4a6c8e0b2d/b1.7.3.json": "vanilla_b1.7.3.json",
+    FORGE_METADATA_URL: "forge_maven_metadata.xml",
+    FORGE_PROMOTIONS_URL: "forge_promotions_slim.json",
+    forge_installer_url("1.20.1-47.2.0") + ".sha1": "forge-1.20.1-47.2.0-installer.jar.sha1",
+}
+
+
+class Recorded:
+    def __init__(self):
+        self.urls: list[str] = []
+
+    def bytes(self, url: str, ttl=None, timeout=None, headers=None) -> bytes:
+        self.urls.append(url)
+        if url not in RECORDED:
+            raise RuntimeError(f"404 Client Error: {url}")
+        return (FIXTURES / RECORDED[url]).read_bytes()
+
+    def json(self, url: str, ttl=None, timeout=None):
+        return json.loads(self.bytes(url, ttl, timeout))
+
+    def text(self, url: str, ttl=None, timeout=None) -> str:
+        return self.bytes(url, ttl, timeout).decode("utf-8")
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    rec = Recorded()
+    kwargs = {"fetch_json": rec.json, "fetch_text": rec.text}
+    for provider in (PaperProvider(**kwargs), PurpurProvider(**kwargs), VanillaProvider(**kwargs),
+                     ForgeProvider(fetch_bytes=rec.bytes, **kwargs), FabricProvider(**kwargs)):
+        monkeypatch.setitem(mc_providers._providers, provider.name, provider)
+    return rec
+
+
+def test_paper_versions_newest_first(recorded):
+    versions = fetch_server_versions("paper")
+    assert versions[:3] == ["1.20.4", "1.20.2", "1.20.1"]
+    assert versions[-1] == "1.8.8"
+    assert versions.index("1.13") < versions.index("1.13-pre7") < versions.index("1.12.2")
+
+
+def test_paper_resolves_highest_build_not_last_listed(recorded):
+    res = resolve_server_jar("paper", "1.20.4")
+    assert res.build == "499"
+    assert res.name == "paper-1.20.4-499.jar"
+    assert res.url == f"{PAPER_API_ROOT}/projects/paper/versions/1.20.4/builds/499/downloads/paper-1.20.4-499.jar"
+    assert res.hashes == {"sha256": "a1f1f7d9bdf2b65ac1b2a3e0c5d9a6e1f0b2c4d6e8f0a2b4c6d8e0f2a4b6c8d0"}
+
+
+def test_purpur_versions_and_build_with_md5(recorded):
+    assert fetch_server_versions("purpur")[:2] == ["1.20.4", "1.20.2"]
+    res = resolve_server_jar("purpur", "1.20.4")
+    assert res.build == "2176"
+    assert res.url == f"{PURPUR_API_ROOT}/purpur/1.20.4/2176/download"
+    assert res.name == "purpur-1.20.4-2176.jar"
+    assert res.hashes == {"md5": "4f3a8c6bbbf4b2b0a1e6b8c7d3f0e9a2"}
+
+
+def test_fabric_orders_releases_before_their_candidates(recorded):
+    versions = fetch_server_versions("fabric")
+    assert versions[0] == "1.20.4"
+    assert versions.index("1.20.4") < versions.index("1.20.4-rc1") < versions.index("1.20.3")
+    assert versions.index("1.14") < versions.index("1.14 Pre-Release 5")
+
+
+def test_fabric_resolves_latest_stable_loader_and_installer(recorded):
+    res = resolve_server_jar("fabric", "1.20.4")
+    assert res.url == f"{FABRIC_META_ROOT}/versions/loader/1.20.4/0.15.7/1.0.1/server/jar"
+    assert res.name == "fabric-server-mc.1.20.4-loader.0.15.7-launcher.1.0.1.jar"
+    assert res.build == "0.15.7"
+
+
+def test_vanilla_orders_by_release_time(recorded):
+    assert fetch_server_versions("vanilla") == ["24w03a", "23w51b", "1.20.4", "1.20.4-rc1", "1.20.3", "1.7.10", "b1.7.3"]
+
+
+def test_vanilla_resolves_server_download(recorded):
+    res = resolve_server_jar("vanilla", "1.20.4")
+    assert res.url == "https://piston-data.mojang.com/v1/objects/8dd1a28015f51b1803213892b50b7b4fc76e594d/server.jar"
+    assert res.name == "vanilla-1.20.4.jar"
+    assert res.hashes == {"sha1": "8dd1a28015f51b1803213892b50b7b4fc76e594d"}
+    with pytest.raises(RuntimeError, match="サーバーJARが公開されていません"):
+        resolve_server_jar("vanilla", "b1.7.3")
+
+
+def test_forge_versions_order_builds_numerically(recorded):
+    assert fetch_server_versions("forge") == [
+        "1.20.4-49.0.14", "1.20.4-49.0.13", "1.20.4-49.0.3",
+        "1.20.1-47.2.20", "1.20.1-47.2.0", "1.20.1-47.1.0",
+        "1.12.2-14.23.5.2860", "1.12.2-14.23.5.2859",
+        "1.7.10-10.13.4.1614-1.7.10",
+    ]
+    builds = mc_providers.get_provider("forge").list_builds("1.20.1")
+    assert [b["build"] for b in builds] == ["47.2.20", "47.2.0", "47.1.0"]
+    assert [b["promotion"] for b in builds] == ["latest", "recommended", None]
+
+
+def test_forge_resolves_recommended_then_latest_promotion(recorded):
+    res = resolve_server_jar("forge", "1.20.1")
+    assert res.url == f"{mc_providers.FORGE_MAVEN_ROOT}/1.20.1-47.2.0/forge-1.20.1-47.2.0-installer.jar"
+    assert res.build == "47.2.0"
+    assert res.hashes == {"sha1": "6f0b2b4a1a2f1c3d5e7f9a0b1c2d3e4f5a6b7c8d"}
+    assert mc_core.version_catalog().latest_build("forge", "1.20.1")["build"] == "47.2.0"
+    res = resolve_server_jar("forge", "1.20.4")
+    assert res.name == "forge-1.20.4-49.0.14-installer.jar"
+    assert res.hashes == {}
+    count = len(recorded.urls)
+    resolve_server_jar("forge", "1.20.4")
+    assert len(recorded.urls) == count
+    assert resolve_server_jar("forge", "1.7.10").name == "forge-1.7.10-10.13.4.1614-1.7.10-installer.jar"
+
+
+def test_forge_without_a_build_or_promotion_is_an_error(recorded, monkeypatch, tmp_path):
+    with pytest.raises(RuntimeError, match="Forge 1.19.2 が見つかりません"):
+        resolve_server_jar("forge", "1.19.2")
+    with pytest.raises(RuntimeError, match="Forge 1.20.1-47.9.9 が見つかりません"):
+        resolve_server_jar("forge", "1.20.1-47.9.9")
+    monkeypatch.setitem(RECORDED, FORGE_PROMOTIONS_URL, "missing.json")
+    mc_providers.get_provider("forge")._index = None
+    with pytest.raises(RuntimeError, match="Forge 1.12.2 には recommended / latest のプロモーションがありません"):
+        resolve_server_jar("forge", "1.12.2")
+    server_dir = tmp_path / "server"
+    with pytest.raises(RuntimeError, match="1.19.2"):
+        mc_providers.setup_server(server_dir, "forge", "1.19.2", "", "java")
+    assert not (server_dir / START_BAT).exists()
+    assert not (server_dir / "eula.txt").exists()
+
+
+class ListingProvider(mc_providers.ServerProvider):
+    name = "listing"
+    label = "Listing"
+
+    def list_versions(self, timeout=None):
+        return [{"id": "1.0"}]
+
+    def list_builds(self, version, timeout=None):
+        return [{"build": b, "name": f"listing-{b}.jar", "url": f"https://example.invalid/{b}", "sha256": "0" * 64}
+                for b in (9, 10, 2)]
+
+
+def test_provider_only_needs_versions_and_builds(monkeypatch):
+    monkeypatch.setitem(mc_providers._providers, "listing", ListingProvider())
+    res = resolve_server_jar("listing", "1.0")
+    assert (res.build, res.name, res.hashes) == ("10", "listing-10.jar", {"sha256": "0" * 64})
+
+
+def test_resolution_reads_the_catalogue_within_its_ttl(recorded):
+    resolve_server_jar("paper", "1.20.4")
+    count = len(recorded.urls)
+    assert resolve_server_jar("paper", "1.20.4").build == "499"
+    assert len(recorded.urls) == count
+    resolve_server_jar("paper", "1.20.4", ttl=0)
+    assert len(recorded.urls) > count
+
+
+def test_resolution_syncs_every_listed_build(recorded):
+    resolve_server_jar("forge", "1.20.1")
+    catalog = mc_core.version_catalog()
+    assert [b["build"] for b in catalog.builds("forge", "1.20.1")] == ["47.2.0", "47.2.20", "47.1.0"]
+    assert catalog.latest_build("forge", "1.20.1")["build"] == "47.2.0"
+    assert resolve_server_jar("forge", "1.20.1-47.1.0").name == "forge-1.20.1-47.1.0-installer.jar"
+
+
+def test_stale_catalogue_row_is_used_when_offline(recorded, monkeypatch):
+    resolve_server_jar("paper", "1.20.4")
+    monkeypatch.setitem(RECORDED, f"{PAPER_API_ROOT}/projects/paper/versions/1.20.4/builds", "missing.json")
+    assert resolve_server_jar("paper", "1.20.4", ttl=0).build == "499"
+
+
+class SlowProvider(mc_providers.ServerProvider):
+    label = "Slow"
+
+    def __init__(self, name: str, delay: float):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+
+    def list_versions(self, timeout=None):
+        time.sleep(self.delay)
+        return [{"id": "1.20.4"}, {"id": "1.20.1"}]
+
+
+def test_prefetch_enforces_per_provider_deadline(monkeypatch):
+    monkeypatch.setitem(mc_providers._providers, "fast", SlowProvider("fast", 0))
+    monkeypatch.setitem(mc_providers._providers, "hung", SlowProvider("hung", 3))
+    seen = {}
+    prefetcher = VersionPrefetcher(("fast", "hung"), timeouts={"fast": 5, "hung": 0.3})
+    started = time.monotonic()
+    prefetcher.start(on_result=lambda stype, versions, error: seen.setdefault(stype, time.monotonic() - started))
+    assert prefetcher.wait(2)
+    assert prefetcher.get("fast") == ["1.20.4", "1.20.1"]
+    assert prefetcher.get("hung") is None
+    assert isinstance(prefetcher.error("hung"), TimeoutError)
+    assert seen["hung"] < 1.5
+    time.sleep(3)
+    assert prefetcher.get("hung") is None
+
+
+def test_prefetch_cancel_drops_late_results(monkeypatch):
+    monkeypatch.setitem(mc_providers._providers, "slow", SlowProvider("slow", 0.5))
+    seen = []
+    prefetcher = VersionPrefetcher(("slow",))
+    prefetcher.start(on_result=lambda *a: seen.append(a))
+    prefetcher.cancel()
+    time.sleep(1)
+    assert seen == []
+    assert prefetcher.get("slow") is None
+
+
+FAKE_FORGE_INSTALLER = """#!{python}
+import sys, time
+from pathlib import Path
+version = sys.argv[2][len("forge-"):-len("-installer.jar")]
+mc = version.split("-")[0]
+if mc == "1.20.1":
+    for v in (version, "1.20.1-47.10.0"):
+        lib = Path("libraries/net/minecraftforge/forge") / v
+        lib.mkdir(parents=True, exist_ok=True)
+        for name in ("unix_args.txt", "win_args.txt"):
+            (lib / name).write_text("-cp x", encoding="utf-8")
+    Path("run.sh").write_text("java @user_jvm_args.txt", encoding="utf-8")
+elif mc == "1.7.10":
+    Path(f"forge-{{version}}-universal.jar").write_bytes(b"forge")
+elif mc == "1.12.2":
+    Path(f"forge-{{version}}.jar").write_bytes(b"forge")
+time.sleep(0.05)
+Path(f"minecraft_server.{{mc}}.jar").write_bytes(b"vanilla")
+print("The server installed successfully")
+"""
+
+
+@pytest.fixture
+def fake_java(tmp_path):
+    java = tmp_path / "bin" / "java"
+    java.parent.mkdir()
+    java.write_text(FAKE_FORGE_INSTALLER.format(python=sys.executable), encoding="utf-8")
+    java.chmod(0o755)
+    return str(java)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fake java is a POSIX script")
+@pytest.mark.parametrize("version, expected", [
+    ("1.20.1-47.2.0", "libraries/net/minecraftforge/forge/1.20.1-47.2.0/unix_args.txt"),
+    ("1.12.2-14.23.5.2860", "forge-1.12.2-14.23.5.2860.jar"),
+    ("1.7.10-10.13.4.1614-1.7.10", "forge-1.7.10-10.13.4.1614-1.7.10-universal.jar"),
+])
+def test_forge_install_picks_its_own_output(tmp_path, fake_java, version, expected):
+    server_dir = tmp_path / "server"
+    server_dir.mkdir()
+    installer = server_dir / f"forge-{version}-installer.jar"
+    installer.write_bytes(b"installer")
+    target = ForgeProvider().install(installer, server_dir, fake_java)
+    assert target == server_dir / expected
+    assert not installer.exists()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="fake java is a POSIX script")
+def test_forge_install_fails_when_output_is_missing(tmp_path, fake_java):
+    server_dir = tmp_path / "server"
+    server_dir.mkdir()
+    installer = server_dir / "forge-1.16.5-36.2.39-installer.jar"
+    installer.write_bytes(b"installer")
+    with pytest.raises(RuntimeError, match="起動用ファイルが見つかりません"):
+        ForgeProvider().install(installer, server_dir, fake_java)
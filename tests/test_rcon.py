@@ -0,0 +1,122 @@
+import struct
+import socket
+import threading
+import socketserver
+
+import pytest
+
+from mc_rcon import TYPE_AUTH, TYPE_AUTH_RESPONSE, TYPE_COMMAND, TYPE_RESPONSE, RconClient, encode_packet
+
+PASSWORD = "secret"
+CHUNK = 4096
+
+
+def recv_packet(sock: socket.socket) -> tuple[int, int, bytes] | None:
+    head = sock.recv(4, socket.MSG_WAITALL)
+    if len(head) < 4:
+        return None
+    (length,) = struct.unpack("<i", head)
+    data = sock.recv(length, socket.MSG_WAITALL)
+    request_id, ptype = struct.unpack("<ii", data[:8])
+    return request_id, ptype, data[8:-2]
+
+
+class RconHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        sock = self.request
+        packet = recv_packet(sock)
+        if packet is None or packet[1] != TYPE_AUTH:
+            return
+        ok = packet[2].decode() == PASSWORD
+        sock.sendall(encode_packet(packet[0], TYPE_RESPONSE, b""))
+        sock.sendall(encode_packet(packet[0] if ok else -1, TYPE_AUTH_RESPONSE, b""))
+        if not ok:
+            return
+        while (packet := recv_packet(sock)) is not None:
+            request_id, ptype, body = packet
+            if ptype != TYPE_COMMAND:
+                sock.sendall(encode_packet(request_id, TYPE_RESPONSE, f"Unknown request {ptype:x}".encode()))
+                continue
+            cmd = body.decode()
+            with server.lock:
+                server.commands.append(cmd)
+            if cmd == "drop":
+                return
+            reply = ("x" * 10000 + "END") if cmd == "big" else f"echo {cmd}"
+            data = reply.encode()
+            for i in range(0, len(data), CHUNK):
+                sock.sendall(encode_packet(request_id, TYPE_RESPONSE, data[i:i + CHUNK]))
+
+
+class RconServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RconHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.commands: list[str] = []
+
+
+@pytest.fixture
+def rcon_server():
+    server = RconServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(rcon_server):
+    c = RconClient("127.0.0.1", rcon_server.server_address[1], PASSWORD, timeout=3)
+    yield c
+    c.close()
+
+
+def test_command_roundtrip(client):
+    assert client.command("list") == "echo list"
+
+
+def test_auth_failure_is_remembered(rcon_server):
+    c = RconClient("127.0.0.1", rcon_server.server_address[1], "wrong", timeout=3)
+    with pytest.raises(RuntimeError, match="認証に失敗"):
+        c.command("list")
+    assert c.auth_failed
+    with pytest.raises(RuntimeError, match="認証に失敗"):
+        c.command("list")
+    assert rcon_server.connections == 1
+    c.close()
+
+
+def test_multi_packet_reply_is_joined_until_sentinel(client):
+    reply = client.command("big")
+    assert len(reply) == 10003
+    assert reply.endswith("END")
+    assert client.command("after") == "echo after"
+
+
+def test_batched_commands_keep_their_replies(client, rcon_server):
+    commands = [f"say {i}" for i in range(20)] + ["big"]
+    replies = client.command_many(commands)
+    assert replies[:20] == [f"echo say {i}" for i in range(20)]
+    assert replies[20].endswith("END")
+    assert rcon_server.connections == 1
+
+
+def test_reconnects_after_socket_drop(client, rcon_server):
+    assert client.command("first") == "echo first"
+    with pytest.raises(RuntimeError):
+        client.command("drop")
+    assert client.command("second") == "echo second"
+    assert rcon_server.connections == 2
+
+
+def test_rejects_oversized_command(client, rcon_server):
+    with pytest.raises(RuntimeError, match="長すぎます"):
+        client.command("x" * 2000)
+    assert rcon_server.connections == 0
@@ -0,0 +1,157 @@
+import json
+import time
+import socket
+import struct
+import threading
+import socketserver
+
+import pytest
+
+from mc_status import StatusPoller, decode_varint, describe_status, encode_packet, encode_string, query_many, query_status
+
+PONG_DELAY = 0.05
+
+
+def recv_varint(sock: socket.socket) -> int:
+    raw = b""
+    while True:
+        byte = sock.recv(1)
+        if not byte:
+            raise EOFError
+        raw += byte
+        if not byte[0] & 0x80:
+            return decode_varint(raw, 0)[0]
+
+
+def recv_packet(sock: socket.socket) -> tuple[int, bytes]:
+    length = recv_varint(sock)
+    data = sock.recv(length, socket.MSG_WAITALL)
+    packet_id, pos = decode_varint(data, 0)
+    return packet_id, data[pos:]
+
+
+def legacy_reply(text: str) -> bytes:
+    return b"\xff" + struct.pack(">H", len(text)) + text.encode("utf-16-be")
+
+
+class SlpHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        mode = self.server.mode
+        sock = self.request
+        first = sock.recv(1, socket.MSG_PEEK)
+        if mode == "silent":
+            time.sleep(2)
+            return
+        if first == b"\xfe":
+            if mode == "legacy":
+                sock.sendall(legacy_reply("§1\x00127\x001.6.4\x00§aOld §lServer\x003\x0040"))
+            elif mode == "beta":
+                sock.sendall(legacy_reply("Beta Server§2§8"))
+            return
+        if mode != "modern":
+            return
+        recv_packet(sock)
+        packet_id, _ = recv_packet(sock)
+        assert packet_id == 0x00
+        info = {"version": {"name": "Paper 1.20.4", "protocol": 765},
+                "players": {"max": 20, "online": 2, "sample": [{"name": "Alex", "id": "0"}, {"name": "Steve", "id": "1"}]},
+                "description": {"text": "§6Hello ", "extra": [{"text": "world"}]}}
+        sock.sendall(encode_packet(0x00, encode_string(json.dumps(info))))
+        packet_id, payload = recv_packet(sock)
+        time.sleep(PONG_DELAY)
+        sock.sendall(encode_packet(packet_id, payload))
+
+
+class SlpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mode: str):
+        super().__init__(("127.0.0.1", 0), SlpHandler)
+        self.mode = mode
+
+
+@pytest.fixture
+def slp_server():
+    servers = []
+
+    def make(mode: str) -> int:
+        server = SlpServer(mode)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1]
+    yield make
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_modern_ping_parses_players_and_latency(slp_server):
+    st = query_status("127.0.0.1", slp_server("modern"))
+    assert st.online
+    assert (st.players_online, st.players_max) == (2, 20)
+    assert st.sample == ["Alex", "Steve"]
+    assert st.version == "Paper 1.20.4"
+    assert st.motd == "Hello world"
+    assert st.latency_ms is not None and st.latency_ms >= PONG_DELAY * 1000 * 0.9
+    assert "プレイヤー 2/20 (Alex, Steve)" in describe_status(st)
+
+
+def test_falls_back_to_legacy_ping(slp_server):
+    st = query_status("127.0.0.1", slp_server("legacy"))
+    assert st.online
+    assert (st.players_online, st.players_max) == (3, 40)
+    assert st.version == "1.6.4"
+    assert st.motd == "Old Server"
+
+
+def test_parses_pre_1_4_legacy_format(slp_server):
+    st = query_status("127.0.0.1", slp_server("beta"))
+    assert st.online
+    assert (st.players_online, st.players_max) == (2, 8)
+    assert st.motd == "Beta Server"
+    assert st.version == ""
+
+
+def test_refused_port_is_offline_without_raising():
+    st = query_status("127.0.0.1", free_port(), timeout=1)
+    assert not st.online
+    assert st.error
+    assert describe_status(st).startswith("応答なし")
+
+
+def test_silent_server_times_out_offline(slp_server):
+    port = slp_server("silent")
+    started = time.monotonic()
+    st = query_status("127.0.0.1", port, timeout=0.3)
+    assert not st.online
+    assert time.monotonic() - started < 2
+
+
+def test_query_many_mixes_online_and_offline(slp_server):
+    results = query_many({"up": ("127.0.0.1", slp_server("modern")), "down": ("127.0.0.1", free_port())}, timeout=1)
+    assert results["up"].online
+    assert not results["down"].online
+
+
+def test_poller_clamps_interval_and_reports(slp_server):
+    assert StatusPoller(0).interval == 1.0
+    assert StatusPoller(0.2).interval == 1.0
+    assert StatusPoller(30).interval == 30.0
+    seen = threading.Event()
+    poller = StatusPoller(1, timeout=1, on_result=lambda name, st: seen.set())
+    poller.add_target("a", "127.0.0.1", slp_server("modern")).start()
+    try:
+        assert seen.wait(5)
+        metrics = {m[0]: m[4] for m in poller.collect({"server": "x"})}
+        assert metrics["mcsoft_status_up"] == 1.0
+        assert metrics["mcsoft_players_online"] == 2
+        assert metrics["mcsoft_players_max"] == 20
+    finally:
+        poller.stop()
@@ -0,0 +1,34 @@
+import threading
+
+from mc_telemetry import LagTelemetry
+
+MSPT_REPLY = ["§6Server tick times §e(§7avg§e/§7min§e/§7max§e)§6 from last 5s§7,§6 10s§7,§6 1m§e:",
+              "§6◴ §a12.5§7/§a10.1§7/§a30.2§e, §a11.0§7/§a9.8§7/§a28.0§e, §a11.4§7/§a9.5§7/§a40.1"]
+
+
+def test_reply_is_parsed_on_its_own():
+    telemetry = LagTelemetry()
+    telemetry.feed(["[12:00:00 INFO]: Server tick times (avg/min/max) from last 5s, 10s, 1m:"])
+    telemetry.feed_reply(["TPS from last 1m, 5m, 15m: 20.0, 20.0, 20.0"])
+    telemetry.feed(["[12:00:00 INFO]: ◴ 8.0/7.0/9.0, 8.0/7.0/9.0, 8.0/7.0/9.0"])
+    assert telemetry.series["mspt"].latest() == 8.0
+    assert telemetry.series["tps"].latest() == 20.0
+
+
+def test_concurrent_replies_do_not_share_state():
+    telemetry = LagTelemetry()
+    stop = threading.Event()
+
+    def console():
+        while not stop.is_set():
+            telemetry.feed(["[12:00:00 INFO]: Server tick times (avg/min/max) from last 5s, 10s, 1m:"])
+
+    thread = threading.Thread(target=console)
+    thread.start()
+    try:
+        for _ in range(500):
+            telemetry.feed_reply(MSPT_REPLY)
+    finally:
+        stop.set()
+        thread.join()
+    assert telemetry.series["mspt"].values() == [12.5] * 500